@@ -6,6 +6,9 @@ from .document import Document
 from .question import Question
 from .response import Response
 from .knowledge_base import KnowledgeBase
+from .usage import AIUsageRecord, OrganizationUsage
+from .question_signature import QuestionSignatureBand
+from .embedding import TextEmbedding
 
 __all__ = [
     'Organization',
@@ -16,6 +19,10 @@ __all__ = [
     'Document',
     'Question',
     'Response',
-    'KnowledgeBase'
+    'KnowledgeBase',
+    'AIUsageRecord',
+    'OrganizationUsage',
+    'QuestionSignatureBand',
+    'TextEmbedding'
 ]
 
@@ -0,0 +1,392 @@
+import io
+import re
+import sys
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qsl, urlencode
+from flask import request, jsonify, g
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.user import db
+from src.middleware.auth_middleware import rate_limit
+from src.services.idempotency import (
+    begin_request, wait_for_result_async, claim_response, finish_request, abandon_request
+)
+from src.routes.responses import (
+    load_generation_context, call_generation_ai_async, persist_generated_response, generation_result,
+    _batch_generate_cost, load_batch_generation_context, persist_batch_generation
+)
+from src.routes.questions import (
+    _bulk_extract_cost, load_extraction_context, call_extraction_ai_async,
+    persist_extracted_questions, extraction_result, load_bulk_extraction_context, persist_bulk_extraction
+)
+
+logger = logging.getLogger(__name__)
+
+# Limite de chamadas simultâneas à IA por requisição em lote (extração ou geração)
+BULK_AI_CONCURRENCY = 4
+
+class AsyncAIApp:
+    """Aplicação ASGI que atende as rotas de IA com asyncio e repassa o resto ao Flask.
+
+    Cada rota de IA roda em três fases: carga e gravação executam em threads
+    (asyncio.to_thread) dentro de um contexto de requisição do Flask, com os
+    mesmos before/after_request, JWT e rate limit das rotas síncronas; a
+    chamada à IA roda no event loop, sem thread e sem conexão de banco.
+    As demais rotas são servidas pela aplicação WSGI via asgiref.
+    """
+
+    def __init__(self, flask_app):
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+        except ImportError:
+            raise Exception("Pacote 'asgiref' é necessário para o servidor ASGI")
+
+        self.flask_app = flask_app
+        self.wsgi_app = WsgiToAsgi(flask_app)
+        # (método, caminho, handler, escopo de idempotência ou None; ver services.idempotency)
+        self.routes = [
+            ('POST', re.compile(r'^/api/responses/generate/(?P<question_id>[^/]+)$'), generate_response_async,
+             'generate_response'),
+            ('POST', re.compile(r'^/api/questions/extract-from-document/(?P<document_id>[^/]+)$'), extract_questions_async,
+             'extract_questions'),
+            ('POST', re.compile(r'^/api/questions/bulk-extract$'), bulk_extract_async, None),
+            ('POST', re.compile(r'^/api/responses/batch-generate$'), batch_generate_async, None),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        if scope['type'] == 'http':
+            for method, pattern, handler, idempotency_scope in self.routes:
+                match = pattern.match(scope['path'])
+                if match and scope['method'] == method:
+                    body = await _read_body(receive)
+                    environ = _build_environ(scope, body)
+                    kwargs = match.groupdict()
+                    if idempotency_scope:
+                        response = await self.run_idempotent(environ, idempotency_scope, kwargs, handler)
+                    else:
+                        response = await handler(self, environ, **kwargs)
+                    return await _send_response(send, response)
+
+        await self.wsgi_app(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        from src.services.ai_service import ai_service
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await ai_service.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def run_idempotent(self, environ, scope, kwargs, handler):
+        """Executa o handler com Idempotency-Key e coalescência (ver services.idempotency.idempotent).
+
+        A reserva roda numa fase sem before_request (que roda uma única vez,
+        na fase de carga do handler ou na resposta guardada). Requisições
+        repetidas esperam a original no event loop, sem ocupar thread.
+        """
+        target = next(iter(kwargs.values()), None)
+        claim, _, _ = await self.run_phase(environ, lambda: begin_request(scope, target), {})
+        if claim['state'] == 'pending':
+            claim = await wait_for_result_async(claim)
+        if claim['state'] == 'skip':
+            return await handler(self, environ, **kwargs)
+        if claim['state'] != 'new':
+            _, _, response = await self.run_phase(environ, lambda: claim_response(claim))
+            return response
+
+        try:
+            response = await handler(self, environ, **kwargs)
+        except BaseException:
+            await asyncio.to_thread(abandon_request, claim)
+            raise
+        await asyncio.to_thread(finish_request, claim, response)
+        return response
+
+    async def run_phase(self, environ, view, saved_g=None):
+        """Executa uma fase síncrona em thread, dentro de um contexto de requisição"""
+        return await asyncio.to_thread(self._run_phase, environ, view, saved_g)
+
+    def _run_phase(self, environ, view, saved_g):
+        """Roda `view` com before_request (só na primeira fase) e after_request (só na resposta).
+
+        Returns:
+            tuple: (contexto, g salvo, None) quando a view devolve um dict de contexto,
+                   ou (None, None, resposta) quando devolve uma resposta Flask
+        """
+        app = self.flask_app
+        environ = dict(environ, **{'wsgi.input': io.BytesIO(environ['rfp.body'])})
+
+        with app.request_context(environ):
+            from_view = False
+            try:
+                if saved_g is None:
+                    rv = app.preprocess_request()
+                else:
+                    g.__dict__.update(saved_g)
+                    rv = None
+                if rv is None:
+                    from_view = True
+                    rv = view()
+            except Exception as e:
+                from_view = False
+                try:
+                    rv = app.handle_user_exception(e)
+                except Exception as e2:
+                    rv = app.handle_exception(e2)
+
+            if from_view and isinstance(rv, dict):
+                return rv, dict(g.__dict__), None
+
+            response = app.process_response(app.make_response(rv))
+            response.get_data()
+            return None, None, response
+
+def _error_response(code, message, details):
+    """Resposta de erro no formato das rotas síncronas"""
+    return jsonify({
+        'error': {
+            'code': code,
+            'message': message,
+            'details': details
+        }
+    }), 500
+
+async def _call_ai(saved_g, call):
+    """Executa a chamada à IA e soma o tempo gasto ao Server-Timing da requisição"""
+    started = time.perf_counter()
+    try:
+        return await call
+    finally:
+        saved_g['_ai_time'] = saved_g.get('_ai_time', 0.0) + time.perf_counter() - started
+
+async def generate_response_async(server, environ, question_id):
+    """POST /api/responses/generate/<question_id> (ver responses.generate_response)"""
+    @jwt_required()
+    @rate_limit('ai')
+    def load():
+        try:
+            ctx, error = load_generation_context(get_jwt_identity(), question_id, request.get_json() or {})
+            if error:
+                return jsonify(error[0]), error[1]
+            return ctx
+        except Exception as e:
+            return _error_response('GENERATION_ERROR', 'Erro ao gerar resposta', str(e))
+
+    ctx, saved_g, response = await server.run_phase(environ, load)
+    if response is not None:
+        return response
+
+    try:
+        ai_response = await _call_ai(saved_g, call_generation_ai_async(ctx))
+    except Exception as e:
+        error = str(e)
+        _, _, response = await server.run_phase(
+            environ, lambda: _error_response('GENERATION_ERROR', 'Erro ao gerar resposta', error), saved_g
+        )
+        return response
+
+    def persist():
+        try:
+            response, error = persist_generated_response(ctx, ai_response)
+            if error:
+                return jsonify(error[0]), error[1]
+            return jsonify(generation_result(ctx, response)), 201
+        except Exception as e:
+            db.session.rollback()
+            return _error_response('GENERATION_ERROR', 'Erro ao gerar resposta', str(e))
+
+    _, _, response = await server.run_phase(environ, persist, saved_g)
+    return response
+
+async def extract_questions_async(server, environ, document_id):
+    """POST /api/questions/extract-from-document/<document_id> (ver questions.extract_questions_from_document)"""
+    @jwt_required()
+    @rate_limit('ai')
+    def load():
+        try:
+            ctx, error = load_extraction_context(get_jwt_identity(), document_id, request.get_json() or {})
+            if error:
+                return jsonify(error[0]), error[1]
+            return ctx
+        except Exception as e:
+            return _error_response('EXTRACTION_ERROR', 'Erro ao extrair perguntas', str(e))
+
+    ctx, saved_g, response = await server.run_phase(environ, load)
+    if response is not None:
+        return response
+
+    try:
+        extracted_questions = await _call_ai(saved_g, call_extraction_ai_async(ctx, ctx['document']))
+    except Exception as e:
+        error = str(e)
+        _, _, response = await server.run_phase(
+            environ, lambda: _error_response('EXTRACTION_ERROR', 'Erro ao extrair perguntas', error), saved_g
+        )
+        return response
+
+    def persist():
+        try:
+            result, error = persist_extracted_questions(ctx, ctx['document'], extracted_questions)
+            if error:
+                return jsonify(error[0]), error[1]
+            return jsonify(extraction_result(result)), 201
+        except Exception as e:
+            db.session.rollback()
+            return _error_response('EXTRACTION_ERROR', 'Erro ao extrair perguntas', str(e))
+
+    _, _, response = await server.run_phase(environ, persist, saved_g)
+    return response
+
+async def bulk_extract_async(server, environ):
+    """POST /api/questions/bulk-extract (ver questions.bulk_extract_questions)
+
+    As chamadas à IA dos documentos do lote rodam concorrentemente, limitadas
+    a BULK_AI_CONCURRENCY por requisição.
+    """
+    @jwt_required()
+    @rate_limit('ai', cost=lambda req: _bulk_extract_cost(req))
+    def load():
+        try:
+            ctx, error = load_bulk_extraction_context(get_jwt_identity(), request.get_json() or {})
+            if error:
+                return jsonify(error[0]), error[1]
+            return ctx
+        except Exception as e:
+            return _error_response('BULK_EXTRACTION_ERROR', 'Erro no processamento em lote', str(e))
+
+    ctx, saved_g, response = await server.run_phase(environ, load)
+    if response is not None:
+        return response
+
+    semaphore = asyncio.Semaphore(BULK_AI_CONCURRENCY)
+
+    async def extract(document):
+        async with semaphore:
+            return await call_extraction_ai_async(ctx, document)
+
+    outcomes = await _call_ai(saved_g, asyncio.gather(
+        *(extract(document) for _, _, document in ctx['pending']),
+        return_exceptions=True
+    ))
+
+    def persist():
+        try:
+            return jsonify(persist_bulk_extraction(ctx, outcomes))
+        except Exception as e:
+            db.session.rollback()
+            return _error_response('BULK_EXTRACTION_ERROR', 'Erro no processamento em lote', str(e))
+
+    _, _, response = await server.run_phase(environ, persist, saved_g)
+    return response
+
+async def batch_generate_async(server, environ):
+    """POST /api/responses/batch-generate (ver responses.batch_generate_responses)
+
+    Uma chamada à IA por grupo de perguntas, concorrentes e limitadas a
+    BULK_AI_CONCURRENCY por requisição.
+    """
+    @jwt_required()
+    @rate_limit('ai', cost=lambda req: _batch_generate_cost(req))
+    def load():
+        try:
+            ctx, error = load_batch_generation_context(get_jwt_identity(), request.get_json() or {})
+            if error:
+                return jsonify(error[0]), error[1]
+            return ctx
+        except Exception as e:
+            return _error_response('BATCH_GENERATION_ERROR', 'Erro na geração em lote', str(e))
+
+    ctx, saved_g, response = await server.run_phase(environ, load)
+    if response is not None:
+        return response
+
+    semaphore = asyncio.Semaphore(BULK_AI_CONCURRENCY)
+
+    async def generate(generation_ctx):
+        async with semaphore:
+            return await call_generation_ai_async(generation_ctx)
+
+    outcomes = await _call_ai(saved_g, asyncio.gather(
+        *(generate(generation_ctx) for generation_ctx, _ in ctx['pending']),
+        return_exceptions=True
+    ))
+
+    def persist():
+        try:
+            return jsonify(persist_batch_generation(ctx, outcomes))
+        except Exception as e:
+            db.session.rollback()
+            return _error_response('BATCH_GENERATION_ERROR', 'Erro na geração em lote', str(e))
+
+    _, _, response = await server.run_phase(environ, persist, saved_g)
+    return response
+
+async def _read_body(receive):
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(body)
+
+def _build_environ(scope, body):
+    """Monta o environ WSGI de uma requisição ASGI (mesmo mapeamento do asgiref)"""
+    # O profiling sob demanda mede uma thread; aqui a requisição passa por várias
+    query = [(k, v) for k, v in parse_qsl(scope['query_string'].decode('latin1'), keep_blank_values=True)
+             if k != '__profile']
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': urlencode(query),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'rfp.body': body,
+    }
+
+    server = scope.get('server') or ('localhost', 80)
+    environ['SERVER_NAME'] = server[0]
+    environ['SERVER_PORT'] = str(server[1])
+
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+        environ['REMOTE_PORT'] = str(client[1])
+
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin1')
+        value = raw_value.decode('latin1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'x-profile':
+            continue
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+
+    return environ
+
+async def _send_response(send, response):
+    headers = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in response.headers.items()]
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+def create_asgi_app(flask_app):
+    """Envolve a aplicação Flask com o caminho assíncrono das rotas de IA"""
+    return AsyncAIApp(flask_app)
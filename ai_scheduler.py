@@ -0,0 +1,305 @@
+import os
+import heapq
+import asyncio
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Peso da organização na divisão da capacidade de IA, pelo plano
+TIER_WEIGHTS = {'basic': 1.0, 'professional': 2.0, 'enterprise': 4.0}
+
+# Entre organizações, a prioridade do projeto multiplica o peso da organização
+PRIORITY_BOOST = {'low': 0.5, 'medium': 1.0, 'high': 2.0, 'critical': 4.0}
+
+# Dentro de uma organização, a prioridade antecipa o prazo (EDF) em tantas horas
+PRIORITY_LEAD_HOURS = {'low': 0, 'medium': 24, 'high': 72, 'critical': 168}
+
+# Projetos sem prazo de entrega contam como se vencessem neste horizonte
+NO_DEADLINE_HORIZON_HOURS = 30 * 24
+
+# Custo relativo de cada operação (tempo aproximado de provedor)
+JOB_COSTS = {'generate_response': 1.0, 'extract_questions': 4.0}
+
+# Chamadas simultâneas por provedor, por processo; AI_PROVIDER_CONCURRENCY="gemini=32,gemma=2"
+DEFAULT_PROVIDER_CONCURRENCY = 32
+
+def schedule_for(project, organization) -> Dict[str, Any]:
+    """Atributos de agendamento de um job de IA (apenas valores simples).
+
+    Args:
+        project: Projeto da pergunta ou documento (None se o documento não tem projeto)
+        organization: Organização dona do job
+    """
+    deadline = project.submission_deadline if project is not None else None
+    return {
+        'organization_id': organization.id,
+        'weight': TIER_WEIGHTS.get(organization.subscription_tier, 1.0),
+        'priority': (project.priority if project is not None else None) or 'medium',
+        'deadline': deadline.timestamp() if deadline else None
+    }
+
+class AIJob:
+    """Um job de IA na fila: chave de ordenação, custo e quem o aguarda"""
+
+    __slots__ = ('organization_id', 'provider', 'priority', 'cost', 'weight', 'deadline',
+                 'enqueued_at', 'started', 'cancelled', 'waiter', 'payload')
+
+    def __init__(self, organization_id, provider: str = 'gemini', priority: str = 'medium',
+                 deadline: Optional[float] = None, cost: float = 1.0, weight: float = 1.0,
+                 enqueued_at: Optional[float] = None, payload: Any = None):
+        self.organization_id = organization_id
+        self.provider = provider
+        self.priority = priority if priority in PRIORITY_BOOST else 'medium'
+        self.cost = cost
+        self.weight = weight
+        self.enqueued_at = enqueued_at if enqueued_at is not None else datetime.utcnow().timestamp()
+        if deadline is None:
+            deadline = self.enqueued_at + NO_DEADLINE_HORIZON_HOURS * 3600
+        self.deadline = deadline
+        self.started = False
+        self.cancelled = False
+        self.waiter = None
+        self.payload = payload
+
+    @property
+    def effective_deadline(self) -> float:
+        return self.deadline - PRIORITY_LEAD_HOURS[self.priority] * 3600
+
+class _Flow:
+    __slots__ = ('jobs', 'start', 'finish', 'weight')
+
+    def __init__(self):
+        self.jobs = []
+        self.start = 0.0
+        self.finish = 0.0
+        self.weight = 1.0
+
+class FairQueue:
+    """Fila justa ponderada entre organizações, EDF dentro de cada uma.
+
+    Cada organização é um fluxo com tags de tempo virtual (start-time fair
+    queuing): o próximo job sai do fluxo cuja cabeça termina primeiro em
+    tempo virtual, start + custo / (peso da organização x boost da
+    prioridade). Um fluxo que volta a ter jobs começa no tempo virtual
+    atual, então uma organização com poucos jobs não espera o lote de
+    outra: disputa a próxima vaga em pé de igualdade, ponderada pelo peso.
+    Dentro do fluxo, os jobs saem pelo prazo efetivo (prazo do projeto
+    antecipado pela prioridade).
+
+    A escolha entre fluxos é uma varredura linear dos fluxos com jobs,
+    que são poucos (organizações ativas no processo).
+    """
+
+    def __init__(self):
+        self._flows: Dict[Any, _Flow] = {}
+        self._virtual_time = 0.0
+        self._sequence = itertools.count()
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, job: AIJob):
+        flow = self._flows.get(job.organization_id)
+        if flow is None:
+            flow = self._flows[job.organization_id] = _Flow()
+        if not flow.jobs:
+            flow.start = max(self._virtual_time, flow.finish)
+        flow.weight = job.weight
+        heapq.heappush(flow.jobs, (job.effective_deadline, next(self._sequence), job))
+        self._size += 1
+
+    def pop(self) -> Optional[AIJob]:
+        """Próximo job a executar (None se a fila está vazia); jobs cancelados são descartados"""
+        while self._size:
+            best, best_finish = None, None
+            for flow in self._flows.values():
+                if not flow.jobs:
+                    continue
+                head = flow.jobs[0][2]
+                finish = flow.start + head.cost / (flow.weight * PRIORITY_BOOST[head.priority])
+                if best_finish is None or finish < best_finish:
+                    best, best_finish = flow, finish
+
+            _, _, job = heapq.heappop(best.jobs)
+            self._size -= 1
+            if job.cancelled:
+                continue
+
+            self._virtual_time = max(self._virtual_time, best.start)
+            best.finish = best_finish
+            best.start = best_finish
+            self._prune()
+            return job
+        return None
+
+    def _prune(self):
+        # Fluxos vazios que já não estão à frente do tempo virtual não guardam estado útil
+        if len(self._flows) > 64:
+            for organization_id, flow in list(self._flows.items()):
+                if not flow.jobs and flow.finish <= self._virtual_time:
+                    del self._flows[organization_id]
+
+class AIJobScheduler:
+    """Agenda as chamadas à IA do processo.
+
+    Cada provedor tem uma FairQueue e um limite de chamadas simultâneas.
+    No servidor ASGI, `run` entra na fila do provedor e só executa a
+    chamada quando ganha uma vaga; as filas pertencem ao event loop atual
+    (um por worker). No servidor WSGI (gthread), `admit` e `run_sync` fazem
+    o mesmo com as threads do worker: a thread espera numa Condition até o
+    seu job sair da fila.
+    """
+
+    def __init__(self):
+        self.limits = self._parse_limits(os.getenv('AI_PROVIDER_CONCURRENCY', ''))
+        self._queues: Dict[str, FairQueue] = {}
+        self._running: Dict[str, int] = {}
+        self._loop = None
+        self._reset_threads()
+        # A Condition e as filas não sobrevivem ao fork dos workers do Gunicorn
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_threads)
+
+    def _reset_threads(self):
+        self._condition = threading.Condition()
+        self._thread_queues: Dict[str, FairQueue] = {}
+        self._thread_running: Dict[str, int] = {}
+
+    @staticmethod
+    def _parse_limits(value: str) -> Dict[str, int]:
+        limits = {}
+        for entry in value.split(','):
+            provider, _, limit = entry.partition('=')
+            if provider.strip() and limit.strip():
+                limits[provider.strip()] = int(limit)
+        return limits
+
+    def limit_for(self, provider: str) -> int:
+        return self.limits.get(provider, DEFAULT_PROVIDER_CONCURRENCY)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], organization_id, operation: str = 'generate_response',
+                  provider: str = 'gemini', priority: str = 'medium', deadline: Optional[float] = None,
+                  weight: float = 1.0) -> Any:
+        """Executa `call()` quando o job ganhar vaga no provedor.
+
+        Args:
+            call: Função sem argumentos que devolve o awaitable da chamada à IA
+            organization_id, priority, deadline, weight: ver schedule_for
+            operation: Chave de JOB_COSTS
+            provider: Provedor cujo limite de concorrência se aplica (o fallback
+                Gemma roda dentro da própria chamada ao Gemini, na mesma vaga)
+        """
+        self._bind_loop()
+        job = AIJob(organization_id, provider, priority, deadline,
+                    JOB_COSTS.get(operation, 1.0), weight)
+        job.waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(provider, FairQueue()).push(job)
+        self._dispatch(provider)
+
+        try:
+            await job.waiter
+        except asyncio.CancelledError:
+            if job.started:
+                self._release(provider)
+            else:
+                job.cancelled = True
+            raise
+
+        try:
+            return await call()
+        finally:
+            self._release(provider)
+
+    @contextmanager
+    def admit(self, organization_id, operation: str = 'generate_response', provider: str = 'gemini',
+              priority: str = 'medium', deadline: Optional[float] = None, weight: float = 1.0):
+        """Versão para threads de `run`: bloqueia a thread até o job ganhar vaga.
+
+        A vaga fica ocupada até o fim do bloco `with` (inclusive enquanto uma
+        resposta em streaming é consumida). Argumentos como em `run`.
+        """
+        job = AIJob(organization_id, provider, priority, deadline,
+                    JOB_COSTS.get(operation, 1.0), weight)
+        with self._condition:
+            self._thread_queues.setdefault(provider, FairQueue()).push(job)
+            self._dispatch_threads(provider)
+            try:
+                while not job.started:
+                    self._condition.wait()
+            except BaseException:
+                if job.started:
+                    self._release_thread(provider)
+                else:
+                    job.cancelled = True
+                raise
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._release_thread(provider)
+
+    def run_sync(self, call: Callable[[], Any], organization_id, **schedule) -> Any:
+        """Executa `call()` (síncrona) quando o job ganhar vaga no provedor; ver `admit`"""
+        with self.admit(organization_id, **schedule):
+            return call()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Chamadas em andamento e na fila, por provedor (event loop e threads somados)"""
+        stats = {}
+        for running, queues in ((self._running, self._queues), (self._thread_running, self._thread_queues)):
+            for provider, queue in queues.items():
+                entry = stats.setdefault(provider, {'running': 0, 'queued': 0, 'limit': self.limit_for(provider)})
+                entry['running'] += running.get(provider, 0)
+                entry['queued'] += len(queue)
+        return stats
+
+    def _bind_loop(self):
+        # Futures pertencem a um loop; um loop novo (outro worker, testes) começa do zero
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queues, self._running, self._loop = {}, {}, loop
+
+    def _dispatch(self, provider: str):
+        queue = self._queues.get(provider)
+        while queue and self._running.get(provider, 0) < self.limit_for(provider):
+            job = queue.pop()
+            if job is None:
+                return
+            # Tarefa cancelada que ainda não retomou (job.cancelled ainda não marcado)
+            if job.waiter.done():
+                continue
+            job.started = True
+            self._running[provider] = self._running.get(provider, 0) + 1
+            job.waiter.set_result(None)
+
+    def _release(self, provider: str):
+        self._running[provider] -= 1
+        self._dispatch(provider)
+
+    def _dispatch_threads(self, provider: str):
+        # Chamado com a Condition travada
+        queue = self._thread_queues.get(provider)
+        started = False
+        while queue and self._thread_running.get(provider, 0) < self.limit_for(provider):
+            job = queue.pop()
+            if job is None:
+                break
+            job.started = True
+            self._thread_running[provider] = self._thread_running.get(provider, 0) + 1
+            started = True
+        if started:
+            self._condition.notify_all()
+
+    def _release_thread(self, provider: str):
+        self._thread_running[provider] -= 1
+        self._dispatch_threads(provider)
+
+# Instância global do serviço
+ai_scheduler = AIJobScheduler()
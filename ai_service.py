@@ -1,44 +1,166 @@
 import os
-import requests
+import time
+import asyncio
 import json
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, Iterator
 from datetime import datetime
 import logging
+from src.middleware.instrumentation import record_ai_call
+from src.services.json_stream import JSONArrayStreamParser
+from src.services.extraction_schema import EXTRACTION_RESPONSE_SCHEMA, validate_question
 
 logger = logging.getLogger(__name__)
 
 class AIService:
-    """Serviço para integração com modelos de IA (Gemini e Gemma)"""
+    """Serviço para integração com modelos de IA (Gemini e Gemma)
+    
+    Os métodos *_async têm o mesmo comportamento dos síncronos, mas usam um
+    cliente HTTP assíncrono (httpx) para que um único processo mantenha
+    centenas de chamadas em andamento sem ocupar uma thread por chamada.
+    """
+    
+    # Saída estruturada: o Gemini devolve apenas o array JSON no formato do schema
+    EXTRACTION_CONFIG = {
+        "temperature": 0.1,
+        "topK": 40,
+        "topP": 0.95,
+        "maxOutputTokens": 8192,
+        "responseMimeType": "application/json",
+        "responseSchema": EXTRACTION_RESPONSE_SCHEMA,
+    }
+    
+    RESPONSE_CONFIG = {
+        "temperature": 0.3,
+        "topK": 40,
+        "topP": 0.95,
+        "maxOutputTokens": 4096,
+    }
     
     def __init__(self):
         self.gemini_api_key = os.getenv('GEMINI_API_KEY')
         self.gemma_model_path = os.getenv('GEMMA_MODEL_PATH')
-        self.gemini_base_url = "https://generativelanguage.googleapis.com/v1beta"
+        self.gemini_base_url = os.getenv('GEMINI_BASE_URL', "https://generativelanguage.googleapis.com/v1beta")
+        self.request_timeout = int(os.getenv('AI_REQUEST_TIMEOUT', 60))
+        self.gemini_model = 'gemini-1.5-pro'
+        self.max_async_connections = int(os.getenv('AI_MAX_CONNECTIONS', 500))
+        self._async_client = None
+        self._async_client_loop = None
         
     def extract_questions_from_text(self, text: str, document_type: str = 'rfp', 
-                                  language: str = 'pt-BR') -> List[Dict[str, Any]]:
+                                  language: str = 'pt-BR', organization_id=None,
+                                  user_id=None) -> List[Dict[str, Any]]:
         """Extrai perguntas de um texto usando IA"""
+        started = time.perf_counter()
         try:
             # Tentar primeiro com Gemini
-            return self._extract_questions_gemini(text, document_type, language)
+            questions, usage = self._extract_questions_gemini(text, document_type, language)
+            self._record_usage('extract_questions', self.gemini_model, started, usage,
+                               organization_id, user_id)
+            return questions
         except Exception as e:
             logger.warning(f"Falha na extração com Gemini: {e}")
             try:
                 # Fallback para Gemma
-                return self._extract_questions_gemma(text, document_type, language)
+                questions = self._extract_questions_gemma(text, document_type, language)
+                self._record_usage('extract_questions', 'gemma-fallback', started, None,
+                                   organization_id, user_id)
+                return questions
+            except Exception as e2:
+                logger.error(f"Falha na extração com Gemma: {e2}")
+                raise Exception(f"Falha em ambos os modelos de IA: Gemini ({e}), Gemma ({e2})")
+    
+    def stream_extract_questions(self, text: str, document_type: str = 'rfp',
+                                 language: str = 'pt-BR', organization_id=None,
+                                 user_id=None) -> Iterator[Dict[str, Any]]:
+        """Extrai perguntas em streaming, emitindo cada uma assim que o modelo a fecha.
+        
+        Gera eventos {'type': 'question', 'question': dict} e, para itens
+        inválidos ou truncados, {'type': 'malformed', 'index', 'message', 'raw'}.
+        Se o Gemini falhar antes do primeiro item, usa o fallback Gemma; se
+        falhar depois, a exceção sobe e os itens já emitidos continuam válidos.
+        """
+        started = time.perf_counter()
+        parser = JSONArrayStreamParser()
+        usage = {}
+        try:
+            prompt = self._build_extraction_prompt(text, document_type, language)
+            for fragment, fragment_usage in self._stream_gemini(prompt, self.EXTRACTION_CONFIG):
+                usage = fragment_usage or usage
+                for event in parser.feed(fragment):
+                    yield self._extraction_event(event)
+            for event in parser.close():
+                yield self._extraction_event(event)
+        except Exception as e:
+            if parser.items or parser.errors:
+                raise
+            logger.warning(f"Falha na extração em streaming com Gemini: {e}")
+            try:
+                questions = self._extract_questions_gemma(text, document_type, language)
             except Exception as e2:
                 logger.error(f"Falha na extração com Gemma: {e2}")
                 raise Exception(f"Falha em ambos os modelos de IA: Gemini ({e}), Gemma ({e2})")
+            self._record_usage('extract_questions', 'gemma-fallback', started, None,
+                               organization_id, user_id)
+            for question in questions:
+                yield {'type': 'question', 'question': question}
+            return
+        
+        self._record_usage('extract_questions', self.gemini_model, started, usage,
+                           organization_id, user_id)
+    
+    def _extraction_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Converte um evento do parser em pergunta validada ou item malformado"""
+        if event['type'] == 'item':
+            try:
+                return {'type': 'question', 'question': validate_question(event['value'])}
+            except ValueError as e:
+                event = dict(event, message=str(e), raw=json.dumps(event['value'], ensure_ascii=False)[:500])
+        return {
+            'type': 'malformed',
+            'index': event['index'],
+            'message': event['message'],
+            'raw': event['raw']
+        }
     
     def _extract_questions_gemini(self, text: str, document_type: str, 
-                                language: str) -> List[Dict[str, Any]]:
+                                language: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """Extrai perguntas usando Google Gemini API"""
+        prompt = self._build_extraction_prompt(text, document_type, language)
+        
+        content, usage = self._call_gemini(prompt, self.EXTRACTION_CONFIG)
+        return self._parse_extracted_questions(content), usage
+    
+    async def extract_questions_from_text_async(self, text: str, document_type: str = 'rfp',
+                                                language: str = 'pt-BR', organization_id=None,
+                                                user_id=None) -> List[Dict[str, Any]]:
+        """Versão assíncrona de extract_questions_from_text"""
+        started = time.perf_counter()
+        try:
+            prompt = self._build_extraction_prompt(text, document_type, language)
+            content, usage = await self._call_gemini_async(prompt, self.EXTRACTION_CONFIG)
+            questions = self._parse_extracted_questions(content)
+            self._record_usage('extract_questions', self.gemini_model, started, usage,
+                               organization_id, user_id)
+            return questions
+        except Exception as e:
+            logger.warning(f"Falha na extração com Gemini: {e}")
+            try:
+                # Fallback para Gemma
+                questions = self._extract_questions_gemma(text, document_type, language)
+                self._record_usage('extract_questions', 'gemma-fallback', started, None,
+                                   organization_id, user_id)
+                return questions
+            except Exception as e2:
+                logger.error(f"Falha na extração com Gemma: {e2}")
+                raise Exception(f"Falha em ambos os modelos de IA: Gemini ({e}), Gemma ({e2})")
+    
+    def _gemini_request(self, prompt: str, generation_config: Dict[str, Any],
+                        method: str = 'generateContent') -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Monta URL, headers e payload de generateContent (ou streamGenerateContent)"""
         if not self.gemini_api_key:
             raise Exception("GEMINI_API_KEY não configurada")
         
-        prompt = self._build_extraction_prompt(text, document_type, language)
-        
-        url = f"{self.gemini_base_url}/models/gemini-1.5-pro:generateContent"
+        url = f"{self.gemini_base_url}/models/{self.gemini_model}:{method}"
         headers = {
             'Content-Type': 'application/json',
             'x-goog-api-key': self.gemini_api_key
@@ -50,24 +172,114 @@ class AIService:
                     "text": prompt
                 }]
             }],
-            "generationConfig": {
-                "temperature": 0.1,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 8192,
-            }
+            "generationConfig": generation_config
         }
+        return url, headers, payload
+    
+    def _call_gemini(self, prompt: str, generation_config: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Executa generateContent e retorna o texto e o usageMetadata"""
+        # requests e httpx são importados sob demanda para não pesar na inicialização
+        import requests
+        
+        url, headers, payload = self._gemini_request(prompt, generation_config)
+        
+        started = time.perf_counter()
+        try:
+            response = requests.post(url, headers=headers, json=payload, timeout=self.request_timeout)
+        finally:
+            record_ai_call(time.perf_counter() - started, self.gemini_model)
+        response.raise_for_status()
+        
+        return self._parse_gemini_result(response.json())
+    
+    def _stream_gemini(self, prompt: str, generation_config: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Executa streamGenerateContent (SSE) e gera (trecho de texto, usageMetadata) por evento"""
+        import requests
+        
+        url, headers, payload = self._gemini_request(prompt, generation_config, 'streamGenerateContent')
         
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
+        started = time.perf_counter()
+        try:
+            with requests.post(url, params={'alt': 'sse'}, headers=headers, json=payload,
+                               timeout=self.request_timeout, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    event = json.loads(line[len('data:'):])
+                    parts = ((event.get('candidates') or [{}])[0].get('content') or {}).get('parts') or []
+                    yield ''.join(part.get('text', '') for part in parts), event.get('usageMetadata') or {}
+        finally:
+            record_ai_call(time.perf_counter() - started, self.gemini_model)
+    
+    async def _call_gemini_async(self, prompt: str, generation_config: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Versão assíncrona de _call_gemini (não ocupa thread durante a espera)"""
+        url, headers, payload = self._gemini_request(prompt, generation_config)
+        client = self._get_async_client()
+        
+        started = time.perf_counter()
+        try:
+            response = await client.post(url, headers=headers, json=payload)
+        finally:
+            record_ai_call(time.perf_counter() - started, self.gemini_model)
         response.raise_for_status()
         
-        result = response.json()
+        return self._parse_gemini_result(response.json())
+    
+    def _get_async_client(self):
+        """Cliente httpx compartilhado pelas chamadas do event loop atual"""
+        try:
+            import httpx
+        except ImportError:
+            raise Exception("Pacote 'httpx' é necessário para as chamadas assíncronas de IA")
         
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                timeout=self.request_timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_async_connections,
+                    max_keepalive_connections=min(100, self.max_async_connections)
+                )
+            )
+            self._async_client_loop = loop
+        return self._async_client
+    
+    async def aclose(self):
+        """Fecha o cliente assíncrono (chamado no encerramento do servidor ASGI)"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_client_loop = None
+    
+    def _parse_gemini_result(self, result: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """Extrai o texto e o usageMetadata da resposta de generateContent"""
         if 'candidates' not in result or not result['candidates']:
             raise Exception("Resposta inválida da API Gemini")
         
         content = result['candidates'][0]['content']['parts'][0]['text']
-        return self._parse_extracted_questions(content)
+        return content, result.get('usageMetadata') or {}
+    
+    def _record_usage(self, operation: str, model: str, started: float,
+                      usage: Optional[Dict[str, Any]], organization_id, user_id):
+        """Emite o registro de medição da chamada (nunca interrompe a chamada)"""
+        if not organization_id:
+            return
+        
+        try:
+            from src.services.usage_metering import usage_meter
+            usage = usage or {}
+            usage_meter.record(
+                organization_id,
+                model,
+                operation,
+                prompt_tokens=usage.get('promptTokenCount', 0),
+                output_tokens=usage.get('candidatesTokenCount', 0),
+                latency_ms=int((time.perf_counter() - started) * 1000),
+                user_id=user_id
+            )
+        except Exception as e:
+            logger.error(f"Erro ao registrar uso de IA: {e}")
     
     def _extract_questions_gemma(self, text: str, document_type: str, 
                                 language: str) -> List[Dict[str, Any]]:
@@ -148,104 +360,109 @@ Retorne apenas um array JSON válido com as perguntas extraídas.
 """
     
     def _parse_extracted_questions(self, content: str) -> List[Dict[str, Any]]:
-        """Faz parse das perguntas extraídas"""
+        """Faz parse das perguntas extraídas.
+        
+        Com saída estruturada o conteúdo é o próprio array JSON e é lido de
+        uma vez. Se não for (saída truncada no limite de tokens, resposta do
+        modelo sem schema), cada item do array é decodificado e validado
+        isoladamente: itens inválidos ou truncados são registrados e
+        descartados sem perder os demais. Só falha se não houver array ou
+        nenhum item aproveitável.
+        """
         try:
-            # Tentar extrair JSON do conteúdo
-            start = content.find('[')
-            end = content.rfind(']') + 1
-            
-            if start == -1 or end == 0:
+            items = json.loads(content)
+        except ValueError:
+            items = None
+        
+        if isinstance(items, list):
+            events = [self._extraction_event({'type': 'item', 'index': index, 'value': item})
+                      for index, item in enumerate(items)]
+        else:
+            parser = JSONArrayStreamParser()
+            events = [self._extraction_event(event) for event in list(parser.feed(content)) + list(parser.close())]
+            if not parser.started:
                 raise Exception("JSON não encontrado na resposta")
-            
-            json_content = content[start:end]
-            questions = json.loads(json_content)
-            
-            # Validar e limpar dados
-            validated_questions = []
-            for q in questions:
-                if isinstance(q, dict) and 'question_text' in q:
-                    validated_questions.append({
-                        'question_text': q.get('question_text', ''),
-                        'question_number': q.get('question_number'),
-                        'section': q.get('section'),
-                        'category': q.get('category', 'general'),
-                        'question_type': q.get('question_type', 'open'),
-                        'required': q.get('required', False),
-                        'max_words': q.get('max_words'),
-                        'keywords': q.get('keywords', []),
-                        'context': q.get('context'),
-                        'confidence_score': q.get('confidence_score', 0.8)
-                    })
-            
-            return validated_questions
         
-        except json.JSONDecodeError as e:
-            logger.error(f"Erro ao fazer parse do JSON: {e}")
+        validated_questions = [event['question'] for event in events if event['type'] == 'question']
+        for event in events:
+            if event['type'] == 'malformed':
+                logger.warning(f"Item {event['index']} da extração descartado: {event['message']}")
+        
+        if not validated_questions and any(event['type'] == 'malformed' for event in events):
             raise Exception("Resposta da IA não está em formato JSON válido")
+        
+        return validated_questions
     
     def generate_response(self, question_text: str, context_documents: List[str] = None,
                          max_words: int = None, tone: str = 'professional',
-                         language: str = 'pt-BR') -> Dict[str, Any]:
+                         language: str = 'pt-BR', organization_id=None,
+                         user_id=None) -> Dict[str, Any]:
         """Gera resposta para uma pergunta"""
+        started = time.perf_counter()
         try:
             # Tentar primeiro com Gemini
-            return self._generate_response_gemini(question_text, context_documents, 
-                                                max_words, tone, language)
+            result, usage = self._generate_response_gemini(question_text, context_documents, 
+                                                         max_words, tone, language)
+            self._record_usage('generate_response', self.gemini_model, started, usage,
+                               organization_id, user_id)
+            return result
+        except Exception as e:
+            logger.warning(f"Falha na geração com Gemini: {e}")
+            try:
+                # Fallback para Gemma
+                result = self._generate_response_gemma(question_text, context_documents,
+                                                     max_words, tone, language)
+                self._record_usage('generate_response', 'gemma-fallback', started, None,
+                                   organization_id, user_id)
+                return result
+            except Exception as e2:
+                logger.error(f"Falha na geração com Gemma: {e2}")
+                raise Exception(f"Falha em ambos os modelos de IA: Gemini ({e}), Gemma ({e2})")
+    
+    async def generate_response_async(self, question_text: str, context_documents: List[str] = None,
+                                      max_words: int = None, tone: str = 'professional',
+                                      language: str = 'pt-BR', organization_id=None,
+                                      user_id=None) -> Dict[str, Any]:
+        """Versão assíncrona de generate_response"""
+        started = time.perf_counter()
+        try:
+            prompt = self._build_response_prompt(question_text, context_documents,
+                                               max_words, tone, language)
+            content, usage = await self._call_gemini_async(prompt, self.RESPONSE_CONFIG)
+            result = self._gemini_response_result(content, context_documents)
+            self._record_usage('generate_response', self.gemini_model, started, usage,
+                               organization_id, user_id)
+            return result
         except Exception as e:
             logger.warning(f"Falha na geração com Gemini: {e}")
             try:
                 # Fallback para Gemma
-                return self._generate_response_gemma(question_text, context_documents,
-                                                   max_words, tone, language)
+                result = self._generate_response_gemma(question_text, context_documents,
+                                                     max_words, tone, language)
+                self._record_usage('generate_response', 'gemma-fallback', started, None,
+                                   organization_id, user_id)
+                return result
             except Exception as e2:
                 logger.error(f"Falha na geração com Gemma: {e2}")
                 raise Exception(f"Falha em ambos os modelos de IA: Gemini ({e}), Gemma ({e2})")
     
     def _generate_response_gemini(self, question_text: str, context_documents: List[str],
-                                max_words: int, tone: str, language: str) -> Dict[str, Any]:
+                                max_words: int, tone: str, language: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         """Gera resposta usando Google Gemini API"""
-        if not self.gemini_api_key:
-            raise Exception("GEMINI_API_KEY não configurada")
-        
         prompt = self._build_response_prompt(question_text, context_documents, 
                                            max_words, tone, language)
         
-        url = f"{self.gemini_base_url}/models/gemini-1.5-pro:generateContent"
-        headers = {
-            'Content-Type': 'application/json',
-            'x-goog-api-key': self.gemini_api_key
-        }
-        
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
-            }],
-            "generationConfig": {
-                "temperature": 0.3,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 4096,
-            }
-        }
-        
-        response = requests.post(url, headers=headers, json=payload, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        if 'candidates' not in result or not result['candidates']:
-            raise Exception("Resposta inválida da API Gemini")
-        
-        content = result['candidates'][0]['content']['parts'][0]['text']
-        
+        content, usage = self._call_gemini(prompt, self.RESPONSE_CONFIG)
+        return self._gemini_response_result(content, context_documents), usage
+    
+    def _gemini_response_result(self, content: str, context_documents: List[str]) -> Dict[str, Any]:
+        """Monta o resultado de geração a partir do texto retornado pelo Gemini"""
         return {
             'response_text': content.strip(),
             'word_count': len(content.split()),
             'character_count': len(content),
             'confidence_score': 0.9,
-            'generated_by': 'gemini-1.5-pro',
+            'generated_by': self.gemini_model,
             'generated_at': datetime.utcnow(),
             'source_documents': context_documents or []
         }
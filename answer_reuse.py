@@ -0,0 +1,176 @@
+import re
+import hashlib
+import logging
+import unicodedata
+from typing import Any, Dict, List, Set
+from sqlalchemy import and_, or_, func
+from src.models.user import db
+from src.models.project import Project
+from src.models.question import Question
+from src.models.response import Response
+from src.models.question_signature import QuestionSignatureBand
+
+logger = logging.getLogger(__name__)
+
+# MinHash com NUM_PERM compartimentos (potência de 2), em BANDS bandas de ROWS
+# valores: pares com similaridade de Jaccard s colidem em ao menos uma banda com
+# probabilidade 1 - (1 - s^ROWS)^BANDS (~0.999 para s = 0.8, ~0.12 para s = 0.3)
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Shingles de caracteres: toleram pequenas variações de redação e plural
+SHINGLE_SIZE = 4
+
+# Limite de candidatas das bandas avaliadas pela similaridade exata
+MAX_CANDIDATES = 50
+
+# Os valores de um compartimento usam os bits acima dos de índice; compartimentos
+# vazios recebem o valor do próximo não vazio deslocado por múltiplos de _FILL_STEP
+_BIN_BITS = NUM_PERM.bit_length() - 1
+_FILL_STEP = 1 << (64 - _BIN_BITS)
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação, com espaços simples"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return ' '.join(re.findall(r'\w+', text))
+
+def shingles(text: str) -> Set[str]:
+    normalized = normalize_text(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+_MASK64 = (1 << 64) - 1
+
+def _hash64(value: str) -> int:
+    """Finalizador do splitmix64 sobre os bytes do shingle (estável entre processos)"""
+    z = (int.from_bytes(value.encode('utf-8'), 'little') + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+def minhash(shingle_set: Set[str], hash_function=_hash64) -> List[int]:
+    """Assinatura MinHash de permutação única (one permutation hashing).
+
+    Cada shingle é hasheado uma só vez e cai em um de NUM_PERM
+    compartimentos, onde vale o menor valor; a probabilidade de dois textos
+    coincidirem em um compartimento aproxima a similaridade de Jaccard, com
+    custo linear no número de shingles. Compartimentos vazios copiam o
+    próximo não vazio (densificação por rotação).
+
+    `hash_function` deve devolver inteiros de 64 bits sem sinal; o padrão é
+    estável entre processos, exigido para as bandas gravadas no banco.
+    """
+    bins = [None] * NUM_PERM
+    for h in map(hash_function, shingle_set):
+        index, value = h & (NUM_PERM - 1), h >> _BIN_BITS
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+    if not shingle_set:
+        return []
+
+    signature = []
+    for index in range(NUM_PERM):
+        offset = 0
+        while bins[(index + offset) % NUM_PERM] is None:
+            offset += 1
+        signature.append(bins[(index + offset) % NUM_PERM] + offset * _FILL_STEP)
+    return signature
+
+def band_hashes(signature: List[int]) -> List[tuple]:
+    """(banda, hash de 64 bits com sinal da banda) para cada banda da assinatura"""
+    bands = []
+    for band in range(BANDS if signature else 0):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(','.join(map(str, rows)).encode('ascii'), digest_size=8).digest()
+        bands.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return bands
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+def index_question(question: Question, organization_id) -> None:
+    """(Re)indexa o texto de uma pergunta na transação corrente (não confirma)"""
+    QuestionSignatureBand.query.filter_by(question_id=question.id).delete(synchronize_session=False)
+    db.session.add_all([
+        QuestionSignatureBand(
+            question_id=question.id,
+            band=band,
+            organization_id=organization_id,
+            band_hash=band_hash
+        )
+        for band, band_hash in band_hashes(minhash(shingles(question.question_text)))
+    ])
+
+def reindex_if_indexed(question: Question, organization_id) -> None:
+    """Atualiza o índice após edição do texto, se a pergunta já estava indexada"""
+    if QuestionSignatureBand.query.filter_by(question_id=question.id).first() is not None:
+        index_question(question, organization_id)
+
+def find_reusable_answers(organization_id, question_text: str, exclude_question_id=None,
+                          threshold: float = 0.0, limit: int = 3) -> List[Dict[str, Any]]:
+    """Respostas aprovadas de perguntas quase idênticas da mesma organização.
+
+    As bandas LSH selecionam candidatas com uma consulta indexada; a
+    similaridade de Jaccard exata entre os shingles decide a ordem e o
+    corte. Para cada pergunta vale a aprovação mais recente.
+
+    Returns:
+        list: dicts com question_id, question_text, response e similarity,
+              da maior para a menor similaridade
+    """
+    target = shingles(question_text)
+    bands = band_hashes(minhash(target))
+    if not bands:
+        return []
+
+    candidate_query = db.session.query(QuestionSignatureBand.question_id).filter(
+        QuestionSignatureBand.organization_id == organization_id,
+        or_(*(and_(QuestionSignatureBand.band == band, QuestionSignatureBand.band_hash == band_hash)
+              for band, band_hash in bands))
+    )
+    if exclude_question_id is not None:
+        candidate_query = candidate_query.filter(QuestionSignatureBand.question_id != exclude_question_id)
+    # Mais bandas em comum primeiro: o corte em MAX_CANDIDATES descarta as mais distantes
+    candidate_ids = [row[0] for row in candidate_query.group_by(QuestionSignatureBand.question_id).order_by(
+        func.count().desc()
+    ).limit(MAX_CANDIDATES)]
+    if not candidate_ids:
+        return []
+
+    questions = Question.query.join(Project).filter(
+        Question.id.in_(candidate_ids),
+        Project.organization_id == organization_id,
+        Question.is_active == True
+    ).all()
+
+    scored = []
+    for question in questions:
+        similarity = jaccard(target, shingles(question.question_text))
+        if similarity >= threshold:
+            scored.append((similarity, question))
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    matches = []
+    for similarity, question in scored:
+        response = Response.query.filter(
+            Response.question_id == question.id,
+            Response.status == 'approved',
+            Response.is_active == True
+        ).order_by(Response.approved_at.desc()).first()
+        if response is None:
+            continue
+        matches.append({
+            'question_id': question.id,
+            'question_text': question.question_text,
+            'response': response,
+            'similarity': round(similarity, 4)
+        })
+        if len(matches) >= limit:
+            break
+    return matches
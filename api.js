@@ -124,9 +124,11 @@ class ApiClient {
     return this.request(`/questions${queryString ? `?${queryString}` : ''}`);
   }
 
-  async extractQuestionsFromDocument(documentId, options = {}) {
+  // Reenviar com a mesma idempotencyKey devolve o resultado da primeira chamada
+  async extractQuestionsFromDocument(documentId, options = {}, idempotencyKey = crypto.randomUUID()) {
     return this.request(`/questions/extract-from-document/${documentId}`, {
       method: 'POST',
+      headers: { ...this.getAuthHeaders(), 'Idempotency-Key': idempotencyKey },
       body: JSON.stringify(options),
     });
   }
@@ -139,9 +141,10 @@ class ApiClient {
   }
 
   // Métodos de respostas
-  async generateResponse(questionId, options = {}) {
+  async generateResponse(questionId, options = {}, idempotencyKey = crypto.randomUUID()) {
     return this.request(`/responses/generate/${questionId}`, {
       method: 'POST',
+      headers: { ...this.getAuthHeaders(), 'Idempotency-Key': idempotencyKey },
       body: JSON.stringify(options),
     });
   }
@@ -0,0 +1,13 @@
+"""Ponto de entrada ASGI para produção.
+
+As rotas de IA (geração de respostas e extração de perguntas) rodam com
+asyncio; as demais continuam na aplicação Flask (WSGI).
+
+    uvicorn asgi:app --workers 2
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+from main import app as flask_app
+from src.routes.ai_async import create_asgi_app
+
+app = create_asgi_app(flask_app)
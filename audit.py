@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from datetime import datetime
+from src.models.user import User
+from src.middleware.auth_middleware import role_required
+from src.services.audit_service import audit_trail
+from src.extensions.db_routing import read_only
+
+audit_bp = Blueprint('audit', __name__)
+
+def _parse_datetime(value):
+    """Converte parâmetro ISO 8601 em datetime (None se ausente)"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+@audit_bp.route('', methods=['GET'])
+@role_required('admin')
+@read_only
+def list_audit_events():
+    """Consultar eventos de auditoria da organização"""
+    try:
+        user = User.query.get(get_jwt_identity())
+
+        # Parâmetros de consulta
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+
+        try:
+            since = _parse_datetime(request.args.get('since'))
+            until = _parse_datetime(request.args.get('until'))
+        except ValueError:
+            return jsonify({
+                'error': {
+                    'code': 'INVALID_DATE',
+                    'message': 'Parâmetros since/until devem estar no formato ISO 8601'
+                }
+            }), 400
+
+        events = audit_trail.query(
+            organization_id=user.organization_id,
+            user_id=request.args.get('user_id'),
+            resource_type=request.args.get('resource_type'),
+            resource_id=request.args.get('resource_id'),
+            since=since,
+            until=until,
+            limit=limit
+        )
+
+        return jsonify({
+            'data': events,
+            'count': len(events)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'AUDIT_QUERY_ERROR',
+                'message': 'Erro ao consultar eventos de auditoria',
+                'details': str(e)
+            }
+        }), 500
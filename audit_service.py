@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from src.services.write_behind import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+# Ordem dos campos de cada evento no ring buffer (tuplas são mais baratas que dicts)
+EVENT_FIELDS = (
+    'timestamp', 'organization_id', 'user_id', 'action', 'resource_type',
+    'resource_id', 'details', 'status_code', 'ip_address', 'user_agent', 'request_id'
+)
+
+# Tamanho dos blocos lidos do fim de um segmento na consulta
+READ_CHUNK_BYTES = 256 * 1024
+
+class AuditTrail(BufferedWriter):
+    """Pipeline de auditoria não bloqueante.
+
+    `record` só faz um append em um ring buffer (deque com maxlen, atômico
+    sob o GIL). A thread de fundo serializa os eventos em lote para
+    segmentos JSONL append-only, rotacionados por tamanho, um conjunto de
+    arquivos por processo.
+    """
+
+    def __init__(self):
+        super().__init__('audit_trail', flush_interval=1.0, max_batch=1000)
+        self._buffer = deque(maxlen=100000)
+        self.directory = 'audit_logs'
+        self.segment_max_bytes = 64 * 1024 * 1024
+        self.max_segments = 200
+        self._segment_path = None
+        self._segment_size = 0
+        self._dropped = 0
+
+    def init_app(self, app):
+        super().init_app(app)
+        self.directory = app.config.get('AUDIT_LOG_DIR', self.directory)
+        self.segment_max_bytes = app.config.get('AUDIT_SEGMENT_MAX_BYTES', self.segment_max_bytes)
+        self.max_segments = app.config.get('AUDIT_MAX_SEGMENTS', self.max_segments)
+        self._buffer = deque(maxlen=app.config.get('AUDIT_BUFFER_SIZE', self._buffer.maxlen))
+        os.makedirs(self.directory, exist_ok=True)
+
+    def record(self, action, resource_type=None, resource_id=None, details=None,
+               user_id=None, organization_id=None, status_code=None,
+               ip_address=None, user_agent=None, request_id=None):
+        """Registra um evento de auditoria (custo: um append em memória)"""
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self._dropped += 1
+
+        buffer.append((
+            time.time(), organization_id, user_id, action, resource_type,
+            resource_id, details, status_code, ip_address, user_agent, request_id
+        ))
+        self._ensure_thread()
+        if len(buffer) >= self.max_batch:
+            self._wake.set()
+
+    def put(self, item):
+        self._buffer.append(item)
+        self._ensure_thread()
+
+    def _drain(self) -> List[tuple]:
+        batch = []
+        popleft = self._buffer.popleft
+        while True:
+            try:
+                batch.append(popleft())
+            except IndexError:
+                break
+
+        if self._dropped:
+            logger.warning(f"Auditoria: {self._dropped} eventos descartados (buffer cheio)")
+            self._dropped = 0
+        return batch
+
+    def write_batch(self, batch: List[tuple]):
+        lines = ''.join(
+            json.dumps(self._to_dict(event), default=str, ensure_ascii=False) + '\n'
+            for event in batch
+        ).encode('utf-8')
+
+        try:
+            path = self._current_segment(len(lines))
+            with open(path, 'ab') as f:
+                f.write(lines)
+            self._segment_size += len(lines)
+        except OSError as e:
+            logger.error(f"Erro ao gravar {len(batch)} eventos de auditoria: {e}")
+
+    def _current_segment(self, incoming: int) -> str:
+        """Retorna o segmento ativo, abrindo um novo quando o atual enche"""
+        if self._segment_path is None or self._segment_size + incoming > self.segment_max_bytes:
+            stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+            self._segment_path = os.path.join(self.directory, f'audit-{stamp}-{os.getpid()}.jsonl')
+            self._segment_size = 0
+            self._enforce_retention()
+        return self._segment_path
+
+    def _segments(self) -> List[str]:
+        """Segmentos existentes, do mais antigo para o mais recente"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.startswith('audit-') and n.endswith('.jsonl')]
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in sorted(names)]
+
+    def _enforce_retention(self):
+        segments = self._segments()
+        for path in segments[:max(0, len(segments) - self.max_segments + 1)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _to_dict(event: tuple) -> Dict[str, Any]:
+        data = dict(zip(EVENT_FIELDS, event))
+        data['timestamp'] = datetime.utcfromtimestamp(data['timestamp']).isoformat() + 'Z'
+        return data
+
+    def query(self, organization_id, user_id=None, resource_type=None, resource_id=None,
+              since: Optional[datetime] = None, until: Optional[datetime] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """Consulta eventos da organização por usuário, recurso e intervalo de tempo (mais recentes primeiro).
+
+        A organização é obrigatória: sem ela nada é devolvido. Os segmentos
+        são lidos de trás para frente em blocos, sem carregar o arquivo
+        inteiro, e linhas de outras organizações são descartadas antes do
+        parse do JSON.
+        """
+        if organization_id is None:
+            return []
+
+        since_ts = _epoch(since) if since else None
+        until_ts = _epoch(until) if until else None
+        filters = {
+            'organization_id': organization_id,
+            'user_id': user_id,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+        }
+        filters = {k: str(v) for k, v in filters.items() if v is not None}
+        # Como json.dumps grava o campo em write_batch
+        needle = json.dumps({'organization_id': filters['organization_id']})[1:-1].encode('utf-8')
+
+        def matches(event: Dict[str, Any], ts: float) -> bool:
+            if since_ts is not None and ts < since_ts:
+                return False
+            if until_ts is not None and ts > until_ts:
+                return False
+            return all(str(event.get(k)) == v for k, v in filters.items())
+
+        results = []
+
+        # Eventos ainda não gravados
+        for event in reversed(list(self._buffer)):
+            data = dict(zip(EVENT_FIELDS, event))
+            if matches(data, data['timestamp']):
+                results.append(self._to_dict(event))
+                if len(results) >= limit:
+                    return results
+
+        for path, start, end in reversed(self._segment_spans()):
+            # Segmentos que começaram depois do fim do intervalo ou terminaram antes do início
+            if until_ts is not None and start > until_ts:
+                continue
+            if since_ts is not None and end is not None and end < since_ts:
+                continue
+
+            for line in _reverse_lines(path):
+                if needle not in line:
+                    continue
+                try:
+                    data = json.loads(line)
+                    ts = _epoch(datetime.fromisoformat(data['timestamp'].rstrip('Z')))
+                except (ValueError, KeyError):
+                    continue
+                if since_ts is not None and ts < since_ts:
+                    # Eventos de um segmento estão em ordem: o resto é mais antigo
+                    break
+                if matches(data, ts):
+                    results.append(data)
+                    if len(results) >= limit:
+                        return results
+
+        return results
+
+    def _segment_spans(self) -> List[tuple]:
+        """(caminho, início, fim) de cada segmento, pelo nome do arquivo.
+
+        Um segmento termina quando o mesmo processo abre o seguinte; o
+        último de cada processo ainda pode estar recebendo eventos (fim None).
+        """
+        spans = []
+        next_start = {}
+        for path in reversed(self._segments()):
+            start = self._segment_start(path)
+            pid = self._segment_pid(path)
+            spans.append((path, start, next_start.get(pid)))
+            next_start[pid] = start
+        spans.reverse()
+        return spans
+
+    @staticmethod
+    def _segment_start(path: str) -> float:
+        stamp = os.path.basename(path).split('-')[1]
+        return _epoch(datetime.strptime(stamp, '%Y%m%dT%H%M%S%f'))
+
+    @staticmethod
+    def _segment_pid(path: str) -> str:
+        return os.path.basename(path)[:-len('.jsonl')].split('-')[2]
+
+def _reverse_lines(path: str, chunk_size: int = READ_CHUNK_BYTES):
+    """Linhas (bytes) do arquivo da última para a primeira, lendo blocos a partir do fim"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b''
+        while position > 0:
+            size = min(chunk_size, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b'\n')
+            tail = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if tail:
+            yield tail
+
+def _epoch(moment: datetime) -> float:
+    """Converte datetime (naive = UTC) em timestamp"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+# Instância global do serviço
+audit_trail = AuditTrail()
@@ -1,10 +1,12 @@
 from flask import Blueprint, request, jsonify, redirect, url_for, session
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-import requests
 import os
 from datetime import datetime, timedelta
 from src.models.user import User, db
 from src.models.organization import Organization
+from src.services.auth_service import azure_auth_service, AzureAuthError, AzureTokenError
+from src.services.login_activity import update_if_changed, record_login
+from src.extensions.db_routing import read_only
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -54,26 +56,15 @@ def callback():
                 }
             }), 400
         
-        # Trocar código por tokens
-        token_url = f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/oauth2/v2.0/token"
-        token_data = {
-            'client_id': AZURE_CLIENT_ID,
-            'client_secret': AZURE_CLIENT_SECRET,
-            'code': code,
-            'redirect_uri': AZURE_REDIRECT_URI,
-            'grant_type': 'authorization_code'
-        }
+        # Trocar código por tokens (conexões do pool do processo)
+        tokens = azure_auth_service.exchange_code_for_tokens(code)
         
-        token_response = requests.post(token_url, data=token_data)
-        token_response.raise_for_status()
-        tokens = token_response.json()
-        
-        # Obter informações do usuário
-        user_info_url = "https://graph.microsoft.com/v1.0/me"
-        headers = {'Authorization': f"Bearer {tokens['access_token']}"}
-        user_response = requests.get(user_info_url, headers=headers)
-        user_response.raise_for_status()
-        user_data = user_response.json()
+        # Obter informações do usuário; o oid do ID token verificado identifica
+        # o perfil em cache, revalidado pelo ETag
+        object_id = None
+        if tokens.get('id_token'):
+            object_id = azure_auth_service.validate_id_token(tokens['id_token']).get('oid')
+        user_data = azure_auth_service.get_user_info(tokens['access_token'], object_id)
         
         # Processar usuário
         user = process_user_login(user_data, tokens)
@@ -81,6 +72,7 @@ def callback():
         # Criar token JWT interno
         access_token = create_access_token(
             identity=str(user.id),
+            additional_claims={'organization_id': str(user.organization_id)},
             expires_delta=timedelta(seconds=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 3600)))
         )
         
@@ -91,7 +83,16 @@ def callback():
             'user': user.to_dict()
         })
     
-    except requests.RequestException as e:
+    except AzureTokenError as e:
+        return jsonify({
+            'error': {
+                'code': 'INVALID_TOKEN',
+                'message': 'Token de ID do Azure EntraID inválido ou expirado',
+                'details': str(e)
+            }
+        }), 401
+    
+    except AzureAuthError as e:
         return jsonify({
             'error': {
                 'code': 'EXTERNAL_API_ERROR',
@@ -110,7 +111,11 @@ def callback():
         }), 500
 
 def process_user_login(user_data, tokens):
-    """Processa o login do usuário e cria/atualiza registro no banco"""
+    """Processa o login do usuário e cria/atualiza registro no banco
+    
+    Login de usuário existente sem mudanças no perfil não escreve no banco
+    na requisição: last_login_at é gravado em lote (services.login_activity).
+    """
     try:
         azure_object_id = user_data['id']
         email = user_data['mail'] or user_data['userPrincipalName']
@@ -119,13 +124,18 @@ def process_user_login(user_data, tokens):
         user = User.query.filter_by(azure_object_id=azure_object_id).first()
         
         if user:
-            # Atualizar informações do usuário existente
-            user.email = email
-            user.first_name = user_data.get('givenName', '')
-            user.last_name = user_data.get('surname', '')
-            user.display_name = user_data.get('displayName', email)
-            user.job_title = user_data.get('jobTitle')
-            user.last_login_at = datetime.utcnow()
+            # Atualizar informações do usuário existente (só os campos alterados)
+            changed = update_if_changed(user, {
+                'email': email,
+                'first_name': user_data.get('givenName', ''),
+                'last_name': user_data.get('surname', ''),
+                'display_name': user_data.get('displayName', email),
+                'job_title': user_data.get('jobTitle')
+            })
+            if changed:
+                db.session.commit()
+            record_login(user)
+            return user
             
         else:
             # Criar novo usuário
@@ -217,6 +227,7 @@ def logout():
 
 @auth_bp.route('/me')
 @jwt_required()
+@read_only
 def get_current_user():
     """Obter informações do usuário atual"""
     try:
@@ -1,10 +1,13 @@
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 import jwt
 import logging
 from src.models.user import User
 from src.models.role import Role
+from src.services.rate_limiter import get_rate_limiter, rate_limit_exceeded_response, cost_exceeded_response
+from src.services.audit_service import audit_trail
+from src.services.permissions import permission_cache, role_bits
 
 logger = logging.getLogger(__name__)
 
@@ -25,34 +28,44 @@ def token_required(f):
             }), 401
     return decorated
 
+def check_roles(*required_roles):
+    """Verifica se o usuário do JWT atual tem um dos papéis informados
+    
+    Retorna None quando autorizado, ou a resposta de erro (json, status).
+    """
+    verify_jwt_in_request()
+    user_id = get_jwt_identity()
+    
+    # Papéis do usuário em cache como máscara de bits (sem consulta ao banco)
+    access = permission_cache.get(user_id)
+    if not access or not access.is_active:
+        return jsonify({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }), 404
+    
+    # Verificar se o usuário tem pelo menos uma das permissões necessárias
+    if not access.has_any_role(role_bits.mask(required_roles)):
+        return jsonify({
+            'error': {
+                'code': 'INSUFFICIENT_PERMISSIONS',
+                'message': f'Permissões insuficientes. Necessário: {", ".join(required_roles)}'
+            }
+        }), 403
+    
+    return None
+
 def role_required(*required_roles):
     """Decorator para verificar se o usuário tem as permissões necessárias"""
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
             try:
-                verify_jwt_in_request()
-                user_id = get_jwt_identity()
-                
-                user = User.query.get(user_id)
-                if not user or not user.is_active:
-                    return jsonify({
-                        'error': {
-                            'code': 'USER_NOT_FOUND',
-                            'message': 'Usuário não encontrado ou inativo'
-                        }
-                    }), 404
-                
-                user_roles = [role.name for role in user.get_roles()]
-                
-                # Verificar se o usuário tem pelo menos uma das permissões necessárias
-                if not any(role in user_roles for role in required_roles):
-                    return jsonify({
-                        'error': {
-                            'code': 'INSUFFICIENT_PERMISSIONS',
-                            'message': f'Permissões insuficientes. Necessário: {", ".join(required_roles)}'
-                        }
-                    }), 403
+                error = check_roles(*required_roles)
+                if error:
+                    return error
                 
                 return f(*args, **kwargs)
                 
@@ -110,19 +123,14 @@ def organization_access_required(f):
     return decorated
 
 def validate_azure_token(token):
-    """Valida token do Azure EntraID (implementação simplificada)"""
+    """Valida token de acesso do Azure EntraID (assinatura, expiração, audience e issuer)
+    
+    Só tokens v2 são aceitos (audience = client id, issuer .../v2.0): o registro
+    da aplicação deve usar accessTokenAcceptedVersion: 2.
+    """
+    from src.services.auth_service import azure_auth_service
     try:
-        # Em produção, deveria validar a assinatura usando as chaves públicas do Azure
-        # e verificar claims como issuer, audience, etc.
-        
-        # Por simplicidade, apenas decodificamos sem verificação
-        decoded_token = jwt.decode(
-            token, 
-            options={"verify_signature": False},
-            algorithms=["RS256"]
-        )
-        
-        return decoded_token
+        return azure_auth_service.verify_token(token)
         
     except jwt.InvalidTokenError as e:
         logger.error(f"Token Azure inválido: {e}")
@@ -131,56 +139,117 @@ def validate_azure_token(token):
 def check_rate_limit(user_id, endpoint, limit=100, window=3600):
     """Verifica rate limiting por usuário e endpoint"""
     try:
-        # Implementação simplificada de rate limiting
-        # Em produção, usaria Redis ou similar para armazenar contadores
-        
-        # Por enquanto, sempre permite
-        return True
+        result = get_rate_limiter().backend.hit(f"endpoint:{endpoint}:{user_id}", limit, window)
+        return result.allowed
         
     except Exception as e:
         logger.error(f"Erro no rate limiting: {e}")
         return True  # Em caso de erro, permite a requisição
 
+def rate_limit(category='ai', cost=1):
+    """Decorator para aplicar o orçamento de uma categoria (ex.: chamadas de IA)
+    
+    Deve ser usado abaixo de @jwt_required(). `cost` pode ser um inteiro ou uma
+    função que recebe a requisição e retorna quantos tokens consumir. Um
+    custo maior que o limite da categoria é recusado com 400 BATCH_TOO_LARGE.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            too_large = None
+            try:
+                claims = get_jwt()
+                user_id = claims.get('sub')
+                organization_id = claims.get('organization_id')
+                
+                if not organization_id and user_id:
+                    # Tokens antigos não carregam a organização
+                    user = User.query.get(user_id)
+                    organization_id = str(user.organization_id) if user else None
+                
+                tokens = max(1, cost(request) if callable(cost) else cost)
+                limiter = get_rate_limiter()
+                max_tokens = limiter.max_cost(category)
+                if max_tokens is not None and tokens > max_tokens:
+                    too_large = (tokens, max_tokens)
+                    result = None
+                else:
+                    result = limiter.check(category, user_id, organization_id, tokens)
+            except Exception as e:
+                logger.error(f"Erro no rate limiting: {e}")
+                result = None
+            
+            if too_large:
+                return cost_exceeded_response(*too_large)
+            
+            if result is not None:
+                g.rate_limit = result
+                if not result.allowed:
+                    return rate_limit_exceeded_response(result)
+            
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
 def audit_log(action, resource_type=None, resource_id=None, details=None):
-    """Decorator para log de auditoria"""
+    """Decorator para log de auditoria
+    
+    O evento é apenas enfileirado no ring buffer do audit_trail; a gravação
+    acontece em lote fora da requisição. Se resource_id não for informado,
+    usa o argumento `<resource_type>_id` da rota.
+    """
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
             try:
                 # Executar função
                 result = f(*args, **kwargs)
-                
-                # Log de auditoria
-                user_id = None
-                try:
-                    verify_jwt_in_request()
-                    user_id = get_jwt_identity()
-                except:
-                    pass
-                
-                audit_data = {
-                    'user_id': user_id,
-                    'action': action,
-                    'resource_type': resource_type,
-                    'resource_id': resource_id,
-                    'details': details,
-                    'ip_address': request.remote_addr,
-                    'user_agent': request.headers.get('User-Agent'),
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                logger.info(f"Audit log: {audit_data}")
-                
-                return result
-                
             except Exception as e:
                 # Log de erro também
                 logger.error(f"Erro na ação {action}: {e}")
                 raise
+            
+            try:
+                # Reaproveita o JWT já validado pela rota, sem nova verificação
+                try:
+                    claims = get_jwt()
+                except RuntimeError:
+                    claims = {}
+                
+                user_id = claims.get('sub')
+                organization_id = claims.get('organization_id')
+                if not organization_id and user_id:
+                    # Tokens antigos não carregam a organização; sem ela o evento
+                    # não apareceria na consulta de auditoria de nenhuma organização
+                    user = User.query.get(user_id)
+                    organization_id = str(user.organization_id) if user else None
+                
+                audit_trail.record(
+                    action,
+                    resource_type=resource_type,
+                    resource_id=resource_id or kwargs.get(f'{resource_type}_id'),
+                    details=details,
+                    user_id=user_id,
+                    organization_id=organization_id,
+                    status_code=_status_code(result),
+                    ip_address=request.remote_addr,
+                    user_agent=request.headers.get('User-Agent'),
+                    request_id=g.get('request_id')
+                )
+            except Exception as e:
+                logger.error(f"Erro ao registrar auditoria de {action}: {e}")
+            
+            return result
                 
         return decorated
     return decorator
 
+def _status_code(result):
+    """Obtém o status HTTP do retorno de uma view"""
+    if isinstance(result, tuple):
+        return result[1] if len(result) > 1 and isinstance(result[1], int) else 200
+    return getattr(result, 'status_code', 200)
+
 class SecurityHeaders:
     """Middleware para adicionar headers de segurança"""
     
@@ -1,15 +1,32 @@
 import os
-import requests
 import jwt
+import time
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, Optional, Any
 import logging
 from flask import current_app
 from src.models.user import User, db
 from src.models.organization import Organization
+from src.services.jwks import JWKSUnavailableError, get_jwks_cache, verify_jwt
+from src.services.login_activity import update_if_changed, record_login
 
 logger = logging.getLogger(__name__)
 
+# Conexões mantidas abertas por processo para o Azure AD e o Graph
+HTTP_POOL_SIZE = int(os.getenv('AZURE_HTTP_POOL_SIZE', 20))
+# Perfis do Graph reaproveitados sem nova chamada por esse tempo; depois disso
+# são revalidados com If-None-Match (resposta 304 sem corpo quando não mudaram)
+PROFILE_CACHE_TTL = int(os.getenv('AZURE_PROFILE_CACHE_TTL', 900))
+PROFILE_CACHE_SIZE = 10000
+
+class AzureAuthError(Exception):
+    """Falha de comunicação com o Azure AD ou o Microsoft Graph"""
+
+class AzureTokenError(Exception):
+    """Token do Azure AD inválido, forjado ou expirado"""
+
 class AzureEntraIDService:
     """Serviço para autenticação com Azure EntraID (Azure AD)"""
     
@@ -24,6 +41,26 @@ class AzureEntraIDService:
         self.token_endpoint = f"{self.authority}/oauth2/v2.0/token"
         self.userinfo_endpoint = "https://graph.microsoft.com/v1.0/me"
         self.jwks_uri = f"{self.authority}/discovery/v2.0/keys"
+        self.jwks_ttl = int(os.getenv('AZURE_JWKS_TTL', 86400))
+        
+        self._http = None
+        self._http_pid = None
+        self._profiles = OrderedDict()
+        self._profiles_lock = threading.Lock()
+    
+    @property
+    def http(self):
+        """Sessão HTTP do processo com pool de conexões (recriada após o fork dos workers)"""
+        if self._http is None or self._http_pid != os.getpid():
+            # requests é importado sob demanda para não pesar na inicialização da aplicação
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._http, self._http_pid = session, os.getpid()
+        return self._http
         
     def get_authorization_url(self, state: str = None) -> str:
         """Gera URL de autorização para redirecionamento ao Azure AD"""
@@ -43,6 +80,8 @@ class AzureEntraIDService:
     
     def exchange_code_for_tokens(self, authorization_code: str) -> Dict[str, Any]:
         """Troca código de autorização por tokens de acesso"""
+        import requests
+        
         try:
             data = {
                 'client_id': self.client_id,
@@ -53,7 +92,7 @@ class AzureEntraIDService:
                 'scope': 'openid profile email User.Read'
             }
             
-            response = requests.post(
+            response = self.http.post(
                 self.token_endpoint,
                 data=data,
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -65,54 +104,90 @@ class AzureEntraIDService:
             
         except requests.RequestException as e:
             logger.error(f"Erro ao trocar código por tokens: {e}")
-            raise Exception("Falha na autenticação com Azure AD")
+            raise AzureAuthError("Falha na autenticação com Azure AD")
     
-    def get_user_info(self, access_token: str) -> Dict[str, Any]:
-        """Obtém informações do usuário usando o token de acesso"""
+    def get_user_info(self, access_token: str, object_id: str = None) -> Dict[str, Any]:
+        """Obtém informações do usuário usando o token de acesso
+        
+        Com `object_id` (oid de um ID token verificado), o perfil fica em cache:
+        é reaproveitado por PROFILE_CACHE_TTL e depois revalidado pelo ETag.
+        """
+        import requests
+        
+        cached = self._profiles.get(object_id) if object_id else None
+        now = time.monotonic()
+        if cached and now - cached['fetched_at'] < PROFILE_CACHE_TTL:
+            return cached['profile']
+        
         try:
             headers = {
                 'Authorization': f'Bearer {access_token}',
                 'Content-Type': 'application/json'
             }
+            if cached and cached['etag']:
+                headers['If-None-Match'] = cached['etag']
             
-            response = requests.get(
+            response = self.http.get(
                 self.userinfo_endpoint,
                 headers=headers,
                 timeout=30
             )
             
-            response.raise_for_status()
-            return response.json()
+            if response.status_code == 304 and cached:
+                profile = cached['profile']
+                etag = cached['etag']
+            else:
+                response.raise_for_status()
+                profile = response.json()
+                etag = response.headers.get('ETag') or profile.get('@odata.etag')
             
         except requests.RequestException as e:
             logger.error(f"Erro ao obter informações do usuário: {e}")
-            raise Exception("Falha ao obter dados do usuário")
+            raise AzureAuthError("Falha ao obter dados do usuário")
+        
+        if object_id:
+            self._store_profile(object_id, {'profile': profile, 'etag': etag, 'fetched_at': now})
+        return profile
+    
+    def _store_profile(self, object_id: str, entry: Dict[str, Any]):
+        with self._profiles_lock:
+            self._profiles[object_id] = entry
+            self._profiles.move_to_end(object_id)
+            while len(self._profiles) > PROFILE_CACHE_SIZE:
+                self._profiles.popitem(last=False)
+    
+    def verify_token(self, token: str, audience=None) -> Dict[str, Any]:
+        """Verifica um token do Azure AD: assinatura (chaves do tenant em cache), expiração, audience e issuer
+        
+        Raises:
+            jwt.InvalidTokenError: token inválido
+        """
+        jwks = get_jwks_cache(self.jwks_uri, ttl=self.jwks_ttl)
+        # Com tenant fixo o issuer é conhecido; nos endpoints multi-tenant ele depende do tid do token
+        multi_tenant = self.tenant_id in ('common', 'organizations', 'consumers')
+        claims = verify_jwt(token, jwks, audience or self.client_id,
+                            issuer=None if multi_tenant else f"{self.authority}/v2.0")
+        
+        if multi_tenant and claims.get('iss') != f"https://login.microsoftonline.com/{claims.get('tid')}/v2.0":
+            raise jwt.InvalidIssuerError("Issuer inválido")
+        
+        return claims
     
     def validate_id_token(self, id_token: str) -> Dict[str, Any]:
-        """Valida e decodifica o ID token JWT"""
+        """Valida e decodifica o ID token JWT
+        
+        Raises:
+            AzureTokenError: token inválido
+            AzureAuthError: chaves de assinatura do Azure AD indisponíveis
+        """
         try:
-            # Em produção, deveria validar a assinatura usando as chaves públicas do Azure
-            # Por simplicidade, apenas decodificamos sem verificação
-            decoded_token = jwt.decode(
-                id_token, 
-                options={"verify_signature": False},  # ATENÇÃO: Apenas para desenvolvimento
-                algorithms=["RS256"]
-            )
-            
-            # Validar claims básicos
-            now = datetime.utcnow().timestamp()
-            
-            if decoded_token.get('exp', 0) < now:
-                raise Exception("Token expirado")
-                
-            if decoded_token.get('aud') != self.client_id:
-                raise Exception("Audience inválida")
-                
-            return decoded_token
+            return self.verify_token(id_token)
             
         except jwt.InvalidTokenError as e:
+            if isinstance(e.__cause__, JWKSUnavailableError):
+                raise AzureAuthError("Chaves de assinatura do Azure AD indisponíveis") from e
             logger.error(f"Token inválido: {e}")
-            raise Exception("Token de ID inválido")
+            raise AzureTokenError("Token de ID inválido") from e
     
     def create_or_update_user(self, user_info: Dict[str, Any], 
                             id_token_claims: Dict[str, Any] = None) -> User:
@@ -129,23 +204,28 @@ class AzureEntraIDService:
             org_name = self._extract_organization_name(user_info, id_token_claims)
             organization = self._get_or_create_organization(org_name)
             
+            preferred_language = user_info.get('preferredLanguage', 'pt-BR')
+            now = datetime.utcnow()
+            
             if user:
-                # Atualizar usuário existente
-                user.first_name = user_info.get('givenName', user.first_name)
-                user.last_name = user_info.get('surname', user.last_name)
-                user.job_title = user_info.get('jobTitle', user.job_title)
-                user.department = user_info.get('department', user.department)
-                user.phone = user_info.get('businessPhones', [None])[0] or user.phone
-                user.azure_object_id = user_info.get('id')
-                user.last_login_at = datetime.utcnow()
-                user.organization_id = organization.id
-                
-                # Atualizar preferências de idioma
-                preferred_language = user_info.get('preferredLanguage', 'pt-BR')
-                if user.preferences:
-                    user.preferences['language'] = preferred_language
-                else:
-                    user.preferences = {'language': preferred_language}
+                # Atualizar usuário existente; sem mudanças no perfil não há escrita
+                # na requisição (last_login_at é gravado em lote)
+                changed = update_if_changed(user, {
+                    'first_name': user_info.get('givenName', user.first_name),
+                    'last_name': user_info.get('surname', user.last_name),
+                    'job_title': user_info.get('jobTitle', user.job_title),
+                    'department': user_info.get('department', user.department),
+                    'phone': user_info.get('businessPhones', [None])[0] or user.phone,
+                    'azure_object_id': user_info.get('id'),
+                    'organization_id': organization.id,
+                    # Atualizar preferências de idioma
+                    'preferences': dict(user.preferences or {}, language=preferred_language)
+                })
+                # Uma organização recém-criada muda organization_id, então também conta
+                if changed:
+                    db.session.commit()
+                record_login(user, now)
+                return user
                     
             else:
                 # Criar novo usuário
@@ -158,9 +238,9 @@ class AzureEntraIDService:
                     phone=user_info.get('businessPhones', [None])[0],
                     azure_object_id=user_info.get('id'),
                     organization_id=organization.id,
-                    language=user_info.get('preferredLanguage', 'pt-BR'),
-                    preferences={'language': user_info.get('preferredLanguage', 'pt-BR')},
-                    last_login_at=datetime.utcnow(),
+                    language=preferred_language,
+                    preferences={'language': preferred_language},
+                    last_login_at=now,
                     is_active=True
                 )
                 
@@ -225,6 +305,8 @@ class AzureEntraIDService:
     
     def refresh_access_token(self, refresh_token: str) -> Dict[str, Any]:
         """Renova token de acesso usando refresh token"""
+        import requests
+        
         try:
             data = {
                 'client_id': self.client_id,
@@ -234,7 +316,7 @@ class AzureEntraIDService:
                 'scope': 'openid profile email User.Read'
             }
             
-            response = requests.post(
+            response = self.http.post(
                 self.token_endpoint,
                 data=data,
                 headers={'Content-Type': 'application/x-www-form-urlencoded'},
@@ -246,7 +328,7 @@ class AzureEntraIDService:
             
         except requests.RequestException as e:
             logger.error(f"Erro ao renovar token: {e}")
-            raise Exception("Falha ao renovar token de acesso")
+            raise AzureAuthError("Falha ao renovar token de acesso")
 
 # Instância global do serviço
 azure_auth_service = AzureEntraIDService()
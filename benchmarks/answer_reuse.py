@@ -0,0 +1,116 @@
+"""Benchmark: approved-answer reuse lookup quality and cost.
+
+Builds a synthetic library of approved RFP questions, indexes them with
+the same MinHash/LSH functions src.services.answer_reuse stores in
+question_signature_bands (held in a dict here, no database), then looks
+up two kinds of incoming questions:
+
+- reworded copies of library questions (articles, plurals, punctuation),
+  which should be reused;
+- new questions built from the same vocabulary, which must go to the AI.
+
+Reports the share of AI calls avoided, false reuses, LSH candidates per
+lookup and lookup time at the configured threshold.
+
+Usage:
+    python benchmarks/answer_reuse.py [--library 3000] [--queries 1000] [--threshold 0.8] [--seed 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.answer_reuse import shingles, minhash, band_hashes, jaccard
+
+OPENERS = ['Descreva', 'Informe', 'Explique', 'Detalhe', 'Apresente']
+TOPICS = ['a política de segurança da informação', 'o processo de gestão de incidentes',
+          'a metodologia de gestão de projetos', 'o modelo de suporte técnico',
+          'a estratégia de backup e recuperação', 'o plano de continuidade de negócios',
+          'a arquitetura de integração', 'o processo de gestão de mudanças',
+          'a política de privacidade de dados', 'o modelo de precificação',
+          'o processo de homologação', 'a estrutura da equipe alocada',
+          'o plano de treinamento', 'a estratégia de migração de dados',
+          'o processo de controle de acesso', 'a política de retenção de logs',
+          'o modelo de governança', 'a gestão de vulnerabilidades',
+          'o processo de faturamento', 'a estratégia de testes']
+QUALIFIERS = ['da empresa', 'adotada', 'utilizada nos contratos', 'para o ambiente de produção',
+              'incluindo certificações', 'com os respectivos SLAs', 'em nuvem', 'para clientes do setor público',
+              'com indicadores de desempenho', 'e as ferramentas empregadas', 'nos últimos três anos',
+              'com exemplos de clientes']
+
+def question_parts(rng):
+    return rng.choice(OPENERS), rng.choice(TOPICS), tuple(sorted(rng.sample(QUALIFIERS, 2)))
+
+def question_text(parts):
+    opener, topic, (first, second) = parts
+    return f'{opener} {topic} {first} {second}.'
+
+def reword(text, rng):
+    """Same question with the small variations seen across RFPs."""
+    variants = [
+        lambda t: t.replace(' a ', ' a sua ', 1),
+        lambda t: t.rstrip('.') + '?',
+        lambda t: t.upper(),
+        lambda t: t.replace('ções', 'ção'),
+        lambda t: t.replace('Descreva', 'Favor descrever'),
+        lambda t: t.replace(' o ', ' o seu ', 1),
+    ]
+    for variant in rng.sample(variants, 2):
+        text = variant(text)
+    return text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--library', type=int, default=3000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    library_parts = list({question_parts(rng) for _ in range(args.library)})
+    library = [question_text(parts) for parts in library_parts]
+    library_shingles = [shingles(text) for text in library]
+
+    started = time.perf_counter()
+    buckets = defaultdict(list)
+    for index, question_shingles in enumerate(library_shingles):
+        for band in band_hashes(minhash(question_shingles)):
+            buckets[band].append(index)
+    index_ms = (time.perf_counter() - started) * 1000
+
+    # New questions ask about a topic/qualifier combination the library does not have
+    known = {(topic, qualifiers) for _, topic, qualifiers in library_parts}
+    reworded = [(reword(rng.choice(library), rng), True) for _ in range(args.queries // 2)]
+    new = []
+    while len(new) < args.queries - len(reworded):
+        parts = question_parts(rng)
+        if parts[1:] not in known:
+            new.append((question_text(parts), False))
+
+    reused = {True: 0, False: 0}
+    candidates_total = 0
+    started = time.perf_counter()
+    for text, is_reworded in reworded + new:
+        target = shingles(text)
+        candidates = {i for band in band_hashes(minhash(target)) for i in buckets.get(band, ())}
+        candidates_total += len(candidates)
+        best = max((jaccard(target, library_shingles[i]) for i in candidates), default=0.0)
+        if best >= args.threshold:
+            reused[is_reworded] += 1
+    lookup_ms = (time.perf_counter() - started) * 1000 / len(reworded + new)
+
+    print(f'{len(library)} approved questions indexed in {index_ms:.0f} ms, threshold {args.threshold}')
+    print(f'reworded questions reused:   {reused[True]}/{len(reworded)} '
+          f'({100 * reused[True] / max(len(reworded), 1):.1f}% of AI calls avoided)')
+    print(f'new questions reused:        {reused[False]}/{len(new)} (same vocabulary, different ask)')
+    print(f'LSH candidates per lookup:   {candidates_total / len(reworded + new):.1f} of {len(library)}')
+    print(f'lookup time:                 {lookup_ms:.2f} ms')
+
+if __name__ == '__main__':
+    main()
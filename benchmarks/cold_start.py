@@ -0,0 +1,88 @@
+"""Benchmark: application cold start.
+
+Starts fresh interpreters that import src.app and call create_app(), the
+work every Gunicorn/Uvicorn worker (or the master, with preload) does
+before serving its first request. Prints the median and worst time over
+several runs, then the slowest top-level imports of one run measured
+with ``python -X importtime`` so regressions can be traced to a module.
+
+Usage:
+    python benchmarks/cold_start.py [--runs 10] [--config testing] [--top 15] [--budget-ms 0]
+
+With ``--budget-ms`` the script exits with status 1 when the median
+startup time exceeds the budget.
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_SNIPPET = """
+import time
+started = time.perf_counter()
+from src.app import create_app
+app = create_app({config!r})
+print((time.perf_counter() - started) * 1000)
+"""
+
+# Optional or heavy modules that must not be imported by create_app()
+DEFERRED_MODULES = ('requests', 'httpx', 'alembic', 'flask_migrate', 'redis')
+
+def run_once(config_name, extra_args=()):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    code = STARTUP_SNIPPET.format(config=config_name)
+    return subprocess.run(
+        [sys.executable, *extra_args, '-c', code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+
+def top_imports(config_name, limit):
+    """Top-level imports (direct children of the script) sorted by cumulative time."""
+    stderr = run_once(config_name, ('-X', 'importtime')).stderr
+    rows = []
+    loaded = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        loaded.add(name.strip())
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return rows[:limit], loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='testing')
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=0,
+                        help='fail when the median startup time exceeds this many milliseconds')
+    args = parser.parse_args()
+
+    timings = [float(run_once(args.config).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f'create_app({args.config!r}) over {args.runs} fresh interpreters: '
+          f'median {median:.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms')
+
+    rows, loaded = top_imports(args.config, args.top)
+    print(f"\n{'cumulative ms':>13}  top-level import")
+    for cumulative_ms, name in rows:
+        print(f'{cumulative_ms:>13.1f}  {name}')
+
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    if eager:
+        print(f"\nimported at startup but only needed on first use: {', '.join(eager)}")
+
+    if args.budget_ms and median > args.budget_ms:
+        print(f'\nmedian startup {median:.0f} ms exceeds the {args.budget_ms:.0f} ms budget')
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""Load test: concurrent response versioning.
+
+Many threads create new response versions for the same few questions at
+once, through the same add_response_version / run_versioned path the
+generate route uses (the AI call is left out). Afterwards every question
+must have versions 1..N without gaps or duplicates and exactly one
+current response, the highest version.
+
+Runs against DATABASE_URL; PostgreSQL exercises the row locks, a SQLite
+file exercises the unique indexes and the retry loop. Tables are created
+if missing and seeded with a throwaway organization.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/concurrent_versions.py \
+        [--writers 16] [--questions 4] [--versions 25]
+
+Exits with status 1 when the version history is inconsistent or a write failed.
+"""
+
+import os
+import sys
+import time
+import uuid
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from src.config import engine_options
+from src.models.user import User, db
+from src.models.organization import Organization
+from src.models.role import Role, UserRole  # noqa: F401 (User relationships)
+from src.models.project import Project
+from src.models.document import Document
+from src.models.question import Question
+from src.models.response import Response
+from src.services.response_versioning import add_response_version, run_versioned
+
+def create_benchmark_app(database_url, writers):
+    options = engine_options(database_url, pool_size=writers, max_overflow=0)
+    if database_url.startswith('sqlite'):
+        options['connect_args'] = {'timeout': 30, 'check_same_thread': False}
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS=options,
+    )
+    db.init_app(app)
+    return app
+
+def seed(app, questions):
+    with app.app_context():
+        db.create_all()
+        suffix = uuid.uuid4().hex[:8]
+        organization = Organization(name=f'Benchmark {suffix}')
+        db.session.add(organization)
+        db.session.flush()
+
+        user = User(
+            organization_id=organization.id,
+            azure_object_id=f'benchmark-{suffix}',
+            email='bench@example.com',
+            first_name='Bench',
+            last_name='Mark',
+            display_name='Bench Mark',
+        )
+        db.session.add(user)
+        db.session.flush()
+
+        project = Project(organization_id=organization.id, name='Benchmark', created_by=user.id)
+        db.session.add(project)
+        db.session.flush()
+
+        document = Document(
+            organization_id=organization.id,
+            project_id=project.id,
+            name='rfp.txt',
+            original_filename='rfp.txt',
+            file_path='/dev/null',
+            file_size=0,
+            mime_type='text/plain',
+            file_hash='0' * 64,
+            document_type='rfp',
+            uploaded_by=user.id,
+        )
+        db.session.add(document)
+        db.session.flush()
+
+        question_ids = []
+        for i in range(questions):
+            question = Question(project_id=project.id, document_id=document.id,
+                                question_text=f'Describe capability {i}')
+            db.session.add(question)
+            db.session.flush()
+            question_ids.append(question.id)
+
+        db.session.commit()
+        return user.id, question_ids
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--questions', type=int, default=4)
+    parser.add_argument('--versions', type=int, default=25, help='versions created per question')
+    parser.add_argument('--max-attempts', type=int, default=20)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('set DATABASE_URL or --database-url to a scratch database')
+
+    app = create_benchmark_app(args.database_url, args.writers)
+    user_id, question_ids = seed(app, args.questions)
+    attempts = Counter()
+
+    def write(i):
+        question_id = question_ids[i % len(question_ids)]
+        with app.app_context():
+            def attempt():
+                attempts['total'] += 1
+                return add_response_version(
+                    question_id,
+                    response_text=f'Answer {i}',
+                    response_type='generated',
+                    created_by=user_id,
+                    status='draft'
+                ), None
+            _, error = run_versioned(attempt, max_attempts=args.max_attempts)
+            return error is None
+
+    total = args.questions * args.versions
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.writers) as executor:
+        results = list(executor.map(write, range(total)))
+    elapsed = time.perf_counter() - started
+
+    failed = results.count(False)
+    print(f'{total} versions, {args.writers} writers: {total / elapsed:.1f} writes/s, '
+          f"{attempts['total'] - total + failed} retries, {failed} failed writes")
+
+    consistent = True
+    with app.app_context():
+        for question_id in question_ids:
+            rows = Response.query.filter_by(question_id=question_id).order_by(Response.version).all()
+            versions = [r.version for r in rows]
+            current = [r.version for r in rows if r.is_current]
+            ok = versions == list(range(1, len(rows) + 1)) and current == versions[-1:]
+            consistent = consistent and ok
+            print(f"{'ok' if ok else 'FAIL':>4}  question {question_id}: {len(rows)} versions, current {current}")
+
+    return 0 if consistent and not failed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
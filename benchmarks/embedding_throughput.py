@@ -0,0 +1,146 @@
+"""Benchmark: local embedding throughput (texts/sec).
+
+Embeds synthetic RFP questions (short) and knowledge-base passages
+(long) with the embedder of src.services.embeddings and reports:
+
+- single-process throughput of the hashing embedder, with a cold and a
+  warm feature-hash cache;
+- the dynamic batcher under concurrent one-text callers, against calling
+  the model once per text. --call-overhead-ms adds a fixed cost per model
+  call, like the forward pass of a neural model, which is what batching
+  amortizes; calls run one at a time, as a CPU model uses every core;
+- backfill throughput through the process pool for 1..--processes workers,
+  with embedding and int8 quantization in the workers;
+- storage per vector and the cosine error introduced by int8 quantization.
+
+No database is needed: the cache lookups are not timed. A cache hit skips
+the model altogether.
+
+Usage:
+    python benchmarks/embedding_throughput.py [--texts 5000] [--model hashing-256] [--threads 16]
+                                              [--call-overhead-ms 2] [--processes N] [--seed 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.embeddings import (
+    create_embedder, EmbeddingBatcher, quantize, dequantize, cosine_similarity,
+    content_key, _embed_chunk, _feature_slot
+)
+
+WORDS = ('solução plataforma integração segurança dados nuvem suporte contrato equipe '
+         'requisito processo serviço disponibilidade monitoramento cliente projeto '
+         'implantação arquitetura desempenho conformidade relatório acesso backup '
+         'recuperação incidente auditoria certificação metodologia cronograma treinamento').split()
+OPENERS = ['Descreva', 'Informe', 'Explique', 'Detalhe', 'Apresente', 'Qual é', 'Como funciona']
+
+def question(rng):
+    return f"{rng.choice(OPENERS)} {' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 16)))}?"
+
+def passage(rng):
+    sentences = []
+    for _ in range(rng.randint(6, 12)):
+        sentences.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(10, 20))).capitalize() + '.')
+    return ' '.join(sentences)
+
+def rate(count, seconds):
+    return f'{count / seconds:10.0f} texts/s'
+
+def time_single(embedder, texts):
+    started = time.perf_counter()
+    embedder.embed_batch(texts)
+    return time.perf_counter() - started
+
+def time_concurrent(embed, texts, threads):
+    """Threads pedindo um texto por vez, como requisições simultâneas"""
+    shares = [texts[index::threads] for index in range(threads)]
+
+    def worker(share):
+        for text in share:
+            embed([text])
+
+    workers = [threading.Thread(target=worker, args=(share,)) for share in shares]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--texts', type=int, default=5000)
+    parser.add_argument('--model', default='hashing-256')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--call-overhead-ms', type=float, default=2.0)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    questions = [question(rng) for _ in range(args.texts)]
+    passages = [passage(rng) for _ in range(args.texts // 5)]
+    embedder = create_embedder(args.model)
+
+    print(f'Model {args.model} ({embedder.dimensions} dimensions), one process:')
+    for name, texts in (('questions', questions), ('passages', passages)):
+        _feature_slot.cache_clear()
+        cold = time_single(embedder, texts)
+        warm = time_single(embedder, texts)
+        print(f'  {name:9s} ({len(texts):5d}): cold {rate(len(texts), cold)}   warm {rate(len(texts), warm)}')
+
+    overhead = args.call_overhead_ms / 1000
+    calls = []
+    model_lock = threading.Lock()
+
+    def model_call(texts):
+        with model_lock:
+            calls.append(len(texts))
+            time.sleep(overhead)
+            return embedder.embed_batch(texts)
+
+    sample = questions[:max(args.threads, args.texts // 5)]
+    direct = time_concurrent(model_call, sample, args.threads)
+    direct_calls = len(calls)
+    calls.clear()
+    batcher = EmbeddingBatcher(model_call)
+    batched = time_concurrent(batcher.embed, sample, args.threads)
+    print(f'\n{args.threads} concurrent callers, one question each call, '
+          f'{args.call_overhead_ms:g} ms per model call:')
+    print(f'  per-text calls: {rate(len(sample), direct)}  ({direct_calls} model calls)')
+    print(f'  dynamic batch:  {rate(len(sample), batched)}  ({len(calls)} model calls, '
+          f'{len(sample) / len(calls):.1f} texts per call)')
+
+    print('\nBackfill process pool (embedding + int8 quantization in the workers):')
+    corpus = questions + passages
+    chunk = 256
+    items = [(content_key(text), text) for text in corpus]
+    chunks = [items[start:start + chunk] for start in range(0, len(items), chunk)]
+    for processes in sorted({1, max(1, args.processes // 2), args.processes}):
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            list(pool.map(_embed_chunk, [args.model] * processes, chunks[:processes]))  # warm the workers
+            started = time.perf_counter()
+            rows = sum(len(result) for result in pool.map(_embed_chunk, [args.model] * len(chunks), chunks))
+            elapsed = time.perf_counter() - started
+        print(f'  {processes:3d} processes: {rate(rows, elapsed)}')
+
+    vectors = embedder.embed_batch(questions[:1000])
+    errors = []
+    for first, second in zip(vectors, vectors[1:]):
+        exact = cosine_similarity(first, second)
+        approx = cosine_similarity(dequantize(*quantize(first)), dequantize(*quantize(second)))
+        errors.append(abs(exact - approx))
+    print(f'\nStorage per vector: {embedder.dimensions * 8} bytes as float64, '
+          f'{embedder.dimensions} bytes as int8 (+ scale)')
+    print(f'Cosine error from int8: mean {sum(errors) / len(errors):.4f}, max {max(errors):.4f}')
+
+if __name__ == '__main__':
+    main()
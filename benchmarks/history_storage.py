@@ -0,0 +1,88 @@
+"""Benchmark: response history storage, full copies vs compressed deltas.
+
+Simulates one answer that is regenerated or edited many times (each
+version rewrites a few sentences of the previous one) and compares the
+bytes needed to keep every previous version as a full copy against the
+reverse-delta format used by src.services.response_versioning, then
+times reconstructing the oldest version from the current text.
+
+No database is needed: the same encode/decode functions the service uses
+are applied to the synthetic history in memory.
+
+Usage:
+    python benchmarks/history_storage.py [--versions 50] [--sentences 60] [--edits 3] [--seed 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.response_versioning import encode_history, decode_history
+
+WORDS = ('solução plataforma integração segurança dados nuvem suporte contrato equipe '
+         'requisito processo serviço disponibilidade monitoramento cliente projeto '
+         'implantação arquitetura desempenho conformidade relatório acesso').split()
+
+def sentence(rng):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return ' '.join(words).capitalize() + '.'
+
+def synthetic_history(versions, sentences, edits, rng):
+    """Texts from the first to the last version, each a small edit of the previous."""
+    current = [sentence(rng) for _ in range(sentences)]
+    texts = [' '.join(current)]
+    for _ in range(versions - 1):
+        current = list(current)
+        for _ in range(edits):
+            action = rng.random()
+            position = rng.randrange(len(current))
+            if action < 0.6:
+                current[position] = sentence(rng)
+            elif action < 0.8:
+                current.insert(position, sentence(rng))
+            elif len(current) > 1:
+                del current[position]
+        texts.append(' '.join(current))
+    return texts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--versions', type=int, default=50)
+    parser.add_argument('--sentences', type=int, default=60)
+    parser.add_argument('--edits', type=int, default=3, help='sentences changed per version')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    texts = synthetic_history(args.versions, args.sentences, args.edits, random.Random(args.seed))
+
+    # Version n (1-based) is stored against version n + 1; the last one is current
+    started = time.perf_counter()
+    encoded = [encode_history(texts[i], texts[i + 1], i + 1) for i in range(len(texts) - 1)]
+    encode_ms = (time.perf_counter() - started) * 1000
+
+    full_bytes = sum(len(text.encode('utf-8')) for text in texts[:-1])
+    compact_bytes = sum(len(data) for _, data in encoded)
+    snapshots = sum(1 for history_format, _ in encoded if history_format == 'snapshot')
+
+    started = time.perf_counter()
+    newer_text = texts[-1]
+    for i in range(len(encoded) - 1, -1, -1):
+        history_format, data = encoded[i]
+        newer_text = decode_history(history_format, data, newer_text)
+        assert newer_text == texts[i], f'version {i + 1} did not round-trip'
+    decode_ms = (time.perf_counter() - started) * 1000
+
+    print(f'{args.versions} versions of a ~{len(texts[-1].encode("utf-8")) // 1024} KiB answer, '
+          f'{args.edits} sentence edits per version')
+    print(f'full copies:        {full_bytes / 1024:>9.1f} KiB')
+    print(f'deltas + snapshots: {compact_bytes / 1024:>9.1f} KiB '
+          f'({full_bytes / max(compact_bytes, 1):.1f}x smaller, {snapshots} snapshots)')
+    print(f'encode all:         {encode_ms:>9.1f} ms')
+    print(f'rebuild all:        {decode_ms:>9.1f} ms (oldest version walks the full chain)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: Azure token signature verification with the JWKS cache.
+
+Serves a JWKS from a local HTTP server standing in for Microsoft's keys
+endpoint, signs RS256 tokens with the matching private keys and verifies
+them through src.services.jwks:
+
+- naive: fetch and parse the JWKS for every token (what fixing the
+  missing signature check without a cache would do);
+- cached: JWKSCache with parsed key objects reused, reporting the cost
+  per token and how many times the endpoint was hit;
+- rotation: tokens signed by a key published after the cache was filled
+  trigger a single refresh, and a flood of unknown kids does not turn
+  into a flood of fetches.
+
+Requires the cryptography package (PyJWT's RS256 support).
+
+Usage:
+    python benchmarks/jwt_verification.py [--tokens 2000] [--key-bits 2048]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from src.services.jwks import JWKSCache, verify_jwt, _http_fetch
+
+AUDIENCE = 'client-id'
+ISSUER = 'https://login.microsoftonline.com/tenant-id/v2.0'
+
+class JWKSServer:
+    """Endpoint JWKS local, contando as requisições"""
+
+    def __init__(self):
+        self.keys = []
+        self.hits = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.hits += 1
+                body = json.dumps({'keys': server.keys}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.uri = f'http://127.0.0.1:{self._httpd.server_address[1]}/discovery/v2.0/keys'
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def publish(self, kid, private_key):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+        self.keys.append(dict(jwk, kid=kid, use='sig', alg='RS256'))
+
+def sign(private_key, kid, subject):
+    now = int(time.time())
+    claims = {'sub': subject, 'aud': AUDIENCE, 'iss': ISSUER, 'iat': now, 'exp': now + 3600}
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tokens', type=int, default=2000)
+    parser.add_argument('--key-bits', type=int, default=2048)
+    args = parser.parse_args()
+
+    server = JWKSServer()
+    first = rsa.generate_private_key(public_exponent=65537, key_size=args.key_bits)
+    server.publish('key-1', first)
+    tokens = [sign(first, 'key-1', f'user-{index}') for index in range(args.tokens)]
+
+    naive_count = min(200, args.tokens)
+    started = time.perf_counter()
+    for token in tokens[:naive_count]:
+        key = jwt.PyJWK(_http_fetch(server.uri)['keys'][0]).key
+        jwt.decode(token, key, algorithms=['RS256'], audience=AUDIENCE, issuer=ISSUER)
+    naive = (time.perf_counter() - started) / naive_count
+
+    server.hits = 0
+    cache = JWKSCache(server.uri)
+    verify_jwt(tokens[0], cache, AUDIENCE, ISSUER)
+    started = time.perf_counter()
+    for token in tokens:
+        verify_jwt(token, cache, AUDIENCE, ISSUER)
+    cached = (time.perf_counter() - started) / len(tokens)
+
+    print(f'{args.key_bits}-bit RS256 tokens, JWKS served over local HTTP:')
+    print(f'  naive (fetch per token): {naive * 1e6:8.0f} us/token')
+    print(f'  cached:                  {cached * 1e6:8.0f} us/token  '
+          f'({server.hits} JWKS fetch for {len(tokens) + 1} tokens)')
+
+    # Rotação: nova chave publicada depois de o cache estar cheio
+    cache.min_refresh_interval = 0.5
+    second = rsa.generate_private_key(public_exponent=65537, key_size=args.key_bits)
+    server.publish('key-2', second)
+    time.sleep(cache.min_refresh_interval)
+    server.hits = 0
+    rotated = [sign(second, 'key-2', f'user-{index}') for index in range(100)]
+    for token in rotated:
+        verify_jwt(token, cache, AUDIENCE, ISSUER)
+    print(f'  rotation: 100 tokens with a new kid verified, {server.hits} JWKS fetch')
+
+    server.hits = 0
+    forged = [sign(first, f'unknown-{index}', 'attacker') for index in range(1000)]
+    rejected = 0
+    for token in forged:
+        try:
+            verify_jwt(token, cache, AUDIENCE, ISSUER)
+        except jwt.InvalidTokenError:
+            rejected += 1
+    print(f'  unknown kids: {rejected}/1000 rejected, {server.hits} JWKS fetch '
+          f'(at most one per {cache.min_refresh_interval:g} s)')
+
+if __name__ == '__main__':
+    main()
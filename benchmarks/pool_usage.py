@@ -0,0 +1,242 @@
+"""Load test: database pool usage while AI calls get slower.
+
+Fires concurrent POST /api/responses/generate/<id> requests against a
+small connection pool while the AI provider is replaced by a stub that
+sleeps for a configurable latency. With the load / AI call / persist
+split the number of checked-out connections must stay flat as latency
+rises; with ``--hold`` the session is kept open across the AI call (the
+old behaviour) and pool usage grows with latency until requests start
+waiting on the pool.
+
+Needs a scratch PostgreSQL database (the models use PostgreSQL UUID
+columns); tables are created if missing and seeded with a throwaway
+organization.
+
+Usage:
+    DATABASE_URL=postgresql://... python benchmarks/pool_usage.py \
+        [--latencies 0,0.25,1,2] [--concurrency 20] [--pool-size 5] [--hold]
+
+Exits with status 1 when the connection time per request grows with AI latency.
+"""
+
+import os
+import sys
+import time
+import argparse
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy.pool import QueuePool
+
+from src.models.user import User, db
+from src.models.organization import Organization
+from src.models.project import Project
+from src.models.document import Document
+from src.models.question import Question
+from src.models.response import Response
+from src.models.knowledge_base import KnowledgeBase
+from src.routes import responses as responses_routes
+from src.services.ai_service import ai_service
+
+def create_benchmark_app(database_url, pool_size):
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='benchmark-secret-key-benchmark-secret-key',
+        JWT_SECRET_KEY='benchmark-secret-key-benchmark-secret-key',
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SQLALCHEMY_ENGINE_OPTIONS={
+            'poolclass': QueuePool,
+            'pool_size': pool_size,
+            'max_overflow': 0,
+            'pool_timeout': 300,
+        },
+        RATELIMIT_LIMITS={
+            'api': {'user': '1000000/minute', 'organization': '1000000/minute'},
+            'ai': {'user': '1000000/minute', 'organization': '1000000/minute'},
+        },
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(responses_routes.responses_bp, url_prefix='/api/responses')
+    return app
+
+def seed(app, questions):
+    with app.app_context():
+        db.create_all()
+        suffix = uuid.uuid4().hex[:8]
+        organization = Organization(name=f'Benchmark {suffix}')
+        db.session.add(organization)
+        db.session.flush()
+
+        user = User(
+            organization_id=organization.id,
+            azure_object_id=f'benchmark-{suffix}',
+            email='bench@example.com',
+            first_name='Bench',
+            last_name='Mark',
+            display_name='Bench Mark',
+        )
+        db.session.add(user)
+        db.session.flush()
+
+        project = Project(organization_id=organization.id, name='Benchmark', created_by=user.id)
+        db.session.add(project)
+        db.session.flush()
+
+        document = Document(
+            organization_id=organization.id,
+            project_id=project.id,
+            name='rfp.txt',
+            original_filename='rfp.txt',
+            file_path='/dev/null',
+            file_size=0,
+            mime_type='text/plain',
+            file_hash='0' * 64,
+            document_type='rfp',
+            uploaded_by=user.id,
+        )
+        db.session.add(document)
+        db.session.flush()
+
+        question_ids = []
+        for i in range(questions):
+            question = Question(
+                project_id=project.id,
+                document_id=document.id,
+                question_text=f'Describe capability {i}',
+                keywords=['capability'],
+            )
+            db.session.add(question)
+            db.session.flush()
+            question_ids.append(str(question.id))
+
+        db.session.add(KnowledgeBase(
+            organization_id=organization.id,
+            title='Capabilities',
+            content='We support every capability.',
+            content_type='reference',
+            created_by=user.id,
+        ))
+        db.session.commit()
+
+        token = create_access_token(
+            identity=str(user.id),
+            additional_claims={'organization_id': str(organization.id)}
+        )
+        return token, question_ids
+
+def stub_ai(latency):
+    def generate_response(question_text, context_documents, max_words=None, tone='professional',
+                          language='pt-BR', organization_id=None, user_id=None):
+        time.sleep(latency)
+        text = f'Stub answer to: {question_text}'
+        return {
+            'response_text': text,
+            'word_count': len(text.split()),
+            'character_count': len(text),
+            'source_documents': [],
+            'confidence_score': 0.9,
+            'generated_by': 'stub',
+            'generated_at': None,
+        }
+    ai_service.generate_response = generate_response
+
+def run_level(app, token, question_ids, latency, concurrency, requests_per_level):
+    stub_ai(latency)
+    samples = []
+    stop = threading.Event()
+
+    def sample():
+        with app.app_context():
+            engine_pool = db.engine.pool
+            while not stop.is_set():
+                samples.append(engine_pool.checkedout())
+                time.sleep(0.01)
+
+    def one(i):
+        client = app.test_client()
+        question_id = question_ids[i % len(question_ids)]
+        started = time.perf_counter()
+        response = client.post(
+            f'/api/responses/generate/{question_id}',
+            json={},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+        return response.status_code, time.perf_counter() - started
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(requests_per_level)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    mean_checked_out = sum(samples) / len(samples) if samples else 0.0
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    durations = sorted(d for _, d in results)
+    return {
+        'latency': latency,
+        'peak_checked_out': max(samples) if samples else 0,
+        'mean_checked_out': mean_checked_out,
+        # Connection-seconds each request held, averaged: the number that must not follow AI latency
+        'conn_ms_per_request': mean_checked_out * elapsed / requests_per_level * 1000,
+        'throughput': requests_per_level / elapsed,
+        'p95_request_s': durations[int(len(durations) * 0.95) - 1],
+        'statuses': statuses,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--latencies', default='0,0.25,1,2')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--pool-size', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--hold', action='store_true',
+                        help='keep the session open during the AI call (previous behaviour)')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('set DATABASE_URL or --database-url to a scratch PostgreSQL database')
+
+    if args.hold:
+        # Emulate the old flow: the connection stays checked out across the AI call
+        db.session.close = lambda: None
+
+    app = create_benchmark_app(args.database_url, args.pool_size)
+    latencies = [float(x) for x in args.latencies.split(',')]
+    token, question_ids = seed(app, args.requests * len(latencies))
+
+    print(f"{'ai latency':>10} {'peak conns':>10} {'mean conns':>10} {'conn ms/req':>11} {'req/s':>8} {'p95 s':>7}  statuses")
+    rows = []
+    for i, latency in enumerate(latencies):
+        # Fresh questions per level so every request creates a first response
+        level_questions = question_ids[i * args.requests:(i + 1) * args.requests]
+        with app.app_context():
+            row = run_level(app, token, level_questions, latency, args.concurrency, args.requests)
+        rows.append(row)
+        print(
+            f"{row['latency']:>10.2f} {row['peak_checked_out']:>10} {row['mean_checked_out']:>10.2f} "
+            f"{row['conn_ms_per_request']:>11.1f} {row['throughput']:>8.1f} {row['p95_request_s']:>7.2f}  {row['statuses']}"
+        )
+
+    if any(status != 201 for row in rows for status in row['statuses']):
+        print('some requests failed; results are not meaningful')
+        return 2
+
+    # Flat: the connection time per request at the highest AI latency stays close to the lowest level
+    flat = rows[-1]['conn_ms_per_request'] <= 2 * rows[0]['conn_ms_per_request'] + 10
+    print('pool usage flat as AI latency rises' if flat else 'pool usage grows with AI latency')
+    return 0 if flat else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Benchmark: near-duplicate clustering of a project's questions.
+
+Builds a synthetic project with distinct RFP questions plus reworded
+copies (the same question repeated in another section, or extracted
+twice from overlapping chunks), runs src.services.question_clustering's
+cluster_texts over all of them, and reports:
+
+- time to cluster the project (the request asks for sub-second at
+  thousands of questions);
+- duplicates grouped with their original, and questions merged into a
+  group they do not belong to;
+- AI calls a batch generation would make, one per group.
+
+Usage:
+    python benchmarks/question_clustering.py [--questions 3000] [--duplicates 0.3] [--threshold 0.85] [--seed 1]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.question_clustering import CLUSTER_THRESHOLD, cluster_texts
+
+# Vocabulário e variações de redação do benchmark de reaproveitamento de respostas
+from answer_reuse import OPENERS, TOPICS, QUALIFIERS, reword
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=3000)
+    parser.add_argument('--duplicates', type=float, default=0.3)
+    parser.add_argument('--threshold', type=float, default=CLUSTER_THRESHOLD)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    # (texto, pergunta de origem); origens distintas diferem no assunto, não só no verbo
+    distinct = int(args.questions * (1 - args.duplicates))
+    parts = {}
+    while len(parts) < distinct:
+        topic, qualifiers = rng.choice(TOPICS), tuple(sorted(rng.sample(QUALIFIERS, 3)))
+        parts.setdefault((topic, qualifiers), rng.choice(OPENERS))
+    originals = [f'{opener} {topic} {" ".join(qualifiers)}.' for (topic, qualifiers), opener in parts.items()]
+    questions = [(text, index) for index, text in enumerate(originals)]
+    while len(questions) < args.questions:
+        index = rng.randrange(len(originals))
+        questions.append((reword(originals[index], rng), index))
+    rng.shuffle(questions)
+
+    started = time.perf_counter()
+    representatives = cluster_texts([text for text, _ in questions], args.threshold)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    # Grupo correto: todas as perguntas com a mesma origem e nenhuma outra
+    groups = {}
+    for (_, origin), representative in zip(questions, representatives):
+        groups.setdefault(representative, set()).add(origin)
+    merged = sum(len(origins) - 1 for origins in groups.values())
+    group_of_origin = {}
+    for representative, origins in groups.items():
+        for origin in origins:
+            group_of_origin.setdefault(origin, set()).add(representative)
+    split = sum(len(found) - 1 for found in group_of_origin.values())
+
+    print(f'{len(questions)} questions ({len(questions) - distinct} duplicates) clustered in {elapsed_ms:.0f} ms, '
+          f'threshold {args.threshold}')
+    print(f'groups (AI calls in a batch): {len(groups)} (ideal {distinct}, one per question without clustering: '
+          f'{len(questions)})')
+    print(f'distinct questions merged:    {merged}')
+    print(f'duplicates left apart:        {split}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Check: read-replica routing and read-your-writes stickiness.
+
+Builds an app on the real db / RoutingSession with a primary and one
+replica database, counts the statements each engine receives, and walks
+through the routing rules:
+
+1. a read-only view reads from the replica;
+2. a write goes to the primary and sets the sticky cookie;
+3. a read-only view called with that cookie reads from the primary;
+4. once the cookie expires, reads go back to the replica.
+
+A scratch table is created in both databases, so any two empty SQLite
+files or PostgreSQL databases work (replication itself is not needed).
+
+Usage:
+    python benchmarks/replica_routing.py [--primary-url sqlite:///primary.db]
+                                         [--replica-url sqlite:///replica.db] [--sticky-seconds 1]
+
+Exits with status 1 when a step hits the wrong database.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from sqlalchemy import event, select, insert
+
+from src.config import engine_options
+from src.extensions.db import db
+from src.extensions.db_routing import read_only, init_db_routing, STICKY_COOKIE
+
+scratch = db.Table(
+    'replica_routing_check',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('note', db.String(50)),
+)
+
+def create_check_app(primary_url, replica_url, sticky_seconds):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=primary_url,
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options(primary_url),
+        SQLALCHEMY_BINDS={'replica_0': dict(engine_options(replica_url), url=replica_url)},
+        DB_REPLICA_STICKY_SECONDS=sticky_seconds,
+    )
+    db.init_app(app)
+    init_db_routing(app)
+
+    @app.route('/notes')
+    @read_only
+    def list_notes():
+        return jsonify([row.note for row in db.session.execute(select(scratch))])
+
+    @app.route('/notes', methods=['POST'])
+    def create_note():
+        db.session.execute(insert(scratch).values(note='written'))
+        db.session.commit()
+        return jsonify({'ok': True}), 201
+
+    return app
+
+def main():
+    tmp = tempfile.mkdtemp(prefix='replica-routing-')
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--primary-url', default=f"sqlite:///{os.path.join(tmp, 'primary.db')}")
+    parser.add_argument('--replica-url', default=f"sqlite:///{os.path.join(tmp, 'replica.db')}")
+    parser.add_argument('--sticky-seconds', type=int, default=1)
+    args = parser.parse_args()
+
+    app = create_check_app(args.primary_url, args.replica_url, args.sticky_seconds)
+    counts = Counter()
+    with app.app_context():
+        for name, engine in (('primary', db.engines[None]), ('replica', db.engines['replica_0'])):
+            scratch.create(engine, checkfirst=True)
+            event.listen(engine, 'before_cursor_execute',
+                         lambda *a, name=name: counts.update([name]))
+
+    client = app.test_client()
+
+    def step(description, expected, call):
+        counts.clear()
+        response = call()
+        hit = sorted(counts)
+        ok = hit == [expected]
+        print(f"{'ok' if ok else 'FAIL':>4}  {description:<42} -> {', '.join(hit) or 'no statements'}")
+        return ok, response
+
+    results = []
+    ok, _ = step('read-only view', 'replica', lambda: client.get('/notes'))
+    results.append(ok)
+    ok, response = step('write', 'primary', lambda: client.post('/notes'))
+    results.append(ok)
+    sticky = any(STICKY_COOKIE in header for header in response.headers.getlist('Set-Cookie'))
+    print(f"{'ok' if sticky else 'FAIL':>4}  write sets the {STICKY_COOKIE} cookie")
+    results.append(sticky)
+    ok, _ = step('read-only view right after the write', 'primary', lambda: client.get('/notes'))
+    results.append(ok)
+    time.sleep(args.sticky_seconds + 0.1)
+    ok, _ = step('read-only view after the sticky window', 'replica', lambda: client.get('/notes'))
+    results.append(ok)
+
+    return 0 if all(results) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
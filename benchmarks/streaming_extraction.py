@@ -0,0 +1,75 @@
+"""Benchmark: streaming extraction parser, time to first question and overhead.
+
+Replays a synthetic extraction output (a JSON array of questions, with one
+malformed item and a truncated tail) in SSE-sized fragments at a given
+model output rate, and feeds it to src.services.json_stream's parser the
+way AIService.stream_extract_questions does. Reports:
+
+- when the first and the last complete question become available, versus
+  waiting for the whole output as _parse_extracted_questions used to;
+- items recovered from the damaged output (previously the whole
+  extraction failed);
+- parser throughput, to show the per-character scan is not a bottleneck.
+
+Usage:
+    python benchmarks/streaming_extraction.py [--questions 60] [--chars-per-second 400] [--fragment 120]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.json_stream import JSONArrayStreamParser
+
+def synthetic_output(questions):
+    items = [json.dumps({
+        'question_text': f'Descreva o item {n} do escopo, incluindo prazos, "entregáveis" e responsáveis.',
+        'question_number': f'{n // 10 + 1}.{n % 10 + 1}',
+        'section': f'Seção {n // 10 + 1}',
+        'category': 'technical',
+        'question_type': 'open',
+        'required': n % 3 == 0,
+        'keywords': ['escopo', 'prazo', 'entregáveis'],
+        'confidence_score': 0.9
+    }, ensure_ascii=False) for n in range(questions)]
+    items[len(items) // 2] = items[len(items) // 2].replace('true', 'tru').replace('false', 'fals')
+    body = '```json\n[\n  ' + ',\n  '.join(items) + '\n]\n```'
+    # Saída cortada no limite de tokens: o último item fica aberto
+    return body[:-len(items[-1]) // 2 - 8]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=60)
+    parser.add_argument('--chars-per-second', type=float, default=400.0)
+    parser.add_argument('--fragment', type=int, default=120)
+    args = parser.parse_args()
+
+    output = synthetic_output(args.questions)
+    fragments = [output[i:i + args.fragment] for i in range(0, len(output), args.fragment)]
+
+    stream = JSONArrayStreamParser()
+    arrivals, errors = [], []
+    received = 0
+    started = time.perf_counter()
+    for fragment in fragments:
+        received += len(fragment)
+        for event in stream.feed(fragment):
+            (arrivals if event['type'] == 'item' else errors).append(received / args.chars_per_second)
+    errors.extend(received / args.chars_per_second for _ in stream.close())
+    parse_seconds = time.perf_counter() - started
+
+    full_output_seconds = len(output) / args.chars_per_second
+    print(f'output: {len(output)} chars in {len(fragments)} fragments, '
+          f'{full_output_seconds:.1f} s at {args.chars_per_second:.0f} chars/s')
+    print(f'first question available:  {arrivals[0]:.1f} s (streaming) vs {full_output_seconds:.1f} s (whole output)')
+    print(f'last complete question:    {arrivals[-1]:.1f} s')
+    print(f'questions recovered:       {len(arrivals)} of {args.questions}, {len(errors)} reported as malformed '
+          f'(whole-output parse: 0, extraction failed)')
+    print(f'parser throughput:         {len(output) / parse_seconds / 1e6:.1f} M chars/s')
+
+if __name__ == '__main__':
+    main()
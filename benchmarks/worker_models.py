@@ -0,0 +1,171 @@
+"""Benchmark: Gunicorn worker models for I/O-bound AI requests.
+
+Starts a local fake Gemini server that answers generateContent after a
+fixed delay, then, for each worker model, starts Gunicorn with
+gunicorn.conf.py and a small target app whose single route calls
+ai_service.generate_response (no database). A thread pool of clients
+hammers that route for a fixed duration and the throughput and latency
+percentiles are printed per worker model.
+
+Usage:
+    python benchmarks/worker_models.py [--models sync,gthread,gevent] [--ai-latency 0.5]
+                                       [--clients 64] [--duration 15] [--workers 2] [--threads 16]
+
+Worker models whose dependencies are missing (gevent) are skipped.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import importlib.util
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_RESPONSE = {
+    'candidates': [{
+        'content': {'parts': [{'text': 'Resposta de teste gerada pelo servidor falso.'}]}
+    }],
+    'usageMetadata': {'promptTokenCount': 100, 'candidatesTokenCount': 20}
+}
+
+def create_target_app():
+    """Target app loaded by Gunicorn: one route that performs one AI call."""
+    sys.path.insert(0, ROOT)
+    from flask import Flask, jsonify
+    from src.services.ai_service import ai_service
+
+    app = Flask(__name__)
+
+    @app.route('/generate')
+    def generate():
+        return jsonify(ai_service.generate_response('Descreva a solução.', [], 100))
+
+    return app
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.latency)
+        body = json.dumps(FAKE_RESPONSE).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+def load(url, clients, duration):
+    stop_at = time.perf_counter() + duration
+    local = threading.local()
+
+    def client(_):
+        session = getattr(local, 'session', None) or requests.Session()
+        local.session = session
+        latencies, errors = [], 0
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                if session.get(url, timeout=120).status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = list(executor.map(client, range(clients)))
+
+    latencies = sorted(l for result in results for l in result[0])
+    errors = sum(result[1] for result in results)
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float('nan')
+    return {
+        'rps': len(latencies) / duration,
+        'p50': pct(0.50),
+        'p95': pct(0.95),
+        'errors': errors,
+    }
+
+def run_model(model, args, fake_url):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''),
+        GEMINI_BASE_URL=fake_url,
+        GEMINI_API_KEY='benchmark',
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKER_CLASS=model,
+        GUNICORN_WORKERS=str(args.workers),
+        GUNICORN_THREADS=str(args.threads if model == 'gthread' else 1),
+        GUNICORN_ACCESS_LOG='/dev/null',
+        GUNICORN_LOG_LEVEL='warning',
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         'benchmarks.worker_models:create_target_app()'],
+        cwd=ROOT, env=env
+    )
+    try:
+        wait_for(f'http://127.0.0.1:{port}/generate')
+        return load(f'http://127.0.0.1:{port}/generate', args.clients, args.duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=args.duration + 60)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--models', default='sync,gthread,gevent')
+    parser.add_argument('--ai-latency', type=float, default=0.5)
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    FakeGeminiHandler.latency = args.ai_latency
+    fake_server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeminiHandler)
+    fake_server.daemon_threads = True
+    threading.Thread(target=fake_server.serve_forever, daemon=True).start()
+    fake_url = f'http://127.0.0.1:{fake_server.server_port}/v1beta'
+
+    print(f'fake AI latency {args.ai_latency}s, {args.clients} clients, {args.workers} workers, {args.duration}s per model')
+    print(f"{'worker model':>12} {'req/s':>8} {'p50 s':>7} {'p95 s':>7} {'errors':>7}")
+    for model in args.models.split(','):
+        if model == 'gevent' and importlib.util.find_spec('gevent') is None:
+            print(f'{model:>12}  skipped (gevent not installed)')
+            continue
+        result = run_model(model, args, fake_url)
+        print(f"{model:>12} {result['rps']:>8.1f} {result['p50']:>7.2f} {result['p95']:>7.2f} {result['errors']:>7}")
+
+    fake_server.shutdown()
+
+if __name__ == '__main__':
+    main()
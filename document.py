@@ -28,6 +28,11 @@ class Document(db.Model):
     uploaded_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Revisões (adendos): a revisão anterior é desativada quando esta é extraída
+    previous_revision_id = db.Column(UUID(as_uuid=True), db.ForeignKey('documents.id'))
+    revision_number = db.Column(db.Integer, nullable=False, default=1)
+    # Hashes das seções do texto já extraídas (ver services.document_revisions)
+    extracted_sections = db.Column(db.JSON)
     
     # Relacionamentos
     questions = db.relationship('Question', backref='document', lazy=True)
@@ -55,7 +60,9 @@ class Document(db.Model):
             'uploaded_by': str(self.uploaded_by),
             'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
             'processed_at': self.processed_at.isoformat() if self.processed_at else None,
-            'is_active': self.is_active
+            'is_active': self.is_active,
+            'previous_revision_id': str(self.previous_revision_id) if self.previous_revision_id else None,
+            'revision_number': self.revision_number
         }
     
     def get_text_preview(self, max_length=500):
@@ -0,0 +1,243 @@
+import re
+import hashlib
+from typing import Any, Dict, List, Optional, Set
+from src.models.document import Document
+from src.models.question import Question
+from src.services.answer_reuse import normalize_text, shingles
+from src.services.usage_metering import adjust_storage_usage
+
+# Tamanho máximo de texto por chamada de extração (o prompt da IA corta em 8000)
+SECTION_MAX_CHARS = 8000
+
+# Início de seção: "3.", "3.2", "4.1.2)", "SEÇÃO 5", "ANEXO II", "CAPÍTULO 1"...
+_HEADING = re.compile(
+    r'^\s*(?:\d+(?:\.\d+)*[.)]?\s+\S|(?:SE[ÇC][ÃA]O|CAP[ÍI]TULO|ANEXO|ADENDO|ITEM)\b)',
+    re.IGNORECASE
+)
+
+def is_heading(line: str) -> bool:
+    """Linha que inicia uma seção (título numerado ou nomeado)"""
+    return bool(_HEADING.match(line))
+
+def split_sections(text: str) -> List[str]:
+    """Divide o texto extraído em seções comparáveis entre revisões.
+
+    Páginas (quebra \\f do extrator de PDF) quando existem; senão, blocos
+    iniciados por títulos numerados ou nomeados. Seções acima de
+    SECTION_MAX_CHARS são quebradas em parágrafos.
+    """
+    text = text or ''
+    if '\f' in text:
+        units = text.split('\f')
+    else:
+        units, current = [], []
+        for line in text.splitlines():
+            if is_heading(line) and current:
+                units.append('\n'.join(current))
+                current = []
+            current.append(line)
+        units.append('\n'.join(current))
+
+    sections = []
+    for unit in units:
+        unit = unit.strip()
+        while len(unit) > SECTION_MAX_CHARS:
+            cut = unit.rfind('\n\n', 0, SECTION_MAX_CHARS)
+            if cut <= 0:
+                cut = unit.rfind('\n', 0, SECTION_MAX_CHARS)
+            if cut <= 0:
+                cut = SECTION_MAX_CHARS
+            sections.append(unit[:cut].strip())
+            unit = unit[cut:].strip()
+        if unit:
+            sections.append(unit)
+    return sections
+
+def section_hash(section: str) -> str:
+    """SHA-256 da seção com espaços normalizados (quebras de linha não contam)"""
+    return hashlib.sha256(' '.join(section.split()).encode('utf-8')).hexdigest()
+
+def extraction_batches(sections: List[str]) -> List[Dict[str, Any]]:
+    """Agrupa seções consecutivas em lotes de até SECTION_MAX_CHARS para a IA"""
+    batches, current, size = [], [], 0
+    for section in sections:
+        if current and size + len(section) + 2 > SECTION_MAX_CHARS:
+            batches.append(current)
+            current, size = [], 0
+        current.append(section)
+        size += len(section) + 2
+    if current:
+        batches.append(current)
+    return [{
+        'text': '\n\n'.join(batch),
+        'sections': [{'hash': section_hash(section), 'text': section} for section in batch]
+    } for batch in batches]
+
+def attribute_section(question_text: str, sections: List[Dict[str, str]]) -> Optional[str]:
+    """Hash da seção que mais contém os shingles do texto da pergunta.
+
+    A IA costuma transcrever a pergunta quase literalmente; a seção com a
+    maior fração dos shingles da pergunta é a de origem.
+    """
+    if len(sections) == 1:
+        return sections[0]['hash']
+    target = shingles(question_text)
+    if not target or not sections:
+        return None
+    best = max(sections, key=lambda section: len(target & shingles(section['text'])))
+    return best['hash']
+
+def extracted_section_hashes(document: Optional[Document]) -> Set[str]:
+    """Seções do documento que já passaram pela extração.
+
+    Documentos extraídos antes do rastreio de revisões não têm
+    extracted_sections; se já têm perguntas, todas as seções do texto contam.
+    """
+    if document is None:
+        return set()
+    if document.extracted_sections is not None:
+        return set(document.extracted_sections)
+    if Question.query.filter_by(document_id=document.id, is_active=True).first() is None:
+        return set()
+    return {section_hash(section) for section in split_sections(document.extracted_text)}
+
+def plan_extraction(document: Document, full: bool = False) -> Dict[str, Any]:
+    """Seções a enviar à IA para o documento (apenas valores simples).
+
+    Seções já extraídas neste documento ou na revisão anterior (mesmo hash)
+    não voltam para a IA; as perguntas delas são mantidas por
+    carry_over_questions. Com `full`, todas as seções são reextraídas.
+
+    Returns:
+        dict: previous_revision_id, section_hashes, unchanged_sections, batches e sections_total
+    """
+    sections = split_sections(document.extracted_text)
+    hashes = [section_hash(section) for section in sections]
+    previous = Document.query.get(document.previous_revision_id) if document.previous_revision_id else None
+
+    unchanged = set()
+    if not full:
+        unchanged = set(hashes) & (extracted_section_hashes(document) | extracted_section_hashes(previous))
+
+    return {
+        'previous_revision_id': previous.id if previous is not None else None,
+        'section_hashes': hashes,
+        'unchanged_sections': sorted(unchanged),
+        'batches': extraction_batches([section for section, h in zip(sections, hashes) if h not in unchanged]),
+        'sections_total': len(sections)
+    }
+
+def _legacy_sections(documents: Dict[Any, Document], questions: List[Question]) -> Dict[Any, Optional[str]]:
+    """Atribui seções a perguntas extraídas antes do rastreio de revisões"""
+    sections_by_document = {}
+    attributed = {}
+    for question in questions:
+        if question.source_section is not None:
+            continue
+        if question.document_id not in sections_by_document:
+            sections_by_document[question.document_id] = [
+                {'hash': section_hash(section), 'text': section}
+                for section in split_sections(documents[question.document_id].extracted_text)
+            ]
+        attributed[question.id] = attribute_section(question.question_text, sections_by_document[question.document_id])
+    return attributed
+
+def _revision_questions(document: Document, plan: Dict[str, Any]):
+    """Perguntas ativas do documento e da revisão anterior, com a seção de origem de cada uma"""
+    documents = {document.id: document}
+    if plan['previous_revision_id']:
+        previous = Document.query.get(plan['previous_revision_id'])
+        documents[previous.id] = previous
+
+    questions = Question.query.filter(
+        Question.document_id.in_(list(documents)),
+        Question.is_active == True
+    ).order_by(Question.extracted_at).all()
+    legacy = _legacy_sections(documents, questions)
+    return documents, [(question, question.source_section or legacy.get(question.id)) for question in questions]
+
+def reconciliation_candidates(document: Document, plan: Dict[str, Any]) -> Dict[str, List[Any]]:
+    """Perguntas existentes de seções reextraídas, por texto normalizado (ids, mais antigas primeiro).
+
+    Um item extraído com o mesmo texto normalizado reaproveita a pergunta
+    (e suas respostas) em vez de criar outra; ver adopt_question.
+    """
+    unchanged = set(plan['unchanged_sections'])
+    _, questions = _revision_questions(document, plan)
+    candidates = {}
+    for question, source in questions:
+        if source not in unchanged:
+            candidates.setdefault(normalize_text(question.question_text), []).append(question.id)
+    return candidates
+
+def adopt_question(question_id, document: Document, item: Dict[str, Any]) -> Question:
+    """Mantém uma pergunta existente para um item reextraído (não confirma)"""
+    question = Question.query.get(question_id)
+    question.document_id = document.id
+    question.question_number = item.get('question_number')
+    question.section = item.get('section')
+    question.source_section = item.get('source_section')
+    return question
+
+def finish_reconciliation(document: Document, plan: Dict[str, Any], adopted_ids) -> Dict[str, Any]:
+    """Conclui a extração de uma revisão (não confirma).
+
+    Perguntas de seções inalteradas passam para o documento; as de seções
+    reextraídas que não foram adotadas são desativadas; a revisão anterior
+    deixa de estar ativa e as seções do documento ficam marcadas como
+    extraídas.
+
+    Returns:
+        dict: carried (perguntas de seções inalteradas) e removed (quantidade)
+    """
+    unchanged = set(plan['unchanged_sections'])
+    documents, questions = _revision_questions(document, plan)
+
+    carried, removed = [], 0
+    for question, source in questions:
+        if source in unchanged:
+            question.document_id = document.id
+            question.source_section = source
+            carried.append(question)
+        elif question.id not in adopted_ids:
+            question.is_active = False
+            removed += 1
+
+    for other in documents.values():
+        if other.id != document.id and other.is_active:
+            other.is_active = False
+            adjust_storage_usage(other.organization_id, -other.file_size)
+    document.extracted_sections = plan['section_hashes']
+
+    return {'carried': carried, 'removed': removed}
+
+def carry_over_questions(document: Document, plan: Dict[str, Any],
+                         extracted_questions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Concilia as perguntas existentes com uma extração completa (não confirma).
+
+    Perguntas do documento e da revisão anterior vindas de seções
+    inalteradas ficam no documento com suas respostas. Das seções
+    reextraídas, perguntas com o mesmo texto normalizado de um item
+    extraído também ficam (e o item não vira pergunta nova); as demais são
+    desativadas. A revisão anterior deixa de estar ativa.
+
+    Returns:
+        dict: carried (perguntas mantidas), removed (quantidade) e
+              remaining (itens extraídos que viram perguntas novas)
+    """
+    candidates = reconciliation_candidates(document, plan)
+
+    adopted, remaining = [], []
+    for item in extracted_questions:
+        ids = candidates.get(normalize_text(item['question_text']))
+        if ids:
+            adopted.append(adopt_question(ids.pop(0), document, item))
+        else:
+            remaining.append(item)
+
+    finished = finish_reconciliation(document, plan, {question.id for question in adopted})
+    return {
+        'carried': finished['carried'] + adopted,
+        'removed': finished['removed'],
+        'remaining': remaining
+    }
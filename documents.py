@@ -9,6 +9,10 @@ import uuid
 from src.models.user import User, db
 from src.models.document import Document
 from src.models.project import Project
+from src.services.usage_metering import adjust_storage_usage
+from src.services.knowledge_ingestion import ingest_document, is_superseded
+from src.middleware.auth_middleware import audit_log
+from src.extensions.db_routing import read_only
 
 documents_bp = Blueprint('documents', __name__)
 
@@ -74,6 +78,25 @@ def upload_document():
         project_id = request.form.get('project_id')
         document_type = request.form.get('document_type', 'rfp')
         name = request.form.get('name', file.filename)
+        replaces_document_id = request.form.get('replaces_document_id')
+        
+        # Nova revisão (adendo) de um documento existente: herda projeto e tipo
+        previous = None
+        if replaces_document_id:
+            previous = Document.query.filter_by(
+                id=replaces_document_id,
+                organization_id=user.organization_id,
+                is_active=True
+            ).first()
+            if not previous:
+                return jsonify({
+                    'error': {
+                        'code': 'DOCUMENT_NOT_FOUND',
+                        'message': 'Documento a ser substituído não encontrado'
+                    }
+                }), 404
+            project_id = str(previous.project_id) if previous.project_id else None
+            document_type = previous.document_type
         
         # Validar projeto se fornecido
         if project_id:
@@ -137,10 +160,13 @@ def upload_document():
             mime_type=mime_type,
             file_hash=file_hash,
             document_type=document_type,
-            uploaded_by=user.id
+            uploaded_by=user.id,
+            previous_revision_id=previous.id if previous else None,
+            revision_number=previous.revision_number + 1 if previous else 1
         )
         
         db.session.add(document)
+        adjust_storage_usage(user.organization_id, file_size)
         db.session.commit()
         
         # TODO: Iniciar processamento assíncrono do documento
@@ -160,6 +186,7 @@ def upload_document():
 
 @documents_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def list_documents():
     """Listar documentos"""
     try:
@@ -229,6 +256,7 @@ def list_documents():
 
 @documents_bp.route('/<document_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_document(document_id):
     """Obter detalhes de um documento"""
     try:
@@ -268,6 +296,55 @@ def get_document(document_id):
             }
         }), 500
 
+@documents_bp.route('/<document_id>', methods=['DELETE'])
+@jwt_required()
+@audit_log('delete', resource_type='document')
+def delete_document(document_id):
+    """Excluir documento (soft delete)"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_active:
+            return jsonify({
+                'error': {
+                    'code': 'USER_NOT_FOUND',
+                    'message': 'Usuário não encontrado ou inativo'
+                }
+            }), 404
+        
+        document = Document.query.filter_by(
+            id=document_id,
+            organization_id=user.organization_id,
+            is_active=True
+        ).first()
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Documento não encontrado'
+                }
+            }), 404
+        
+        # Soft delete
+        document.is_active = False
+        adjust_storage_usage(user.organization_id, -document.file_size)
+        
+        db.session.commit()
+        
+        return '', 204
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': {
+                'code': 'DELETE_ERROR',
+                'message': 'Erro ao excluir documento',
+                'details': str(e)
+            }
+        }), 500
+
 @documents_bp.route('/<document_id>/download', methods=['GET'])
 @jwt_required()
 def download_document(document_id):
@@ -324,6 +401,7 @@ def download_document(document_id):
 
 @documents_bp.route('/<document_id>/text', methods=['GET'])
 @jwt_required()
+@read_only
 def get_document_text(document_id):
     """Obter texto extraído do documento"""
     try:
@@ -375,3 +453,129 @@ def get_document_text(document_id):
             }
         }), 500
 
+@documents_bp.route('/<document_id>/revisions', methods=['GET'])
+@jwt_required()
+@read_only
+def get_document_revisions(document_id):
+    """Histórico de revisões do documento, da mais recente para a original"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_active:
+            return jsonify({
+                'error': {
+                    'code': 'USER_NOT_FOUND',
+                    'message': 'Usuário não encontrado ou inativo'
+                }
+            }), 404
+        
+        document = Document.query.filter_by(
+            id=document_id,
+            organization_id=user.organization_id
+        ).first()
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Documento não encontrado'
+                }
+            }), 404
+        
+        # Revisões anteriores ficam inativas, mas continuam consultáveis aqui
+        revisions = [document]
+        while revisions[-1].previous_revision_id and len(revisions) < document.revision_number:
+            previous = Document.query.filter_by(
+                id=revisions[-1].previous_revision_id,
+                organization_id=user.organization_id
+            ).first()
+            if not previous:
+                break
+            revisions.append(previous)
+        
+        return jsonify({
+            'data': [revision.to_dict() for revision in revisions]
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'GET_REVISIONS_ERROR',
+                'message': 'Erro ao obter revisões do documento',
+                'details': str(e)
+            }
+        }), 500
+
+@documents_bp.route('/<document_id>/ingest', methods=['POST'])
+@jwt_required()
+@audit_log('ingest', resource_type='document')
+def ingest_document_knowledge(document_id):
+    """Ingere um documento da base de conhecimento em trechos (KnowledgeBase)"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_active:
+            return jsonify({
+                'error': {
+                    'code': 'USER_NOT_FOUND',
+                    'message': 'Usuário não encontrado ou inativo'
+                }
+            }), 404
+        
+        document = Document.query.filter_by(
+            id=document_id,
+            organization_id=user.organization_id,
+            is_active=True
+        ).first()
+        
+        if not document:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_FOUND',
+                    'message': 'Documento não encontrado'
+                }
+            }), 404
+        
+        if document.document_type != 'knowledge_base':
+            return jsonify({
+                'error': {
+                    'code': 'INVALID_DOCUMENT_TYPE',
+                    'message': 'Apenas documentos da base de conhecimento podem ser ingeridos'
+                }
+            }), 400
+        
+        if document.processing_status != 'completed' or not document.extracted_text:
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_NOT_PROCESSED',
+                    'message': 'Documento ainda não processado ou sem texto extraído'
+                }
+            }), 400
+        
+        if is_superseded(document):
+            return jsonify({
+                'error': {
+                    'code': 'DOCUMENT_SUPERSEDED',
+                    'message': 'Documento substituído por uma revisão mais nova; ingira a revisão atual'
+                }
+            }), 409
+        
+        stats = ingest_document(document)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Documento ingerido na base de conhecimento',
+            'data': stats
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': {
+                'code': 'INGEST_ERROR',
+                'message': 'Erro ao ingerir documento na base de conhecimento',
+                'details': str(e)
+            }
+        }), 500
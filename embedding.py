@@ -0,0 +1,23 @@
+from datetime import datetime
+from src.models.user import db
+
+class TextEmbedding(db.Model):
+    """Cache de embeddings por conteúdo do texto.
+
+    A chave é o hash do texto (espaços normalizados) e o modelo que o
+    gerou: perguntas e trechos da base de conhecimento com o mesmo texto
+    compartilham o vetor, e um texto inalterado nunca é reprocessado. O
+    vetor fica quantizado em int8 (um byte por dimensão) com a escala
+    para reconstruí-lo (ver services.embeddings).
+    """
+    __tablename__ = 'text_embeddings'
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    model = db.Column(db.String(100), primary_key=True)
+    dimensions = db.Column(db.SmallInteger, nullable=False)
+    scale = db.Column(db.Float, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TextEmbedding {self.model}:{self.content_hash[:12]}>'
@@ -0,0 +1,364 @@
+import os
+import math
+import time
+import queue
+import hashlib
+import logging
+import threading
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.embedding import TextEmbedding
+from src.services.answer_reuse import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Modelo padrão: embeddings por hashing de atributos, em Python puro e sem rede.
+# "hashing-<dimensões>" escolhe o tamanho; outro valor é o caminho de um modelo
+# sentence-transformers já baixado (carregado só de arquivos locais).
+DEFAULT_MODEL = 'hashing-256'
+
+# Lote dinâmico: o lote leva o que se acumulou na fila enquanto o modelo rodava
+# o anterior, até DEFAULT_BATCH_SIZE textos, esperando até DEFAULT_BATCH_WAIT_MS por mais
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_WAIT_MS = 2
+
+# Consultas ao cache com IN limitado
+LOOKUP_CHUNK = 500
+
+# Pesos dos atributos do embedding por hashing: palavras, pares de palavras e
+# trigramas de caracteres de cada palavra (tolera plural, conjugação e erros de digitação)
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+SUBWORD_WEIGHT = 0.3
+
+def content_key(text: str) -> str:
+    """Chave do cache: hash do texto com espaços normalizados"""
+    return hashlib.sha256(' '.join((text or '').split()).encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=1 << 18)
+def _feature_slot(feature: str) -> int:
+    """Posição e sinal do atributo (estável entre processos); o vocabulário se repete muito"""
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class HashingEmbedder:
+    """Embeddings por hashing de atributos (feature hashing com sinal).
+
+    Cada palavra, par de palavras e trigrama de caracteres do texto
+    normalizado cai em uma das `dimensions` posições com sinal dado pelo
+    próprio hash; a contagem entra em escala logarítmica e o vetor é
+    normalizado. Não há treino nem pesos a carregar: o resultado é
+    determinístico, e textos com vocabulário em comum ficam próximos.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+        self.name = f'hashing-{dimensions}'
+
+    def _features(self, text: str) -> Dict[str, float]:
+        words = normalize_text(text).split()
+        features: Dict[str, float] = {}
+        for index, word in enumerate(words):
+            features[word] = features.get(word, 0.0) + WORD_WEIGHT
+            if index:
+                bigram = f'{words[index - 1]} {word}'
+                features[bigram] = features.get(bigram, 0.0) + BIGRAM_WEIGHT
+            padded = f'<{word}>'
+            for start in range(len(padded) - 2):
+                trigram = '#' + padded[start:start + 3]
+                features[trigram] = features.get(trigram, 0.0) + SUBWORD_WEIGHT
+        return features
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for feature, weight in self._features(text).items():
+            slot = _feature_slot(feature)
+            value = 1.0 + math.log(weight) if weight > 1.0 else weight
+            if slot & 1:
+                value = -value
+            vector[(slot >> 1) % self.dimensions] += value
+        norm = math.sqrt(sum(v * v for v in vector))
+        return [v / norm for v in vector] if norm else vector
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed(text) for text in texts]
+
+class SentenceTransformerEmbedder:
+    """Modelo sentence-transformers local, na CPU (dependência opcional)"""
+
+    def __init__(self, path: str):
+        # Nunca baixa pesos: o modelo precisa estar no disco
+        os.environ.setdefault('HF_HUB_OFFLINE', '1')
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise Exception("Pacote 'sentence-transformers' é necessário para EMBEDDING_MODEL diferente de hashing-N")
+        self._model = SentenceTransformer(path, device='cpu')
+        self.dimensions = self._model.get_sentence_embedding_dimension()
+        self.name = path
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return self._model.encode(texts, batch_size=len(texts), normalize_embeddings=True,
+                                  show_progress_bar=False).tolist()
+
+def create_embedder(model: str):
+    """Cria o embedder a partir do nome do modelo (ver DEFAULT_MODEL)"""
+    if model.startswith('hashing-'):
+        return HashingEmbedder(int(model.split('-', 1)[1]))
+    return SentenceTransformerEmbedder(model)
+
+def quantize(vector: List[float]) -> Tuple[bytes, float]:
+    """Vetor em int8 (um byte por dimensão) e a escala para reconstruí-lo"""
+    peak = max((abs(v) for v in vector), default=0.0)
+    scale = peak / 127 if peak else 1.0
+    return array('b', [round(v / scale) for v in vector]).tobytes(), scale
+
+def dequantize(blob: bytes, scale: float) -> List[float]:
+    values = array('b')
+    values.frombytes(blob)
+    return [v * scale for v in values]
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+class EmbeddingBatcher:
+    """Reúne em um lote os textos de chamadas simultâneas ao mesmo embedder.
+
+    Uma thread por processo roda o modelo: a cada vez leva os pedidos que
+    se acumularam na fila enquanto o lote anterior rodava e espera até
+    `max_wait_ms` por outros, até `max_batch` textos. O modelo roda uma
+    vez para o lote e cada chamada recebe os seus vetores.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], List[List[float]]],
+                 max_batch: int = DEFAULT_BATCH_SIZE, max_wait_ms: float = DEFAULT_BATCH_WAIT_MS):
+        self._embed_batch = embed_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        # A thread não sobrevive ao fork dos workers do Gunicorn: uma por processo
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, args=(self._queue,), name='embedding-batcher', daemon=True).start()
+                self._pid = os.getpid()
+
+    def _run(self, requests: queue.Queue):
+        while True:
+            batch = [requests.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = requests.get_nowait() if remaining <= 0 else requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            try:
+                vectors = self._embed_batch([text for texts, _ in batch for text in texts])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            offset = 0
+            for texts, future in batch:
+                future.set_result(vectors[offset:offset + len(texts)])
+                offset += len(texts)
+
+class EmbeddingService:
+    """Embeddings de perguntas e trechos da base de conhecimento, com cache por conteúdo"""
+
+    def __init__(self):
+        self._embedders: Dict[str, Any] = {}
+        self._batchers: Dict[str, EmbeddingBatcher] = {}
+        self._lock = threading.Lock()
+
+    def configured_model(self) -> str:
+        return current_app.config.get('EMBEDDING_MODEL', DEFAULT_MODEL)
+
+    def get_embedder(self, model: str):
+        with self._lock:
+            embedder = self._embedders.get(model)
+            if embedder is None:
+                embedder = self._embedders[model] = create_embedder(model)
+            return embedder
+
+    def _batcher(self, model: str) -> EmbeddingBatcher:
+        embedder = self.get_embedder(model)
+        with self._lock:
+            batcher = self._batchers.get(model)
+            if batcher is None:
+                config = current_app.config
+                batcher = self._batchers[model] = EmbeddingBatcher(
+                    embedder.embed_batch,
+                    config.get('EMBEDDING_BATCH_SIZE', DEFAULT_BATCH_SIZE),
+                    config.get('EMBEDDING_BATCH_WAIT_MS', DEFAULT_BATCH_WAIT_MS)
+                )
+            return batcher
+
+    def embed_texts(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Vetores dos textos, do cache quando o texto já foi processado.
+
+        Os textos que faltam passam pelo lote dinâmico e são gravados no
+        cache na transação atual (não confirma). Os vetores devolvidos são
+        sempre os reconstruídos do int8, para que um texto dê o mesmo
+        resultado vindo do cache ou não.
+        """
+        model = model or self.configured_model()
+        keys = [content_key(text) for text in texts]
+        vectors = load_cached(set(keys), model)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+        if missing:
+            fresh = self._batcher(model).embed(list(missing.values()))
+            rows = [_cache_row(key, vector, model) for key, vector in zip(missing, fresh)]
+            store_rows(rows)
+            for row in rows:
+                vectors[row['content_hash']] = dequantize(row['vector'], row['scale'])
+
+        return [vectors[key] for key in keys]
+
+    def embed_text(self, text: str, model: Optional[str] = None) -> List[float]:
+        return self.embed_texts([text], model)[0]
+
+def _cache_row(key: str, vector: List[float], model: str) -> Dict[str, Any]:
+    blob, scale = quantize(vector)
+    return {'content_hash': key, 'model': model, 'dimensions': len(vector), 'scale': scale,
+            'vector': blob, 'created_at': datetime.utcnow()}
+
+def load_cached(keys: Iterable[str], model: str) -> Dict[str, List[float]]:
+    """Vetores já em cache para as chaves (as ausentes ficam de fora)"""
+    keys = list(keys)
+    vectors = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        rows = db.session.query(TextEmbedding.content_hash, TextEmbedding.vector, TextEmbedding.scale).filter(
+            TextEmbedding.model == model,
+            TextEmbedding.content_hash.in_(keys[start:start + LOOKUP_CHUNK])
+        )
+        for content_hash, blob, scale in rows:
+            vectors[content_hash] = dequantize(blob, scale)
+    return vectors
+
+def _cached_keys(keys: List[str], model: str) -> set:
+    found = set()
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        found.update(row[0] for row in db.session.query(TextEmbedding.content_hash).filter(
+            TextEmbedding.model == model,
+            TextEmbedding.content_hash.in_(keys[start:start + LOOKUP_CHUNK])
+        ))
+    return found
+
+def store_rows(rows: List[Dict[str, Any]]):
+    """Grava linhas do cache em lote; as que outro processo gravou antes são ignoradas"""
+    if not rows:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.bulk_insert_mappings(TextEmbedding, rows)
+    except IntegrityError:
+        existing = _cached_keys([row['content_hash'] for row in rows], rows[0]['model'])
+        for row in rows:
+            if row['content_hash'] in existing:
+                continue
+            try:
+                with db.session.begin_nested():
+                    db.session.bulk_insert_mappings(TextEmbedding, [row])
+            except IntegrityError:
+                pass
+
+_process_embedders: Dict[str, Any] = {}
+
+def _embed_chunk(model: str, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """Roda nos processos do backfill: embedding e quantização de um lote"""
+    embedder = _process_embedders.get(model)
+    if embedder is None:
+        embedder = _process_embedders[model] = create_embedder(model)
+    vectors = embedder.embed_batch([text for _, text in items])
+    return [_cache_row(key, vector, model) for (key, _), vector in zip(items, vectors)]
+
+def backfill_embeddings(texts: Iterable[str], model: str = DEFAULT_MODEL, processes: Optional[int] = None,
+                        batch_size: int = DEFAULT_BATCH_SIZE * 4) -> Dict[str, int]:
+    """Gera os embeddings que faltam no cache para um fluxo de textos.
+
+    Os textos são lidos em lotes; os que já estão no cache, ou que
+    repetem um texto ainda em processamento, são pulados. Os demais vão
+    para um pool de processos, um lote por tarefa, com até duas tarefas
+    por processo em andamento. O processo atual grava os resultados e
+    confirma a cada lote enquanto o pool continua ocupado.
+
+    Returns:
+        dict: total (textos lidos), cached (já em cache, repetidos ou vazios) e embedded
+    """
+    processes = processes or os.cpu_count() or 1
+    stats = {'total': 0, 'cached': 0, 'embedded': 0}
+    pending_keys = set()
+    in_flight = set()
+
+    def collect(block: bool):
+        nonlocal in_flight
+        done, in_flight = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+        for future in done:
+            rows = future.result()
+            store_rows(rows)
+            db.session.commit()
+            pending_keys.difference_update(row['content_hash'] for row in rows)
+            stats['embedded'] += len(rows)
+
+    def submit(pool, batch: Dict[str, str]):
+        cached = _cached_keys(list(batch), model)
+        stats['cached'] += len(cached)
+        items = [(key, text) for key, text in batch.items() if key not in cached]
+        if not items:
+            return
+        while len(in_flight) >= processes * 2:
+            collect(block=True)
+        pending_keys.update(key for key, _ in items)
+        in_flight.add(pool.submit(_embed_chunk, model, items))
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        batch = {}
+        for text in texts:
+            stats['total'] += 1
+            key = content_key(text) if text and text.strip() else None
+            if key is None or key in batch or key in pending_keys:
+                stats['cached'] += 1
+                continue
+            batch[key] = text
+            if len(batch) >= batch_size:
+                submit(pool, batch)
+                batch = {}
+                if in_flight:
+                    collect(block=False)
+        if batch:
+            submit(pool, batch)
+        while in_flight:
+            collect(block=True)
+    return stats
+
+# Instância global do serviço
+embedding_service = EmbeddingService()
@@ -0,0 +1,133 @@
+from typing import Any, Callable, Dict
+
+# Valores aceitos pela coluna questions.question_type
+QUESTION_TYPES = ['open', 'multiple_choice', 'yes_no', 'numeric', 'date', 'file_upload']
+
+# Schema de saída da extração no formato do Gemini (responseSchema, subconjunto OpenAPI).
+# Tamanhos máximos acompanham as colunas de Question.
+QUESTION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'question_text': {'type': 'STRING'},
+        'question_number': {'type': 'STRING', 'nullable': True, 'maxLength': 50},
+        'section': {'type': 'STRING', 'nullable': True, 'maxLength': 255},
+        'category': {'type': 'STRING', 'maxLength': 100},
+        'question_type': {'type': 'STRING', 'format': 'enum', 'enum': QUESTION_TYPES},
+        'required': {'type': 'BOOLEAN'},
+        'max_words': {'type': 'INTEGER', 'nullable': True, 'minimum': 1},
+        'keywords': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'context': {'type': 'STRING', 'nullable': True},
+        'confidence_score': {'type': 'NUMBER', 'minimum': 0, 'maximum': 1}
+    },
+    'required': ['question_text'],
+    'propertyOrdering': [
+        'question_text', 'question_number', 'section', 'category', 'question_type',
+        'required', 'max_words', 'keywords', 'context', 'confidence_score'
+    ]
+}
+
+EXTRACTION_RESPONSE_SCHEMA = {'type': 'ARRAY', 'items': QUESTION_SCHEMA}
+
+# Valor usado quando o campo opcional falta ou não passa na validação
+QUESTION_DEFAULTS = {
+    'question_number': None,
+    'section': None,
+    'category': 'general',
+    'question_type': 'open',
+    'required': False,
+    'max_words': None,
+    'keywords': [],
+    'context': None,
+    'confidence_score': 0.8
+}
+
+class _Invalid(Exception):
+    pass
+
+def _compile_field(schema: Dict[str, Any]) -> Callable[[Any], Any]:
+    """Função que valida (e normaliza) um valor contra o schema de um campo"""
+    kind = schema['type']
+    nullable = schema.get('nullable', False)
+    enum = frozenset(schema['enum']) if 'enum' in schema else None
+    max_length = schema.get('maxLength')
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+    items = _compile_field(schema['items']) if kind == 'ARRAY' else None
+
+    def check(value):
+        if value is None:
+            if nullable:
+                return None
+            raise _Invalid('nulo')
+        if kind == 'STRING':
+            if not isinstance(value, str):
+                raise _Invalid('não é texto')
+            value = value.strip()
+            if enum is not None and value not in enum:
+                raise _Invalid(f'fora de {sorted(enum)}')
+            if max_length is not None and len(value) > max_length:
+                value = value[:max_length]
+        elif kind == 'BOOLEAN':
+            if not isinstance(value, bool):
+                raise _Invalid('não é booleano')
+        elif kind in ('INTEGER', 'NUMBER'):
+            # bool é subclasse de int; um número inteiro em ponto flutuante (3.0) vale como INTEGER
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise _Invalid('não é número')
+            if kind == 'INTEGER':
+                if value != int(value):
+                    raise _Invalid('não é inteiro')
+                value = int(value)
+            if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+                raise _Invalid('fora do intervalo')
+        elif kind == 'ARRAY':
+            if not isinstance(value, list):
+                raise _Invalid('não é lista')
+            # Elementos inválidos são descartados, não invalidam a lista
+            checked = []
+            for element in value:
+                try:
+                    checked.append(items(element))
+                except _Invalid:
+                    continue
+            value = checked
+        return value
+
+    return check
+
+def compile_validator(schema: Dict[str, Any], defaults: Dict[str, Any]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Compila um schema de objeto em uma função de validação.
+
+    O schema é percorrido uma vez; cada item passa apenas pelas checagens
+    já montadas. Campos obrigatórios ausentes ou inválidos geram
+    ValueError; opcionais inválidos recebem o valor de `defaults`. Campos
+    fora do schema são ignorados.
+    """
+    required = frozenset(schema.get('required', []))
+    fields = [
+        (name, _compile_field(field), name in required, defaults.get(name))
+        for name, field in schema['properties'].items()
+    ]
+
+    def validate(item: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(item, dict):
+            raise ValueError('Item não é um objeto JSON')
+        result = {}
+        for name, check, is_required, default in fields:
+            value = item.get(name)
+            if value is not None:
+                try:
+                    value = check(value)
+                except _Invalid as e:
+                    if is_required:
+                        raise ValueError(f'Campo {name} inválido: {e}')
+                    value = None
+            if is_required and (value is None or value == ''):
+                raise ValueError(f'Item sem {name}')
+            # Listas padrão são copiadas para não serem compartilhadas entre itens
+            result[name] = value if value is not None else (list(default) if isinstance(default, list) else default)
+        return result
+
+    return validate
+
+validate_question = compile_validator(QUESTION_SCHEMA, QUESTION_DEFAULTS)
@@ -0,0 +1,95 @@
+"""Configuração do Gunicorn para produção.
+
+Uso: gunicorn -c gunicorn.conf.py wsgi:app
+
+As requisições passam a maior parte do tempo esperando a API de IA (I/O),
+por isso o padrão é gthread: poucos processos, várias threads cada. Todos
+os valores podem ser sobrescritos por variáveis de ambiente GUNICORN_*.
+"""
+
+import os
+import gc
+import tempfile
+import multiprocessing
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Modelo de workers: gthread (padrão), gevent (requer o pacote gevent) ou
+# uvicorn.workers.UvicornWorker com asgi:app (rotas de IA assíncronas)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = _env_int('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1)
+threads = _env_int('GUNICORN_THREADS', 16)
+worker_connections = _env_int('GUNICORN_WORKER_CONNECTIONS', 200)
+
+# Carregar a aplicação no master antes do fork: modelos, configuração e
+# índices ficam compartilhados entre os workers por copy-on-write
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Timeouts maiores que a latência máxima das chamadas de IA
+ai_request_timeout = _env_int('AI_REQUEST_TIMEOUT', 60)
+timeout = _env_int('GUNICORN_TIMEOUT', ai_request_timeout * 2)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', ai_request_timeout + 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# Reciclar workers periodicamente (com jitter para não reiniciarem todos juntos)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+# /metrics soma as métricas de todos os workers por este diretório (ver
+# src.middleware.instrumentation); definido antes de a aplicação ser carregada
+metrics_dir = os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'rfp-metrics'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+def on_starting(server):
+    # Métricas de uma execução anterior do servidor não entram na soma
+    if os.path.isdir(metrics_dir):
+        for filename in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, filename))
+
+def pre_fork(server, worker):
+    # Objetos já carregados não são mais tocados pelo GC, preservando as páginas compartilhadas
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Conexões abertas no master não podem ser compartilhadas entre processos
+    if not preload_app:
+        return
+
+    app = server.app.wsgi()
+    # asgi:app envolve a aplicação Flask
+    app = getattr(app, 'flask_app', app)
+    if 'sqlalchemy' not in getattr(app, 'extensions', {}):
+        return
+
+    from src.models.user import db
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    # Grava o que os writers em segundo plano ainda têm em memória (uso de IA,
+    # auditoria, contadores da base de conhecimento, últimos logins) antes de o worker sair
+    from src.services.write_behind import BufferedWriter
+    app = getattr(worker, 'wsgi', None)
+    app = getattr(app, 'flask_app', app)
+    for extension in getattr(app, 'extensions', {}).values():
+        if isinstance(extension, BufferedWriter):
+            try:
+                extension.flush()
+            except Exception as e:
+                server.log.error(f"Erro no flush de {extension.name}: {e}")
+
+    # Última fotografia das métricas do worker, somada pelos que continuam
+    store = getattr(app, 'extensions', {}).get('metrics_store')
+    if store is not None:
+        from src.middleware.instrumentation import metrics
+        try:
+            store.write(metrics)
+        except Exception as e:
+            server.log.error(f"Erro ao gravar métricas do worker: {e}")
@@ -0,0 +1,315 @@
+import json
+import time
+import uuid
+import hashlib
+import asyncio
+import logging
+import threading
+from functools import wraps
+from typing import Any, Dict, Optional
+from flask import current_app, request, jsonify
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+
+logger = logging.getLogger(__name__)
+
+# Padrões; sobrescritos por IDEMPOTENCY_* na configuração da aplicação
+DEFAULT_TTL = 24 * 3600        # resultado guardado para uma Idempotency-Key
+DEFAULT_COALESCE_TTL = 30      # resultado de uma requisição sem chave, para as idênticas que a aguardavam
+DEFAULT_LOCK_TTL = 300         # reserva de uma requisição em andamento (worker que morreu a libera)
+DEFAULT_WAIT_TIMEOUT = 120     # quanto uma requisição repetida espera pela original
+POLL_INTERVAL = 0.2
+
+MAX_KEY_LENGTH = 255
+
+# Respostas que não são guardadas para uma Idempotency-Key: a repetição executa de novo
+_RETRYABLE_STATUS = {408, 409, 425, 429}
+
+class MemoryBackend:
+    """Registros em memória do processo, com expiração"""
+
+    PRUNE_EVERY = 1024
+
+    def __init__(self):
+        self._records: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        """Grava apenas se a chave não existe (ou expirou)"""
+        now = time.monotonic()
+        with self._lock:
+            current = self._records.get(key)
+            if current is not None and current[1] > now:
+                return False
+            self._write(key, value, ttl, now)
+            return True
+
+    def get(self, key: str) -> Optional[str]:
+        current = self._records.get(key)
+        if current is None or current[1] <= time.monotonic():
+            return None
+        return current[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._write(key, value, ttl, time.monotonic())
+
+    def delete(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+    def _write(self, key, value, ttl, now):
+        self._records[key] = (value, now + ttl)
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            for stale in [k for k, (_, expires) in self._records.items() if expires <= now]:
+                del self._records[stale]
+
+class RedisBackend:
+    """Registros compartilhados entre processos (SET NX com expiração)"""
+
+    def __init__(self, client, prefix: str = 'idem:'):
+        self._redis = client
+        self._prefix = prefix
+
+    def add(self, key: str, value: str, ttl: float) -> bool:
+        return bool(self._redis.set(self._prefix + key, value, nx=True, px=int(ttl * 1000)))
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._redis.get(self._prefix + key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: float):
+        self._redis.set(self._prefix + key, value, px=int(ttl * 1000))
+
+    def delete(self, key: str):
+        self._redis.delete(self._prefix + key)
+
+def create_backend(storage_url: str):
+    """Cria o backend a partir de IDEMPOTENCY_STORAGE_URL (mesmos esquemas do rate limiter)"""
+    if storage_url.startswith('fakeredis://'):
+        from src.services.rate_limiter import FakeRedis
+        return RedisBackend(FakeRedis())
+
+    if storage_url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("Pacote 'redis' é necessário para IDEMPOTENCY_STORAGE_URL com Redis")
+        return RedisBackend(redis.Redis.from_url(storage_url))
+
+    return MemoryBackend()
+
+def get_idempotency_backend():
+    """Retorna o backend da aplicação atual, criando-o no primeiro uso"""
+    backend = current_app.extensions.get('idempotency')
+    if backend is None:
+        config = current_app.config
+        backend = create_backend(config.get('IDEMPOTENCY_STORAGE_URL') or config.get('RATELIMIT_STORAGE_URL', 'memory://'))
+        current_app.extensions['idempotency'] = backend
+    return backend
+
+def begin_request(scope: str, target) -> Dict[str, Any]:
+    """Reserva a requisição atual (chamado dentro de um contexto de requisição).
+
+    Com o header Idempotency-Key, a chave é a do cliente (por usuário) e o
+    resultado fica guardado por IDEMPOTENCY_TTL. Sem ele, requisições
+    idênticas (mesma organização, alvo e corpo) em andamento ao mesmo
+    tempo compartilham uma execução: a chave é implícita e o resultado
+    vale só para as requisições que aguardavam aquela execução.
+
+    Returns:
+        dict: a reserva; 'state' é 'new' (executar e chamar finish_request),
+              'pending' (há outra em andamento: wait_for_result), 'replay'
+              (já há resultado), 'mismatch' (chave reaproveitada com outro
+              corpo), 'invalid' (chave mal formada) ou 'skip' (sem identidade)
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+        claims = get_jwt()
+        user_id = claims.get('sub')
+        if not user_id:
+            return {'state': 'skip'}
+
+        config = current_app.config
+        body = request.get_data(cache=True)
+        fingerprint = hashlib.sha256(b'\n'.join([
+            request.method.encode(), request.path.encode(), body
+        ])).hexdigest()
+
+        client_key = request.headers.get('Idempotency-Key')
+        if client_key is not None:
+            if not client_key.strip() or len(client_key) > MAX_KEY_LENGTH:
+                return {'state': 'invalid'}
+            key = f"key:{scope}:{user_id}:{client_key}"
+            ttl = config.get('IDEMPOTENCY_TTL', DEFAULT_TTL)
+        else:
+            organization_id = claims.get('organization_id') or user_id
+            key = f"flight:{scope}:{organization_id}:{target}:{fingerprint}"
+            ttl = config.get('IDEMPOTENCY_COALESCE_TTL', DEFAULT_COALESCE_TTL)
+
+        claim = {
+            'backend': get_idempotency_backend(),
+            'key': key,
+            'fingerprint': fingerprint,
+            'explicit': client_key is not None,
+            'ttl': ttl,
+            'lock_ttl': config.get('IDEMPOTENCY_LOCK_TTL', DEFAULT_LOCK_TTL),
+            'wait_timeout': config.get('IDEMPOTENCY_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT)
+        }
+        return _claim(claim)
+    except Exception as e:
+        # Sem o armazenamento, a requisição segue sem idempotência
+        logger.error(f"Erro ao reservar chave de idempotência: {e}")
+        return {'state': 'skip'}
+
+def _claim(claim: Dict[str, Any]) -> Dict[str, Any]:
+    backend = claim['backend']
+    run = uuid.uuid4().hex
+    pending = json.dumps({'state': 'pending', 'fingerprint': claim['fingerprint'], 'run': run})
+    if backend.add(claim['key'], pending, claim['lock_ttl']):
+        return dict(claim, state='new', run=run)
+
+    raw = backend.get(claim['key'])
+    if raw is None:
+        # Expirou ou foi concluída entre as duas chamadas: tenta de novo
+        if backend.add(claim['key'], pending, claim['lock_ttl']):
+            return dict(claim, state='new', run=run)
+        return dict(claim, state='pending', run=None)
+
+    record = json.loads(raw)
+    if record['fingerprint'] != claim['fingerprint']:
+        return dict(claim, state='mismatch')
+    if record['state'] == 'pending':
+        return dict(claim, state='pending', run=record['run'])
+    return dict(claim, state='replay', record=record)
+
+def _poll(claim: Dict[str, Any]) -> Dict[str, Any]:
+    """Estado da execução aguardada por uma reserva 'pending'"""
+    if not claim['explicit'] and claim.get('run'):
+        raw = claim['backend'].get(f"{claim['key']}:{claim['run']}")
+        if raw is not None:
+            return dict(claim, state='replay', record=json.loads(raw))
+    current = _claim(claim)
+    if current['state'] == 'pending' and not current['run']:
+        current['run'] = claim.get('run')
+    return current
+
+def finish_request(claim: Dict[str, Any], response):
+    """Guarda o resultado da requisição reservada (ou libera a chave se não for guardável).
+
+    O resultado de uma Idempotency-Key fica na própria chave. O de uma
+    chave implícita fica numa chave da execução, lida só por quem a
+    aguardava; a chave é liberada para que uma requisição posterior
+    execute de novo.
+    """
+    if claim.get('state') != 'new':
+        return
+    try:
+        backend = claim['backend']
+        status = response.status_code
+        if claim['explicit'] and (status >= 500 or status in _RETRYABLE_STATUS):
+            backend.delete(claim['key'])
+            return
+        record = json.dumps({
+            'state': 'done',
+            'fingerprint': claim['fingerprint'],
+            'status': status,
+            'mimetype': response.mimetype,
+            'body': response.get_data(as_text=True)
+        })
+        if claim['explicit']:
+            backend.set(claim['key'], record, claim['ttl'])
+        else:
+            backend.set(f"{claim['key']}:{claim['run']}", record, claim['ttl'])
+            backend.delete(claim['key'])
+    except Exception as e:
+        logger.error(f"Erro ao gravar resultado idempotente: {e}")
+
+def abandon_request(claim: Dict[str, Any]):
+    """Libera a reserva de uma requisição que terminou com exceção"""
+    if claim.get('state') != 'new':
+        return
+    try:
+        claim['backend'].delete(claim['key'])
+    except Exception as e:
+        logger.error(f"Erro ao liberar chave de idempotência: {e}")
+
+def wait_for_result(claim: Dict[str, Any], sleep=time.sleep) -> Dict[str, Any]:
+    """Espera a requisição original terminar.
+
+    Returns:
+        dict: a reserva atualizada: 'replay', 'new' (a original liberou a
+              chave sem resultado; esta executa) ou 'timeout'
+    """
+    deadline = time.monotonic() + claim['wait_timeout']
+    while time.monotonic() < deadline:
+        sleep(POLL_INTERVAL)
+        current = _poll(claim)
+        if current['state'] != 'pending':
+            return current
+        claim = current
+    return dict(claim, state='timeout')
+
+async def wait_for_result_async(claim: Dict[str, Any]) -> Dict[str, Any]:
+    """Versão assíncrona de wait_for_result (servidor ASGI)"""
+    deadline = time.monotonic() + claim['wait_timeout']
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        current = await asyncio.to_thread(_poll, claim)
+        if current['state'] != 'pending':
+            return current
+        claim = current
+    return dict(claim, state='timeout')
+
+def claim_response(claim: Dict[str, Any]):
+    """Resposta para uma reserva que não executa: resultado guardado ou erro"""
+    if claim['state'] == 'replay':
+        record = claim['record']
+        response = current_app.response_class(record['body'], status=record['status'], mimetype=record['mimetype'])
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    errors = {
+        'mismatch': (422, 'IDEMPOTENCY_KEY_REUSED',
+                     'Idempotency-Key já usada com outra requisição'),
+        'invalid': (400, 'INVALID_IDEMPOTENCY_KEY',
+                    f'Idempotency-Key deve ter entre 1 e {MAX_KEY_LENGTH} caracteres'),
+        'timeout': (409, 'IDEMPOTENCY_IN_PROGRESS',
+                    'Requisição idêntica ainda em andamento. Tente novamente mais tarde.')
+    }
+    status, code, message = errors[claim['state']]
+    response = jsonify({'error': {'code': code, 'message': message}})
+    response.status_code = status
+    if claim['state'] == 'timeout':
+        response.headers['Retry-After'] = '5'
+    return response
+
+def idempotent(scope: str, target_arg: str):
+    """Decorator de idempotência e coalescência para rotas caras (chamadas de IA)
+
+    Deve ser usado abaixo de @jwt_required() e acima de @rate_limit, para que
+    repetições respondidas com o resultado guardado não consumam orçamento.
+    `target_arg` é o argumento da rota que identifica o alvo (pergunta,
+    documento) na chave implícita.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            claim = begin_request(scope, kwargs.get(target_arg))
+            if claim['state'] == 'pending':
+                claim = wait_for_result(claim)
+            if claim['state'] == 'skip':
+                return f(*args, **kwargs)
+            if claim['state'] != 'new':
+                return claim_response(claim)
+
+            try:
+                response = current_app.make_response(f(*args, **kwargs))
+            except BaseException:
+                abandon_request(claim)
+                raise
+            finish_request(claim, response)
+            return response
+        return decorated
+    return decorator
@@ -0,0 +1,104 @@
+import json
+from typing import Any, Dict, Iterator
+
+# Trecho do item malformado incluído no relatório de erro
+RAW_PREVIEW_CHARS = 500
+
+class JSONArrayStreamParser:
+    """Parser incremental de um array JSON de objetos.
+
+    Recebe o texto em pedaços (feed) e emite cada elemento assim que ele
+    fecha, sem esperar o fim do array. Texto antes do '[' (como ```json) e
+    depois do ']' é ignorado. Cada elemento é decodificado isoladamente:
+    um objeto inválido vira um evento de erro e os seguintes continuam
+    sendo lidos, desde que chaves e aspas estejam balanceadas. Em close(),
+    um elemento aberto (saída truncada) é reportado como erro.
+
+    Eventos:
+        {'type': 'item', 'index': n, 'value': dict}
+        {'type': 'error', 'index': n, 'message': str, 'raw': str}
+    """
+
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.items = 0
+        self.errors = 0
+        self._index = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer = []
+        self._scalar = []
+
+    def feed(self, chunk: str) -> Iterator[Dict[str, Any]]:
+        for char in chunk:
+            if self.finished:
+                return
+            if not self.started:
+                self.started = char == '['
+                continue
+
+            if self._depth:
+                self._buffer.append(char)
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif char == '\\':
+                        self._escape = True
+                    elif char == '"':
+                        self._in_string = False
+                        # Elemento que é só uma string ("...") termina aqui
+                        if self._buffer[0] == '"':
+                            self._depth = 0
+                            yield self._element(''.join(self._buffer))
+                            self._buffer = []
+                elif char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                elif char in '}]':
+                    self._depth -= 1
+                    if not self._depth:
+                        yield self._element(''.join(self._buffer))
+                        self._buffer = []
+                continue
+
+            # Entre elementos do array
+            if char in '{["':
+                self._depth = 1
+                self._buffer = [char]
+                self._in_string = char == '"'
+            elif char in ',]':
+                if ''.join(self._scalar).strip():
+                    yield self._element(''.join(self._scalar))
+                self._scalar = []
+                self.finished = char == ']'
+            else:
+                self._scalar.append(char)
+
+    def close(self) -> Iterator[Dict[str, Any]]:
+        """Encerra a leitura, reportando o elemento incompleto, se houver"""
+        pending = ''.join(self._buffer) if self._depth else ''.join(self._scalar).strip()
+        if pending and not self.finished:
+            yield self._error('Item incompleto (saída truncada)', pending)
+        self.finished = True
+        self._buffer, self._scalar, self._depth = [], [], 0
+
+    def _element(self, raw: str) -> Dict[str, Any]:
+        try:
+            value = json.loads(raw)
+        except ValueError as e:
+            return self._error(f'JSON inválido: {e}', raw)
+        if not isinstance(value, dict):
+            return self._error('Item não é um objeto JSON', raw)
+        event = {'type': 'item', 'index': self._index, 'value': value}
+        self._index += 1
+        self.items += 1
+        return event
+
+    def _error(self, message: str, raw: str) -> Dict[str, Any]:
+        event = {'type': 'error', 'index': self._index, 'message': message, 'raw': raw[:RAW_PREVIEW_CHARS]}
+        self._index += 1
+        self.errors += 1
+        return event
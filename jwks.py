@@ -0,0 +1,140 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+import jwt
+
+logger = logging.getLogger(__name__)
+
+# Quanto tempo o conjunto de chaves vale sem nova busca (rotação normal de chaves)
+DEFAULT_TTL = 24 * 3600
+# Intervalo mínimo entre buscas: um kid desconhecido (inclusive forjado) não
+# provoca mais que uma busca por intervalo
+MIN_REFRESH_INTERVAL = 60
+FETCH_TIMEOUT = 10
+
+class JWKSError(Exception):
+    """Chave de assinatura não encontrada ou JWKS indisponível"""
+
+class JWKSUnavailableError(JWKSError):
+    """JWKS não pôde ser buscado e não há chaves em cache"""
+
+def _http_fetch(uri: str) -> Dict[str, Any]:
+    # requests é importado sob demanda para não pesar na inicialização da aplicação
+    import requests
+    response = requests.get(uri, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+class JWKSCache:
+    """Chaves públicas de um endpoint JWKS, em cache no processo.
+
+    As chaves são convertidas uma vez em objetos de chave pública e
+    reaproveitadas em toda verificação (e entre buscas, quando a chave não
+    mudou). O conjunto é buscado de novo quando expira (`ttl`) ou quando
+    chega um token com kid desconhecido, no máximo uma vez a cada
+    `min_refresh_interval` segundos. Se a busca falha, as chaves atuais
+    continuam em uso.
+
+    Args:
+        uri: URL do JWKS
+        ttl, min_refresh_interval: ver DEFAULT_TTL e MIN_REFRESH_INTERVAL
+        fetch: função que recebe a URL e devolve o JWKS (dict); permite
+            testar com um JWKS local
+    """
+
+    def __init__(self, uri: str, ttl: float = DEFAULT_TTL, min_refresh_interval: float = MIN_REFRESH_INTERVAL,
+                 fetch: Callable[[str], Dict[str, Any]] = _http_fetch):
+        self.uri = uri
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._fetch = fetch
+        self._keys: Dict[str, tuple] = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def get_key(self, kid: Optional[str]) -> tuple:
+        """(chave pública, JWK de origem) para o kid do token"""
+        now = time.monotonic()
+        entry = self._keys.get(kid)
+        if entry is not None and now < self._expires_at:
+            return entry
+
+        self._refresh(force=entry is None)
+        entry = self._keys.get(kid)
+        if entry is None:
+            raise JWKSError(f"Chave de assinatura desconhecida: {kid}")
+        return entry
+
+    def _refresh(self, force: bool):
+        with self._lock:
+            now = time.monotonic()
+            # Outra thread acabou de buscar, ou a última busca foi recente demais
+            if self._fetched_at is not None and now - self._fetched_at < self.min_refresh_interval:
+                return
+            if not force and now < self._expires_at:
+                return
+            self._fetched_at = now
+
+            try:
+                jwks = self._fetch(self.uri)
+            except Exception as e:
+                logger.error(f"Erro ao buscar JWKS de {self.uri}: {e}")
+                if not self._keys:
+                    raise JWKSUnavailableError("Chaves de assinatura indisponíveis")
+                return
+
+            self._keys = self._parse(jwks.get('keys', []))
+            self._expires_at = now + self.ttl
+
+    def _parse(self, jwks: Iterable[Dict[str, Any]]) -> Dict[str, tuple]:
+        keys = {}
+        for jwk in jwks:
+            if jwk.get('use', 'sig') != 'sig' or 'kid' not in jwk:
+                continue
+            current = self._keys.get(jwk['kid'])
+            if current is not None and current[1] == jwk:
+                keys[jwk['kid']] = current
+                continue
+            try:
+                keys[jwk['kid']] = (jwt.PyJWK(jwk).key, jwk)
+            except Exception as e:
+                logger.warning(f"Chave {jwk.get('kid')} do JWKS ignorada: {e}")
+        return keys
+
+_caches: Dict[str, JWKSCache] = {}
+_caches_lock = threading.Lock()
+
+def get_jwks_cache(uri: str, **kwargs) -> JWKSCache:
+    """Cache compartilhado do processo para a URL (criado no primeiro uso)"""
+    cache = _caches.get(uri)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(uri, JWKSCache(uri, **kwargs))
+    return cache
+
+def verify_jwt(token: str, jwks: JWKSCache, audience, issuer: Optional[str] = None,
+               algorithms=('RS256',), leeway: int = 60) -> Dict[str, Any]:
+    """Verifica assinatura, expiração, audience e issuer de um JWT.
+
+    Raises:
+        jwt.InvalidTokenError: token inválido (inclui JWKSError como causa)
+    """
+    header = jwt.get_unverified_header(token)
+    if header.get('alg') not in algorithms:
+        raise jwt.InvalidAlgorithmError(f"Algoritmo não permitido: {header.get('alg')}")
+    try:
+        key, _ = jwks.get_key(header.get('kid'))
+    except JWKSError as e:
+        raise jwt.InvalidTokenError(str(e)) from e
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=list(algorithms),
+        audience=audience,
+        issuer=issuer,
+        leeway=leeway,
+        options={'require': ['exp', 'aud']}
+    )
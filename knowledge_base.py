@@ -17,6 +17,9 @@ class KnowledgeBase(db.Model):
     category = db.Column(db.String(100))
     tags = db.Column(db.JSON, default=[])
     source_document_id = db.Column(UUID(as_uuid=True), db.ForeignKey('documents.id'))
+    # Trechos ingeridos de documentos (ver services.knowledge_ingestion): hash do conteúdo e posição no documento
+    content_hash = db.Column(db.String(64))
+    chunk_index = db.Column(db.Integer)
     source_url = db.Column(db.String(500))
     language = db.Column(db.String(10), default='pt-BR')
     keywords = db.Column(db.JSON, default=[])
@@ -42,6 +45,7 @@ class KnowledgeBase(db.Model):
             'category': self.category,
             'tags': self.tags,
             'source_document_id': str(self.source_document_id) if self.source_document_id else None,
+            'chunk_index': self.chunk_index,
             'source_url': self.source_url,
             'language': self.language,
             'keywords': self.keywords,
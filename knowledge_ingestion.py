@@ -0,0 +1,271 @@
+import os
+import re
+import uuid
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import exists
+from sqlalchemy.orm import aliased
+from src.models.user import db
+from src.models.document import Document
+from src.models.knowledge_base import KnowledgeBase
+from src.services.answer_reuse import normalize_text
+from src.services.usage_metering import adjust_storage_usage
+from src.services.document_revisions import split_sections, section_hash, is_heading
+
+logger = logging.getLogger(__name__)
+
+# Tamanho de um trecho da base de conhecimento (o contexto da geração usa até 500 caracteres por item)
+PASSAGE_MAX_CHARS = 1500
+# Trechos menores que isso são juntados ao seguinte da mesma seção
+PASSAGE_MIN_CHARS = 200
+KEYWORDS_PER_PASSAGE = 10
+
+# Palavras indicativas de cada content_type; vence o tipo com mais ocorrências no trecho
+CONTENT_TYPE_TERMS = {
+    'certification': ['certificacao', 'certificado', 'certificada', 'iso', 'acreditacao', 'conformidade', 'auditoria'],
+    'case_study': ['caso de sucesso', 'case', 'cliente', 'resultado', 'implantacao', 'projeto realizado'],
+    'team_bio': ['curriculo', 'formacao', 'experiencia profissional', 'graduado', 'mestre', 'doutor', 'gerente', 'consultor'],
+    'methodology': ['metodologia', 'etapa', 'fase', 'processo', 'abordagem', 'cronograma', 'agil', 'scrum'],
+    'technical_spec': ['arquitetura', 'especificacao', 'requisito tecnico', 'api', 'servidor', 'banco de dados',
+                       'integracao', 'protocolo', 'criptografia'],
+    'service_description': ['servico', 'solucao', 'oferecemos', 'suporte', 'atendimento', 'sla', 'plataforma'],
+    'company_info': ['empresa', 'fundada', 'missao', 'visao', 'sede', 'colaboradores', 'cnpj', 'historia']
+}
+DEFAULT_CONTENT_TYPE = 'reference'
+
+_STOP_WORDS = {
+    'para', 'pela', 'pelo', 'pelas', 'pelos', 'como', 'mais', 'menos', 'sobre', 'entre', 'com', 'sem',
+    'uma', 'umas', 'uns', 'que', 'quando', 'onde', 'qual', 'quais', 'cada', 'todo', 'toda', 'todos',
+    'todas', 'esta', 'este', 'estas', 'estes', 'essa', 'esse', 'essas', 'esses', 'isso', 'isto', 'aos',
+    'das', 'dos', 'nas', 'nos', 'seu', 'sua', 'seus', 'suas', 'ser', 'sao', 'foi', 'tem', 'ter', 'possui',
+    'deve', 'devem', 'pode', 'podem', 'tambem', 'ainda', 'apos', 'ate', 'desde', 'nao', 'sim', 'the',
+    'and', 'for', 'with', 'from', 'that', 'this', 'are', 'have'
+}
+
+_TERM_PATTERNS = {
+    content_type: [re.compile(r'\b' + re.escape(term) + r'\w*') for term in terms]
+    for content_type, terms in CONTENT_TYPE_TERMS.items()
+}
+
+def _pack(paragraphs: List[str], max_chars: int) -> List[str]:
+    """Junta parágrafos consecutivos em trechos de até max_chars (quebrando os maiores por frase)"""
+    pieces = []
+    for paragraph in paragraphs:
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind('. ', 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    passages, current = [], ''
+    for piece in pieces:
+        if current and (len(current) + len(piece) + 2 > max_chars) and len(current) >= PASSAGE_MIN_CHARS:
+            passages.append(current)
+            current = ''
+        current = f'{current}\n\n{piece}' if current else piece
+    if current:
+        passages.append(current)
+    return passages
+
+def chunk_passages(text: str) -> List[Dict[str, Optional[str]]]:
+    """Divide o texto do documento em trechos com o título da seção de origem.
+
+    As seções são as de split_sections (títulos numerados ou nomeados,
+    páginas); o texto de uma seção sem título próprio continua a seção
+    anterior. Cada trecho começa pelo título, para que continue
+    compreensível isolado no contexto da geração.
+
+    Returns:
+        list: dicts com heading (ou None) e content
+    """
+    passages = []
+    heading = None
+    for section in split_sections(text):
+        lines = section.splitlines()
+        if is_heading(lines[0]):
+            heading = lines[0].strip()
+            lines = lines[1:]
+        paragraphs = [p.strip() for p in re.split(r'\n\s*\n', '\n'.join(lines)) if p.strip()]
+        budget = PASSAGE_MAX_CHARS - (len(heading) + 1 if heading else 0)
+        for part in _pack(paragraphs, max(budget, PASSAGE_MIN_CHARS)):
+            passages.append({
+                'heading': heading,
+                'content': f'{heading}\n{part}' if heading else part
+            })
+    return passages
+
+def classify_content(text: str) -> str:
+    """content_type do trecho pelas palavras indicativas de cada tipo"""
+    normalized = normalize_text(text)
+    scores = {
+        content_type: sum(len(pattern.findall(normalized)) for pattern in patterns)
+        for content_type, patterns in _TERM_PATTERNS.items()
+    }
+    best = max(scores, key=scores.get)
+    return best if scores[best] else DEFAULT_CONTENT_TYPE
+
+def extract_keywords(text: str, limit: int = KEYWORDS_PER_PASSAGE) -> List[str]:
+    """Termos mais frequentes do trecho (normalizados, sem palavras vazias)"""
+    counts = Counter(
+        word for word in normalize_text(text).split()
+        if len(word) > 3 and word not in _STOP_WORDS and not word.isdigit()
+    )
+    return [word for word, _ in counts.most_common(limit)]
+
+def prepare_document(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Trechos prontos para gravação de um documento (só CPU, sem banco).
+
+    Roda em processos separados na ingestão em lote: recebe e devolve
+    apenas valores simples.
+
+    Args:
+        payload: dict com name e text do documento
+    """
+    passages = chunk_passages(payload['text'])
+    total = len(passages)
+    entries = []
+    for index, passage in enumerate(passages):
+        title = passage['heading'] or payload['name']
+        if total > 1 and not passage['heading']:
+            title = f"{title} ({index + 1}/{total})"
+        entries.append({
+            'title': title[:255],
+            'content': passage['content'],
+            'content_type': classify_content(passage['content']),
+            'keywords': extract_keywords(passage['content']),
+            'content_hash': section_hash(passage['content']),
+            'chunk_index': index
+        })
+    return entries
+
+def not_superseded():
+    """Filtro dos documentos que não foram substituídos por uma revisão mais nova"""
+    newer = aliased(Document)
+    return ~exists().where(newer.previous_revision_id == Document.id, newer.is_active == True)
+
+def is_superseded(document: Document) -> bool:
+    return db.session.query(
+        Document.query.filter(
+            Document.previous_revision_id == document.id,
+            Document.is_active == True
+        ).exists()
+    ).scalar()
+
+def apply_ingestion(document: Document, entries: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Concilia os trechos preparados com as entradas do documento (não confirma).
+
+    Entradas existentes do documento e da revisão anterior com o mesmo
+    content_hash são mantidas (e passam para o documento), sem regravação
+    quando nada mudou; as demais são desativadas. Só os trechos novos são
+    inseridos, em lote. Reingerir um documento sem alterações não grava nada.
+    A revisão anterior é desativada: as entradas dela agora são deste
+    documento. Documentos já substituídos por uma revisão mais nova não
+    devem ser ingeridos (ver not_superseded).
+
+    Returns:
+        dict: created, kept e deactivated
+    """
+    source_ids = [document.id] + ([document.previous_revision_id] if document.previous_revision_id else [])
+    existing = KnowledgeBase.query.filter(
+        KnowledgeBase.source_document_id.in_(source_ids),
+        KnowledgeBase.is_active == True
+    ).order_by(KnowledgeBase.chunk_index).all()
+
+    by_hash = {}
+    for entry in existing:
+        by_hash.setdefault(entry.content_hash, []).append(entry)
+
+    now = datetime.utcnow()
+    rows, kept_ids = [], set()
+    for item in entries:
+        matches = by_hash.get(item['content_hash'])
+        if matches:
+            entry = matches.pop(0)
+            kept_ids.add(entry.id)
+            if entry.source_document_id != document.id:
+                entry.source_document_id = document.id
+            if entry.chunk_index != item['chunk_index']:
+                entry.chunk_index = item['chunk_index']
+            continue
+        rows.append(dict(
+            item,
+            id=uuid.uuid4(),
+            organization_id=document.organization_id,
+            source_document_id=document.id,
+            language=document.language or 'pt-BR',
+            tags=[],
+            usage_count=0,
+            created_by=document.uploaded_by,
+            created_at=now,
+            updated_at=now,
+            is_active=True
+        ))
+
+    deactivated = 0
+    for entry in existing:
+        if entry.id not in kept_ids:
+            entry.is_active = False
+            deactivated += 1
+
+    if document.previous_revision_id:
+        previous = Document.query.get(document.previous_revision_id)
+        if previous is not None and previous.is_active:
+            previous.is_active = False
+            adjust_storage_usage(previous.organization_id, -previous.file_size)
+
+    if rows:
+        db.session.bulk_insert_mappings(KnowledgeBase, rows)
+    return {'created': len(rows), 'kept': len(kept_ids), 'deactivated': deactivated}
+
+def _lock_document(document: Document):
+    Document.query.filter_by(id=document.id).with_for_update().first()
+
+def ingest_document(document: Document) -> Dict[str, int]:
+    """Ingere um documento processado na base de conhecimento (não confirma).
+
+    O documento é travado para que duas ingestões simultâneas do mesmo
+    documento não insiram os trechos duas vezes.
+    """
+    _lock_document(document)
+    entries = prepare_document({'name': document.name, 'text': document.extracted_text or ''})
+    return apply_ingestion(document, entries)
+
+def ingest_documents(documents: List[Document], processes: Optional[int] = None) -> Dict[Any, Dict[str, int]]:
+    """Ingere vários documentos, preparando os trechos em paralelo.
+
+    A divisão, a classificação e as palavras-chave rodam em um pool de
+    processos (CPU); a gravação fica no processo atual, com uma transação
+    por documento.
+
+    Args:
+        documents: Documentos processados (com extracted_text)
+        processes: Tamanho do pool (padrão: CPUs disponíveis; 1 desativa o pool)
+
+    Returns:
+        dict: id do documento -> created, kept e deactivated
+    """
+    payloads = [{'name': document.name, 'text': document.extracted_text or ''} for document in documents]
+    processes = min(processes or os.cpu_count() or 1, len(documents))
+
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            prepared = list(pool.map(prepare_document, payloads, chunksize=max(1, len(payloads) // (processes * 4))))
+    else:
+        prepared = [prepare_document(payload) for payload in payloads]
+
+    results = {}
+    for document, entries in zip(documents, prepared):
+        try:
+            _lock_document(document)
+            results[document.id] = apply_ingestion(document, entries)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Falha na ingestão do documento {document.id}: {e}")
+            results[document.id] = {'error': str(e)}
+    return results
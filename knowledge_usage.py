@@ -0,0 +1,68 @@
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+from sqlalchemy import case, update
+from src.models.user import db
+from src.models.knowledge_base import KnowledgeBase
+from src.services.write_behind import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+# Itens por UPDATE (tamanho do IN e do CASE)
+UPDATE_CHUNK = 500
+
+class KnowledgeUsageCounter(BufferedWriter):
+    """Contadores de uso dos itens da base de conhecimento, gravados em lote.
+
+    A geração só registra os itens usados em memória; a thread de fundo
+    soma os usos de cada item no flush e grava um UPDATE atômico
+    (usage_count = usage_count + n) por bloco de itens, em ordem de id.
+    Um item popular deixa de ser disputado por todas as gerações
+    simultâneas: cada processo o atualiza uma vez por flush.
+    """
+
+    def __init__(self):
+        super().__init__('knowledge_usage', flush_interval=10.0, max_batch=1000)
+
+    def record(self, kb_ids: Iterable, used_at: datetime = None):
+        """Registra o uso dos itens por uma geração (não bloqueia a requisição)"""
+        counts = Counter(kb_ids)
+        if counts:
+            self.put({'counts': counts, 'used_at': used_at or datetime.utcnow()})
+
+    def write_batch(self, events: List[Dict[str, Any]]):
+        counts = Counter()
+        used_at = {}
+        for event in events:
+            counts.update(event['counts'])
+            for kb_id in event['counts']:
+                used_at[kb_id] = max(used_at.get(kb_id, event['used_at']), event['used_at'])
+
+        kb_ids = sorted(counts, key=str)
+        try:
+            for start in range(0, len(kb_ids), UPDATE_CHUNK):
+                chunk = kb_ids[start:start + UPDATE_CHUNK]
+                db.session.execute(
+                    update(KnowledgeBase)
+                    .where(KnowledgeBase.id.in_(chunk))
+                    .values(
+                        usage_count=KnowledgeBase.usage_count + case(
+                            {kb_id: counts[kb_id] for kb_id in chunk}, value=KnowledgeBase.id
+                        ),
+                        last_used_at=case(
+                            {kb_id: used_at[kb_id] for kb_id in chunk}, value=KnowledgeBase.id
+                        )
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar uso de {len(kb_ids)} itens da base de conhecimento: {e}")
+            # Os totais voltam para a fila (um evento por item) e entram no próximo flush
+            for kb_id in kb_ids:
+                self._queue.put({'counts': {kb_id: counts[kb_id]}, 'used_at': used_at[kb_id]})
+
+# Instância global do serviço
+knowledge_usage = KnowledgeUsageCounter()
@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import case, update
+from sqlalchemy.orm.attributes import set_committed_value
+from src.models.user import User, db
+from src.services.write_behind import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+# Usuários por UPDATE (tamanho do IN e do CASE)
+UPDATE_CHUNK = 500
+
+class LoginActivity(BufferedWriter):
+    """last_login_at dos usuários, gravado em lote fora da requisição de login.
+
+    Num pico de logins, cada login de um usuário sem alterações no perfil
+    deixa de ser uma transação: a thread de fundo grava o último login de
+    cada usuário com um UPDATE por bloco de usuários.
+    """
+
+    def __init__(self):
+        super().__init__('login_activity', flush_interval=5.0, max_batch=1000)
+
+    def record(self, user_id, logged_in_at: datetime):
+        self.put((user_id, logged_in_at))
+
+    def write_batch(self, logins: List[tuple]):
+        latest: Dict[Any, datetime] = {}
+        for user_id, logged_in_at in logins:
+            if user_id not in latest or logged_in_at > latest[user_id]:
+                latest[user_id] = logged_in_at
+
+        user_ids = sorted(latest, key=str)
+        try:
+            for start in range(0, len(user_ids), UPDATE_CHUNK):
+                chunk = user_ids[start:start + UPDATE_CHUNK]
+                db.session.execute(
+                    update(User)
+                    .where(User.id.in_(chunk))
+                    .values(last_login_at=case({user_id: latest[user_id] for user_id in chunk}, value=User.id))
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar último login de {len(user_ids)} usuários: {e}")
+
+def update_if_changed(obj, values: Dict[str, Any]) -> bool:
+    """Atribui só os valores diferentes dos atuais; retorna se algo mudou"""
+    changed = False
+    for field, value in values.items():
+        if getattr(obj, field) != value:
+            setattr(obj, field, value)
+            changed = True
+    return changed
+
+def record_login(user: User, logged_in_at: datetime = None):
+    """Registra o login: o objeto já mostra o novo last_login_at, gravado depois em lote"""
+    logged_in_at = logged_in_at or datetime.utcnow()
+    # Valor "já confirmado": não suja a sessão nem gera UPDATE na requisição
+    set_committed_value(user, 'last_login_at', logged_in_at)
+    login_activity.record(user.id, logged_in_at)
+
+# Instância global do serviço
+login_activity = LoginActivity()
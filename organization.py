@@ -19,6 +19,8 @@ class Organization(db.Model):
     max_projects = db.Column(db.Integer, nullable=False, default=50)
     storage_quota_gb = db.Column(db.Integer, nullable=False, default=10)
     ai_quota_monthly = db.Column(db.Integer, nullable=False, default=1000)
+    # Mantido incrementalmente no upload/remoção de documentos
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0)
     settings = db.Column(db.JSON, default={})
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -52,18 +54,22 @@ class Organization(db.Model):
         """Retorna estatísticas de uso da organização"""
         from src.models.user import User
         from src.models.project import Project
+        from src.models.usage import OrganizationUsage
         
         users_count = User.query.filter_by(organization_id=self.id, is_active=True).count()
         projects_count = Project.query.filter_by(organization_id=self.id, is_active=True).count()
         
-        # TODO: Implementar cálculo de storage usado e chamadas de IA
-        storage_used_gb = 0.0
-        ai_calls_this_month = 0
+        # Armazenamento e chamadas de IA vêm de contadores pré-agregados
+        storage_used_gb = round((self.storage_used_bytes or 0) / (1024 ** 3), 3)
+        usage = OrganizationUsage.query.filter_by(
+            organization_id=self.id,
+            period=OrganizationUsage.period_for()
+        ).first()
         
         return {
             'users_count': users_count,
             'projects_count': projects_count,
             'storage_used_gb': storage_used_gb,
-            'ai_calls_this_month': ai_calls_this_month
+            'ai_calls_this_month': usage.ai_calls if usage else 0,
+            'ai_tokens_this_month': (usage.prompt_tokens + usage.output_tokens) if usage else 0
         }
-
@@ -2,11 +2,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User, db
 from src.models.organization import Organization
+from src.extensions.db_routing import read_only
 
 organizations_bp = Blueprint('organizations', __name__)
 
 @organizations_bp.route('/current', methods=['GET'])
 @jwt_required()
+@read_only
 def get_current_organization():
     """Obter informações da organização atual"""
     try:
@@ -0,0 +1,170 @@
+import time
+import threading
+from typing import Dict, Iterable, Optional
+from sqlalchemy import and_, event, select
+from sqlalchemy.orm import Session, object_session
+from src.models.user import User, db
+from src.models.role import Role, UserRole
+
+# Tempo máximo que um processo usa as permissões em cache de um usuário. As
+# alterações feitas no próprio processo invalidam o cache na hora; as feitas
+# em outros workers chegam a este em até esse tempo
+DEFAULT_CACHE_TTL = 30
+
+class BitRegistry:
+    """Atribui um bit a cada nome (permissão ou papel) visto pelo processo"""
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bit(self, name: str) -> int:
+        bit = self._bits.get(name)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(name, 1 << len(self._bits))
+        return bit
+
+    def mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.bit(name)
+        return mask
+
+permission_bits = BitRegistry()
+role_bits = BitRegistry()
+
+class UserAccess:
+    """Permissões efetivas de um usuário, compiladas em máscaras de bits"""
+
+    __slots__ = ('is_active', 'permissions', 'roles', 'expires_at')
+
+    def __init__(self, is_active: bool, permissions: int, roles: int, expires_at: float):
+        self.is_active = is_active
+        self.permissions = permissions
+        self.roles = roles
+        self.expires_at = expires_at
+
+    def has_permission(self, permission: str) -> bool:
+        return bool(self.permissions & permission_bits.bit(permission))
+
+    def has_any_role(self, role_mask: int) -> bool:
+        return bool(self.roles & role_mask)
+
+class PermissionCache:
+    """Cache por processo das permissões de cada usuário.
+
+    Cada papel é compilado uma vez em (máscara de permissões, bit do nome),
+    indexado pelo nome e pelas permissões lidas do banco; a entrada de um
+    usuário guarda a união dos seus papéis ativos, e uma verificação é um
+    AND de inteiros, sem acesso ao banco. A entrada é descartada quando o
+    usuário ou os seus papéis mudam, e tudo quando algum papel muda no
+    processo (ver os eventos no fim do módulo); mudanças feitas em outros
+    processos valem quando a entrada expira.
+    """
+
+    def __init__(self):
+        self.ttl = DEFAULT_CACHE_TTL
+        self._users: Dict[str, UserAccess] = {}
+        self._roles: Dict[tuple, tuple] = {}
+        self._epoch = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('PERMISSION_CACHE_TTL', self.ttl)
+
+    def get(self, user_id) -> Optional[UserAccess]:
+        """Permissões do usuário (None se ele não existe)"""
+        key = str(user_id)
+        access = self._users.get(key)
+        if access is not None and access.expires_at > time.monotonic():
+            return access
+        return self._load(key)
+
+    def _load(self, user_id: str) -> Optional[UserAccess]:
+        epoch = self._epoch
+        # Sempre no primário: logo após uma alteração, a réplica pode estar atrasada
+        rows = db.session.execute(
+            select(User.is_active, Role.id, Role.name, Role.permissions)
+            .select_from(User)
+            .outerjoin(UserRole, and_(UserRole.user_id == User.id, UserRole.is_active == True))
+            .outerjoin(Role, Role.id == UserRole.role_id)
+            .where(User.id == user_id),
+            bind_arguments={'bind': db.engine}
+        ).all()
+        if not rows:
+            return None
+
+        permissions = roles = 0
+        for _, role_id, name, role_permissions in rows:
+            if role_id is None:
+                continue
+            # Chave pelo conteúdo lido agora: um papel alterado em outro
+            # processo gera outra chave, nunca a máscara antiga
+            key = (name, tuple(role_permissions or ()))
+            compiled = self._roles.get(key)
+            if compiled is None:
+                compiled = (permission_bits.mask(key[1]), role_bits.bit(name))
+                self._roles[key] = compiled
+            permissions |= compiled[0]
+            roles |= compiled[1]
+
+        access = UserAccess(bool(rows[0][0]), permissions, roles, time.monotonic() + self.ttl)
+        # Uma invalidação durante a leitura torna o resultado suspeito: não guarda
+        if epoch == self._epoch:
+            self._users[user_id] = access
+        return access
+
+    def invalidate_user(self, user_id):
+        self._epoch += 1
+        self._users.pop(str(user_id), None)
+
+    def invalidate_roles(self):
+        self._epoch += 1
+        self._roles.clear()
+        self._users.clear()
+
+# Instância global do serviço
+permission_cache = PermissionCache()
+
+def user_has_permission(user_id, permission: str) -> bool:
+    access = permission_cache.get(user_id)
+    return access is not None and access.has_permission(permission)
+
+# Invalidação: na hora do flush (o próprio processo) e de novo no commit, para
+# descartar o que outra requisição tenha lido antes da confirmação
+def _pending(target) -> set:
+    session = object_session(target)
+    return session.info.setdefault('permission_invalidations', set()) if session is not None else set()
+
+def _invalidate(item):
+    if item is None:
+        permission_cache.invalidate_roles()
+    else:
+        permission_cache.invalidate_user(item)
+
+def _on_role_change(mapper, connection, target):
+    _pending(target).add(None)
+    _invalidate(None)
+
+def _on_user_role_change(mapper, connection, target):
+    _pending(target).add(str(target.user_id))
+    _invalidate(str(target.user_id))
+
+def _on_user_change(mapper, connection, target):
+    _pending(target).add(str(target.id))
+    _invalidate(str(target.id))
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Role, _event, _on_role_change)
+    event.listen(UserRole, _event, _on_user_role_change)
+for _event in ('after_update', 'after_delete'):
+    event.listen(User, _event, _on_user_change)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_invalidations(session):
+    for item in session.info.pop('permission_invalidations', ()):
+        _invalidate(item)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('permission_invalidations', None)
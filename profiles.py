@@ -0,0 +1,84 @@
+from flask import Blueprint, request, jsonify, send_file
+from flask_jwt_extended import get_jwt_identity
+from datetime import datetime
+import os
+from src.models.user import User
+from src.middleware.auth_middleware import role_required
+from src.middleware.profiling import list_profiles, profile_path, PROFILE_EXTENSIONS
+
+profiles_bp = Blueprint('profiles', __name__)
+
+@profiles_bp.route('', methods=['GET'])
+@role_required('admin')
+def get_profiles():
+    """Listar perfis de execução armazenados"""
+    try:
+        # Apenas os perfis de requisições da própria organização
+        user = User.query.get(get_jwt_identity())
+        profiles = list_profiles(user.organization_id) if user.organization_id else []
+        for profile in profiles:
+            profile['created_at'] = datetime.utcfromtimestamp(profile['created_at']).isoformat()
+        
+        return jsonify({
+            'data': profiles,
+            'count': len(profiles)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'LIST_ERROR',
+                'message': 'Erro ao listar perfis',
+                'details': str(e)
+            }
+        }), 500
+
+@profiles_bp.route('/<profile_id>', methods=['GET'])
+@role_required('admin')
+def download_profile(profile_id):
+    """Download de um perfil (pstats ou stacks colapsadas para flamegraph)"""
+    try:
+        profile_format = request.args.get('format')
+        if profile_format and profile_format not in PROFILE_EXTENSIONS:
+            return jsonify({
+                'error': {
+                    'code': 'INVALID_FORMAT',
+                    'message': f'Formato inválido. Formatos aceitos: {", ".join(PROFILE_EXTENSIONS)}'
+                }
+            }), 400
+        
+        user = User.query.get(get_jwt_identity())
+        profile_formats = [profile_format] if profile_format else PROFILE_EXTENSIONS
+        for profile_format in profile_formats if user.organization_id else []:
+            path = profile_path(user.organization_id, profile_id, profile_format)
+            if os.path.exists(path):
+                return send_file(
+                    os.path.abspath(path),
+                    as_attachment=True,
+                    download_name=os.path.basename(path),
+                    mimetype='application/octet-stream' if profile_format == 'cprofile' else 'text/plain'
+                )
+        
+        return jsonify({
+            'error': {
+                'code': 'PROFILE_NOT_FOUND',
+                'message': 'Perfil não encontrado'
+            }
+        }), 404
+    
+    except ValueError:
+        return jsonify({
+            'error': {
+                'code': 'INVALID_PROFILE_ID',
+                'message': 'Identificador de perfil inválido'
+            }
+        }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'DOWNLOAD_ERROR',
+                'message': 'Erro ao fazer download do perfil',
+                'details': str(e)
+            }
+        }), 500
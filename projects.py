@@ -3,11 +3,14 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from src.models.user import User, db
 from src.models.project import Project
+from src.middleware.auth_middleware import audit_log
+from src.extensions.db_routing import read_only
 
 projects_bp = Blueprint('projects', __name__)
 
 @projects_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def list_projects():
     """Listar projetos"""
     try:
@@ -177,6 +180,7 @@ def create_project():
 
 @projects_bp.route('/<project_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_project(project_id):
     """Obter detalhes de um projeto"""
     try:
@@ -343,6 +347,7 @@ def update_project(project_id):
 
 @projects_bp.route('/<project_id>', methods=['DELETE'])
 @jwt_required()
+@audit_log('delete', resource_type='project')
 def delete_project(project_id):
     """Excluir projeto (soft delete)"""
     try:
@@ -29,6 +29,10 @@ class Question(db.Model):
     reviewed_by = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'))
     reviewed_at = db.Column(db.DateTime)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
+    # Pergunta representante do grupo de quase-duplicatas no projeto (ver services.question_clustering)
+    cluster_id = db.Column(UUID(as_uuid=True), index=True)
+    # Hash da seção do documento de onde a pergunta foi extraída (ver services.document_revisions)
+    source_section = db.Column(db.String(64))
     
     # Relacionamentos
     responses = db.relationship('Response', backref='question', lazy=True, cascade='all, delete-orphan')
@@ -57,7 +61,8 @@ class Question(db.Model):
             'extracted_at': self.extracted_at.isoformat() if self.extracted_at else None,
             'reviewed_by': str(self.reviewed_by) if self.reviewed_by else None,
             'reviewed_at': self.reviewed_at.isoformat() if self.reviewed_at else None,
-            'is_active': self.is_active
+            'is_active': self.is_active,
+            'cluster_id': str(self.cluster_id) if self.cluster_id else None
         }
     
     def get_current_response(self):
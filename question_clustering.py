@@ -0,0 +1,127 @@
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, List
+from src.models.user import db
+from src.models.project import Project
+from src.models.question import Question
+from src.services.answer_reuse import BANDS, ROWS, shingles, minhash, jaccard
+
+logger = logging.getLogger(__name__)
+
+# Similaridade de Jaccard mínima para duas perguntas do mesmo projeto
+# serem tratadas como a mesma pergunta
+CLUSTER_THRESHOLD = 0.85
+
+# Bandas LSH em comum exigidas antes do cálculo exato: com s = 0.85 um par
+# divide menos de 3 das 16 bandas com probabilidade ~0.1%, com s = 0.5 ~92%
+MIN_SHARED_BANDS = 3
+
+_MASK64 = (1 << 64) - 1
+
+class _DisjointSet:
+    """Union-find com compressão de caminho e união por tamanho"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+# Os agrupamentos não são gravados: o hash nativo do processo e as próprias
+# linhas de cada banda como chave bastam, e são bem mais rápidos que os
+# hashes estáveis que answer_reuse grava no banco
+def _process_hash(shingle: str) -> int:
+    return hash(shingle) & _MASK64
+
+def _band_keys(signature: List[int]) -> List[tuple]:
+    return [(band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS if signature else 0)]
+
+def cluster_texts(texts: List[str], threshold: float = CLUSTER_THRESHOLD) -> List[int]:
+    """Agrupa textos quase idênticos.
+
+    As bandas LSH de cada texto selecionam candidatos já vistos; só os que
+    dividem ao menos MIN_SHARED_BANDS bandas e ainda estão em outro grupo
+    têm a similaridade exata calculada. A ligação é simples (transitiva):
+    A~B e B~C colocam A, B e C no mesmo grupo.
+
+    Returns:
+        list: para cada texto, o índice do primeiro texto do seu grupo
+    """
+    sets = _DisjointSet(len(texts))
+    buckets = defaultdict(list)
+    text_shingles = [shingles(text) for text in texts]
+
+    for index, target in enumerate(text_shingles):
+        bands = _band_keys(minhash(target, _process_hash))
+        shared = Counter(other for band in bands for other in buckets[band])
+        for other, count in shared.items():
+            if count >= MIN_SHARED_BANDS and sets.find(other) != sets.find(index) \
+                    and jaccard(target, text_shingles[other]) >= threshold:
+                sets.union(other, index)
+        for band in bands:
+            buckets[band].append(index)
+
+    first = {}
+    return [first.setdefault(sets.find(index), index) for index in range(len(texts))]
+
+def cluster_project_questions(project_id, threshold: float = CLUSTER_THRESHOLD) -> Dict[str, int]:
+    """Recalcula os grupos de perguntas ativas do projeto na transação corrente (não confirma).
+
+    O cluster_id de cada pergunta de um grupo com duas ou mais perguntas é
+    o id da mais antiga (a representante); perguntas sem duplicata ficam
+    com cluster_id nulo. O projeto é travado (FOR UPDATE) para que duas
+    extrações simultâneas não gravem agrupamentos calculados sobre
+    conjuntos diferentes de perguntas. Só as linhas alteradas são gravadas.
+
+    Returns:
+        dict: questions, clusters, clustered_questions e updated
+    """
+    db.session.query(Project.id).filter(Project.id == project_id).with_for_update().first()
+
+    rows = db.session.query(Question.id, Question.question_text, Question.cluster_id).filter(
+        Question.project_id == project_id,
+        Question.is_active == True
+    ).order_by(Question.extracted_at, Question.id).all()
+
+    representatives = cluster_texts([row.question_text for row in rows], threshold)
+    group_sizes = defaultdict(int)
+    for representative in representatives:
+        group_sizes[representative] += 1
+
+    changes = []
+    for row, representative in zip(rows, representatives):
+        cluster_id = rows[representative].id if group_sizes[representative] > 1 else None
+        if row.cluster_id != cluster_id:
+            changes.append({'id': row.id, 'cluster_id': cluster_id})
+    if changes:
+        db.session.bulk_update_mappings(Question, changes)
+
+    # Perguntas desativadas deixam de representar ou pertencer a grupos
+    Question.query.filter(
+        Question.project_id == project_id,
+        Question.is_active == False,
+        Question.cluster_id.isnot(None)
+    ).update({Question.cluster_id: None}, synchronize_session=False)
+
+    clusters = [size for size in group_sizes.values() if size > 1]
+    return {
+        'questions': len(rows),
+        'clusters': len(clusters),
+        'clustered_questions': sum(clusters),
+        'updated': len(changes)
+    }
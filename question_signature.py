@@ -0,0 +1,25 @@
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+from src.models.user import db
+
+class QuestionSignatureBand(db.Model):
+    """Bandas LSH da assinatura MinHash do texto de uma pergunta.
+
+    Só perguntas com resposta aprovada são indexadas (ver
+    services.answer_reuse). Duas perguntas que compartilham ao menos uma
+    banda (mesmo índice e mesmo hash) são candidatas a quase-duplicatas.
+    """
+    __tablename__ = 'question_signature_bands'
+
+    question_id = db.Column(UUID(as_uuid=True), db.ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    band = db.Column(db.SmallInteger, primary_key=True)
+    organization_id = db.Column(UUID(as_uuid=True), db.ForeignKey('organizations.id'), nullable=False)
+    band_hash = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('idx_question_signature_bands_lookup', 'organization_id', 'band', 'band_hash'),
+    )
+
+    def __repr__(self):
+        return f'<QuestionSignatureBand {self.question_id}:{self.band}>'
@@ -1,17 +1,476 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+import json
 import uuid
+import asyncio
+import logging
 from src.models.user import User, db
 from src.models.document import Document
 from src.models.project import Project
+from src.models.organization import Organization
 from src.models.question import Question
 from src.services.ai_service import ai_service
+from src.services.ai_scheduler import ai_scheduler, schedule_for
+from src.services.answer_reuse import normalize_text, reindex_if_indexed
+from src.services.question_clustering import CLUSTER_THRESHOLD, cluster_project_questions
+from src.services.document_revisions import (
+    plan_extraction, attribute_section, carry_over_questions, reconciliation_candidates,
+    adopt_question, finish_reconciliation
+)
+from src.services.idempotency import idempotent
+from src.middleware.auth_middleware import rate_limit
+from src.extensions.db_routing import read_only
+
+logger = logging.getLogger(__name__)
 
 questions_bp = Blueprint('questions', __name__)
 
+# Limite de chamadas simultâneas à IA para os lotes de seções de um documento
+SECTION_AI_CONCURRENCY = 4
+
+def _bulk_extract_cost(req):
+    """Cada documento do lote consome um token do orçamento de IA"""
+    data = req.get_json(silent=True) or {}
+    return len(data.get('document_ids') or [])
+
+def _document_snapshot(document, full=False):
+    """Copia os campos do documento usados na extração (sem objetos ORM).
+    
+    Inclui o plano de extração: só as seções ainda não extraídas (neste
+    documento ou na revisão anterior) vão para a IA; e os atributos de
+    agendamento dos jobs de IA (prazo e prioridade do projeto).
+    """
+    return {
+        'id': document.id,
+        'project_id': document.project_id,
+        'file_hash': document.file_hash,
+        'document_type': document.document_type,
+        'language': document.language,
+        'plan': plan_extraction(document, full=full),
+        'schedule': schedule_for(document.project, Organization.query.get(document.organization_id))
+    }
+
+def _with_source_sections(batch, extracted_questions):
+    """Marca cada pergunta extraída com o hash da seção de origem no lote"""
+    for item in extracted_questions:
+        item['source_section'] = attribute_section(item['question_text'], batch['sections'])
+    return extracted_questions
+
+def load_extraction_context(user_id, document_id, data):
+    """Fase de carga da extração: lê usuário e documento.
+    
+    Returns:
+        tuple: (contexto, None) ou (None, (erro, status))
+    """
+    user = User.query.get(user_id)
+    
+    if not user or not user.is_active:
+        return None, ({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }, 404)
+    
+    # Buscar documento
+    document = Document.query.filter_by(
+        id=document_id,
+        organization_id=user.organization_id,
+        is_active=True
+    ).first()
+    
+    if not document:
+        return None, ({
+            'error': {
+                'code': 'DOCUMENT_NOT_FOUND',
+                'message': 'Documento não encontrado'
+            }
+        }, 404)
+    
+    if document.processing_status != 'completed':
+        return None, ({
+            'error': {
+                'code': 'DOCUMENT_NOT_PROCESSED',
+                'message': 'Documento ainda não foi processado'
+            }
+        }, 400)
+    
+    if not document.extracted_text:
+        return None, ({
+            'error': {
+                'code': 'NO_TEXT_AVAILABLE',
+                'message': 'Texto não disponível para extração'
+            }
+        }, 400)
+    
+    return {
+        'user_id': user.id,
+        'organization_id': user.organization_id,
+        'ai_model': data.get('ai_model', 'gemini'),
+        'language': data.get('language', document.language or 'pt-BR'),
+        'document': _document_snapshot(document, full=bool(data.get('full_extraction', False)))
+    }, None
+
+def call_extraction_ai(ctx, document):
+    """Fase externa da extração: chama a IA, por lote de seções, sem nenhuma conexão de banco.
+    
+    Cada lote de seções é um job do ai_scheduler, com a thread esperando vaga.
+    """
+    extracted_questions = []
+    for batch in document['plan']['batches']:
+        extracted_questions.extend(_with_source_sections(batch, ai_scheduler.run_sync(
+            lambda: ai_service.extract_questions_from_text(
+                batch['text'],
+                document['document_type'],
+                ctx.get('language') or document['language'] or 'pt-BR',
+                organization_id=ctx['organization_id'],
+                user_id=ctx['user_id']
+            ),
+            operation='extract_questions',
+            **document['schedule']
+        )))
+    return extracted_questions
+
+async def call_extraction_ai_async(ctx, document):
+    """Versão assíncrona de call_extraction_ai (usada pelo servidor ASGI).
+    
+    Cada lote de seções é um job do ai_scheduler (ver call_generation_ai_async).
+    """
+    semaphore = asyncio.Semaphore(SECTION_AI_CONCURRENCY)
+    
+    async def extract(batch):
+        async with semaphore:
+            return _with_source_sections(batch, await ai_scheduler.run(
+                lambda: ai_service.extract_questions_from_text_async(
+                    batch['text'],
+                    document['document_type'],
+                    ctx.get('language') or document['language'] or 'pt-BR',
+                    organization_id=ctx['organization_id'],
+                    user_id=ctx['user_id']
+                ),
+                operation='extract_questions',
+                **document['schedule']
+            ))
+    
+    results = await asyncio.gather(*(extract(batch) for batch in document['plan']['batches']))
+    return [item for items in results for item in items]
+
+def _lock_extracted_document(ctx, document):
+    """Relê e trava o documento da extração, revalidando o arquivo.
+    
+    Returns:
+        tuple: (documento, None) ou (None, (erro, status))
+    """
+    current = Document.query.filter_by(
+        id=document['id'],
+        organization_id=ctx['organization_id'],
+        is_active=True
+    ).with_for_update().first()
+    
+    if not current:
+        return None, ({
+            'error': {
+                'code': 'DOCUMENT_NOT_FOUND',
+                'message': 'Documento não encontrado'
+            }
+        }, 404)
+    
+    if current.file_hash != document['file_hash']:
+        return None, ({
+            'error': {
+                'code': 'DOCUMENT_CHANGED',
+                'message': 'O documento foi alterado durante a extração. Extraia novamente.'
+            }
+        }, 409)
+    
+    return current, None
+
+def _new_question(ctx, document, q_data):
+    """Pergunta nova a partir de um item extraído pela IA"""
+    return Question(
+        project_id=document.project_id,
+        document_id=document.id,
+        question_text=q_data['question_text'],
+        question_number=q_data.get('question_number'),
+        section=q_data.get('section'),
+        category=q_data.get('category', 'general'),
+        question_type=q_data.get('question_type', 'open'),
+        required=q_data.get('required', False),
+        max_words=q_data.get('max_words'),
+        context=q_data.get('context'),
+        keywords=q_data.get('keywords', []),
+        confidence_score=q_data.get('confidence_score', 0.8),
+        source_section=q_data.get('source_section'),
+        extracted_by=ctx['ai_model'],
+        extracted_at=datetime.utcnow()
+    )
+
+def persist_extracted_questions(ctx, document, extracted_questions, cluster=True):
+    """Fase de gravação da extração, com revalidação otimista.
+    
+    O documento é relido e travado: se foi removido ou substituído por
+    outro arquivo durante a chamada à IA, as perguntas extraídas são
+    descartadas. Perguntas já existentes do documento e da revisão anterior
+    são conciliadas por carry_over_questions; só os itens restantes viram
+    perguntas novas. Com `cluster`, os grupos de quase-duplicatas do
+    projeto são recalculados na mesma transação.
+    
+    Returns:
+        tuple: (resultado, None) ou (None, (erro, status)); o resultado tem
+               new_questions, carried_over, removed_count e o plano de seções
+    """
+    current, error = _lock_extracted_document(ctx, document)
+    if error:
+        return None, error
+    
+    outcome = carry_over_questions(current, document['plan'], extracted_questions)
+    
+    # Salvar perguntas novas no banco de dados
+    saved_questions = []
+    for q_data in outcome['remaining']:
+        question = _new_question(ctx, current, q_data)
+        db.session.add(question)
+        saved_questions.append(question)
+    
+    if cluster and (saved_questions or outcome['removed']):
+        db.session.flush()
+        cluster_project_questions(current.project_id)
+    
+    db.session.commit()
+    
+    return {
+        'new_questions': saved_questions,
+        'carried_over': outcome['carried'],
+        'removed_count': outcome['removed'],
+        'plan': document['plan']
+    }, None
+
+def extraction_result(result):
+    """Corpo da resposta de /extract-from-document"""
+    plan = result['plan']
+    new_questions = result['new_questions']
+    return {
+        'message': f'{len(new_questions)} perguntas extraídas com sucesso',
+        'questions_count': len(new_questions),
+        'carried_over_count': len(result['carried_over']),
+        'removed_count': result['removed_count'],
+        'sections_total': plan['sections_total'],
+        'sections_extracted': plan['sections_total'] - len(plan['unchanged_sections']),
+        'previous_revision_id': str(plan['previous_revision_id']) if plan['previous_revision_id'] else None,
+        'questions': [q.to_dict() for q in new_questions]
+    }
+
+def load_stream_extraction_context(user_id, document_id, data):
+    """Fase de carga da extração em streaming.
+    
+    Além do contexto de load_extraction_context, guarda as perguntas
+    existentes que podem ser adotadas por itens reextraídos (ids por texto
+    normalizado), para que cada item seja gravado sem recarregá-las.
+    
+    Returns:
+        tuple: (contexto, None) ou (None, (erro, status))
+    """
+    ctx, error = load_extraction_context(user_id, document_id, data)
+    if error:
+        return None, error
+    
+    document = Document.query.get(ctx['document']['id'])
+    ctx['candidates'] = reconciliation_candidates(document, ctx['document']['plan'])
+    ctx['adopted_ids'] = set()
+    return ctx, None
+
+def persist_streamed_question(ctx, q_data):
+    """Grava um item da extração em streaming em sua própria transação curta.
+    
+    Returns:
+        tuple: ((pergunta, adotada), None) ou (None, (erro, status))
+    """
+    current, error = _lock_extracted_document(ctx, ctx['document'])
+    if error:
+        db.session.rollback()
+        return None, error
+    
+    # Até a conclusão, só as seções inalteradas contam como extraídas: sem isso,
+    # um documento antigo com perguntas parciais pareceria todo extraído
+    if current.extracted_sections is None:
+        current.extracted_sections = ctx['document']['plan']['unchanged_sections']
+    
+    ids = ctx['candidates'].get(normalize_text(q_data['question_text']))
+    adopted = bool(ids)
+    if adopted:
+        question = adopt_question(ids.pop(0), current, q_data)
+        ctx['adopted_ids'].add(question.id)
+    else:
+        question = _new_question(ctx, current, q_data)
+        db.session.add(question)
+    
+    db.session.commit()
+    return (question, adopted), None
+
+def finish_streamed_extraction(ctx):
+    """Conclui uma extração em streaming completa (ver finish_reconciliation).
+    
+    Returns:
+        tuple: (resultado, None) ou (None, (erro, status))
+    """
+    current, error = _lock_extracted_document(ctx, ctx['document'])
+    if error:
+        db.session.rollback()
+        return None, error
+    
+    finished = finish_reconciliation(current, ctx['document']['plan'], ctx['adopted_ids'])
+    db.session.flush()
+    cluster_project_questions(current.project_id)
+    db.session.commit()
+    return finished, None
+
+def _ndjson(event):
+    return json.dumps(event, ensure_ascii=False, default=str) + '\n'
+
+def load_bulk_extraction_context(user_id, data):
+    """Fase de carga da extração em lote: valida todos os documentos antes de chamar a IA.
+    
+    Returns:
+        tuple: (contexto, None) ou (None, (erro, status))
+    """
+    user = User.query.get(user_id)
+    
+    if not user or not user.is_active:
+        return None, ({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }, 404)
+    
+    document_ids = data.get('document_ids', [])
+    
+    if not document_ids:
+        return None, ({
+            'error': {
+                'code': 'NO_DOCUMENTS',
+                'message': 'Lista de documentos é obrigatória'
+            }
+        }, 400)
+    
+    results = [None] * len(document_ids)
+    pending = []
+    
+    for index, doc_id in enumerate(document_ids):
+        try:
+            document = Document.query.filter_by(
+                id=doc_id,
+                organization_id=user.organization_id,
+                is_active=True
+            ).first()
+        except Exception as e:
+            db.session.rollback()
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'error',
+                'message': str(e)
+            }
+            continue
+        
+        if not document:
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'error',
+                'message': 'Documento não encontrado'
+            }
+            continue
+        
+        if document.processing_status != 'completed' or not document.extracted_text:
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'error',
+                'message': 'Documento não processado ou sem texto'
+            }
+            continue
+        
+        pending.append((index, doc_id, _document_snapshot(document)))
+    
+    return {
+        'user_id': user.id,
+        'organization_id': user.organization_id,
+        'ai_model': 'gemini',
+        'language': None,
+        'results': results,
+        'pending': pending
+    }, None
+
+def persist_bulk_extraction(ctx, outcomes):
+    """Fase de gravação da extração em lote.
+    
+    Args:
+        ctx: Contexto de load_bulk_extraction_context
+        outcomes: Para cada item de ctx['pending'], a lista extraída ou a exceção da IA
+    
+    Returns:
+        dict: Corpo da resposta com o resultado por documento, na ordem da requisição
+    """
+    results = ctx['results']
+    total_questions = 0
+    project_ids = set()
+    
+    for (index, doc_id, document), outcome in zip(ctx['pending'], outcomes):
+        if isinstance(outcome, Exception):
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'error',
+                'message': str(outcome)
+            }
+            continue
+        
+        try:
+            # Cada documento em sua própria transação curta
+            result, error = persist_extracted_questions(ctx, document, outcome, cluster=False)
+            if error:
+                results[index] = {
+                    'document_id': doc_id,
+                    'status': 'error',
+                    'message': error[0]['error']['message']
+                }
+                continue
+            
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'success',
+                'questions_count': len(result['new_questions']),
+                'carried_over_count': len(result['carried_over'])
+            }
+            
+            total_questions += len(result['new_questions'])
+            if result['new_questions'] or result['removed_count']:
+                project_ids.add(document['project_id'])
+        
+        except Exception as e:
+            db.session.rollback()
+            results[index] = {
+                'document_id': doc_id,
+                'status': 'error',
+                'message': str(e)
+            }
+    
+    # Agrupar uma vez por projeto, depois de gravados todos os documentos
+    for project_id in project_ids:
+        try:
+            cluster_project_questions(project_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('Falha ao agrupar perguntas do projeto %s', project_id)
+    
+    return {
+        'message': f'Processamento concluído. {total_questions} perguntas extraídas.',
+        'total_questions': total_questions,
+        'results': results
+    }
+
 @questions_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def list_questions():
     """Listar perguntas"""
     try:
@@ -33,6 +492,7 @@ def list_questions():
         category = request.args.get('category')
         required = request.args.get('required', type=bool)
         search = request.args.get('search')
+        cluster_id = request.args.get('cluster_id')
         
         # Validar projeto
         if project_id:
@@ -61,6 +521,9 @@ def list_questions():
         if category:
             query = query.filter(Question.category == category)
         
+        if cluster_id:
+            query = query.filter(Question.cluster_id == cluster_id)
+        
         if required is not None:
             query = query.filter(Question.required == required)
         
@@ -111,6 +574,7 @@ def list_questions():
 
 @questions_bp.route('/<question_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_question(question_id):
     """Obter detalhes de uma pergunta"""
     try:
@@ -149,6 +613,7 @@ def get_question(question_id):
         # Incluir histórico de respostas se solicitado
         include_history = request.args.get('include_history', 'false').lower() == 'true'
         if include_history:
+            # Versões anteriores vêm sem texto (ver /api/responses/question/<id>/versions)
             history = question.get_response_history()
             question_data['response_history'] = [r.to_dict() for r in history]
         
@@ -196,8 +661,10 @@ def update_question(question_id):
         data = request.get_json()
         
         # Atualizar campos permitidos
-        if 'question_text' in data:
+        text_changed = 'question_text' in data and data['question_text'] != question.question_text
+        if text_changed:
             question.question_text = data['question_text']
+            reindex_if_indexed(question, user.organization_id)
         
         if 'category' in data:
             question.category = data['category']
@@ -215,6 +682,10 @@ def update_question(question_id):
         question.reviewed_by = user.id
         question.reviewed_at = datetime.utcnow()
         
+        if text_changed:
+            db.session.flush()
+            cluster_project_questions(question.project_id)
+        
         db.session.commit()
         
         return jsonify(question.to_dict())
@@ -231,94 +702,53 @@ def update_question(question_id):
 
 @questions_bp.route('/extract-from-document/<document_id>', methods=['POST'])
 @jwt_required()
+@idempotent('extract_questions', 'document_id')
+@rate_limit('ai')
 def extract_questions_from_document(document_id):
     """Processar documento para extrair perguntas"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_active:
-            return jsonify({
-                'error': {
-                    'code': 'USER_NOT_FOUND',
-                    'message': 'Usuário não encontrado ou inativo'
-                }
-            }), 404
+        ctx, error = load_extraction_context(get_jwt_identity(), document_id, request.get_json() or {})
+        if error:
+            return jsonify(error[0]), error[1]
         
-        # Buscar documento
-        document = Document.query.filter_by(
-            id=document_id,
-            organization_id=user.organization_id,
-            is_active=True
-        ).first()
-        
-        if not document:
-            return jsonify({
-                'error': {
-                    'code': 'DOCUMENT_NOT_FOUND',
-                    'message': 'Documento não encontrado'
-                }
-            }), 404
-        
-        if document.processing_status != 'completed':
-            return jsonify({
-                'error': {
-                    'code': 'DOCUMENT_NOT_PROCESSED',
-                    'message': 'Documento ainda não foi processado'
-                }
-            }), 400
-        
-        if not document.extracted_text:
-            return jsonify({
-                'error': {
-                    'code': 'NO_TEXT_AVAILABLE',
-                    'message': 'Texto não disponível para extração'
-                }
-            }), 400
-        
-        # Obter parâmetros
-        data = request.get_json() or {}
-        ai_model = data.get('ai_model', 'gemini')
-        language = data.get('language', document.language or 'pt-BR')
+        # Devolver a conexão ao pool enquanto a IA responde (pode levar até 60s)
+        db.session.close()
         
         # Extrair perguntas usando IA
-        extracted_questions = ai_service.extract_questions_from_text(
-            document.extracted_text,
-            document.document_type,
-            language
-        )
+        extracted_questions = call_extraction_ai(ctx, ctx['document'])
         
-        # Salvar perguntas no banco de dados
-        saved_questions = []
-        for q_data in extracted_questions:
-            question = Question(
-                project_id=document.project_id,
-                document_id=document.id,
-                question_text=q_data['question_text'],
-                question_number=q_data.get('question_number'),
-                section=q_data.get('section'),
-                category=q_data.get('category', 'general'),
-                question_type=q_data.get('question_type', 'open'),
-                required=q_data.get('required', False),
-                max_words=q_data.get('max_words'),
-                context=q_data.get('context'),
-                keywords=q_data.get('keywords', []),
-                confidence_score=q_data.get('confidence_score', 0.8),
-                extracted_by=ai_model,
-                extracted_at=datetime.utcnow()
-            )
-            
-            db.session.add(question)
-            saved_questions.append(question)
-        
-        db.session.commit()
+        result, error = persist_extracted_questions(ctx, ctx['document'], extracted_questions)
+        if error:
+            return jsonify(error[0]), error[1]
         
+        return jsonify(extraction_result(result)), 201
+    
+    except Exception as e:
+        db.session.rollback()
         return jsonify({
-            'message': f'{len(saved_questions)} perguntas extraídas com sucesso',
-            'questions_count': len(saved_questions),
-            'questions': [q.to_dict() for q in saved_questions]
-        }), 201
+            'error': {
+                'code': 'EXTRACTION_ERROR',
+                'message': 'Erro ao extrair perguntas',
+                'details': str(e)
+            }
+        }), 500
+
+@questions_bp.route('/extract-from-document/<document_id>/stream', methods=['POST'])
+@jwt_required()
+@rate_limit('ai')
+def extract_questions_from_document_stream(document_id):
+    """Extrair perguntas em streaming (NDJSON): cada pergunta é gravada e enviada assim que a IA a conclui.
     
+    Eventos, um JSON por linha: started, question (com adopted quando uma
+    pergunta existente foi mantida), malformed (item inválido ou truncado,
+    descartado sem interromper), error e completed. Perguntas enviadas
+    antes de um erro permanecem gravadas; a conciliação com a revisão
+    anterior só é concluída quando a extração termina sem erro.
+    """
+    try:
+        ctx, error = load_stream_extraction_context(get_jwt_identity(), document_id, request.get_json() or {})
+        if error:
+            return jsonify(error[0]), error[1]
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -328,11 +758,110 @@ def extract_questions_from_document(document_id):
                 'details': str(e)
             }
         }), 500
+    
+    # Devolver a conexão ao pool: cada pergunta é gravada em transação própria
+    db.session.close()
+    
+    def events():
+        document = ctx['document']
+        plan = document['plan']
+        counts = {'questions_count': 0, 'adopted_count': 0, 'malformed_count': 0}
+        yield _ndjson({
+            'event': 'started',
+            'document_id': str(document['id']),
+            'sections_total': plan['sections_total'],
+            'sections_extracted': plan['sections_total'] - len(plan['unchanged_sections'])
+        })
+        
+        try:
+            for batch_index, batch in enumerate(plan['batches']):
+                # A vaga no ai_scheduler fica ocupada enquanto o lote é transmitido
+                with ai_scheduler.admit(operation='extract_questions', **document['schedule']):
+                    for event in ai_service.stream_extract_questions(
+                        batch['text'],
+                        document['document_type'],
+                        ctx.get('language') or document['language'] or 'pt-BR',
+                        organization_id=ctx['organization_id'],
+                        user_id=ctx['user_id']
+                    ):
+                        if event['type'] == 'malformed':
+                            counts['malformed_count'] += 1
+                            yield _ndjson({
+                                'event': 'malformed',
+                                'batch': batch_index,
+                                'index': event['index'],
+                                'message': event['message'],
+                                'raw': event['raw']
+                            })
+                            continue
+                        
+                        q_data = _with_source_sections(batch, [event['question']])[0]
+                        result, error = persist_streamed_question(ctx, q_data)
+                        if error:
+                            yield _ndjson(dict(error[0]['error'], event='error'))
+                            return
+                        
+                        question, adopted = result
+                        counts['questions_count'] += 1
+                        counts['adopted_count'] += int(adopted)
+                        yield _ndjson({'event': 'question', 'adopted': adopted, 'question': question.to_dict()})
+            
+            finished, error = finish_streamed_extraction(ctx)
+            if error:
+                yield _ndjson(dict(error[0]['error'], event='error'))
+                return
+        
+        except Exception as e:
+            db.session.rollback()
+            yield _ndjson(dict(counts, event='error', code='EXTRACTION_ERROR',
+                               message='Erro ao extrair perguntas', details=str(e)))
+            return
+        
+        yield _ndjson(dict(
+            counts,
+            event='completed',
+            carried_over_count=len(finished['carried']),
+            removed_count=finished['removed']
+        ))
+    
+    return Response(stream_with_context(events()), mimetype='application/x-ndjson')
 
 @questions_bp.route('/bulk-extract', methods=['POST'])
 @jwt_required()
+@rate_limit('ai', cost=lambda req: _bulk_extract_cost(req))
 def bulk_extract_questions():
     """Extrair perguntas de múltiplos documentos"""
+    try:
+        ctx, error = load_bulk_extraction_context(get_jwt_identity(), request.get_json() or {})
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        # Nenhuma conexão fica presa durante as chamadas à IA
+        db.session.close()
+        
+        outcomes = []
+        for _, _, document in ctx['pending']:
+            try:
+                outcomes.append(call_extraction_ai(ctx, document))
+            except Exception as e:
+                outcomes.append(e)
+        
+        return jsonify(persist_bulk_extraction(ctx, outcomes))
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': {
+                'code': 'BULK_EXTRACTION_ERROR',
+                'message': 'Erro no processamento em lote',
+                'details': str(e)
+            }
+        }), 500
+
+@questions_bp.route('/cluster/<project_id>', methods=['POST'])
+@jwt_required()
+def cluster_questions(project_id):
+    """Recalcular os grupos de perguntas quase idênticas do projeto"""
     try:
         user_id = get_jwt_identity()
         user = User.query.get(user_id)
@@ -345,102 +874,31 @@ def bulk_extract_questions():
                 }
             }), 404
         
-        data = request.get_json()
-        document_ids = data.get('document_ids', [])
+        project = Project.query.filter_by(
+            id=project_id,
+            organization_id=user.organization_id,
+            is_active=True
+        ).first()
         
-        if not document_ids:
+        if not project:
             return jsonify({
                 'error': {
-                    'code': 'NO_DOCUMENTS',
-                    'message': 'Lista de documentos é obrigatória'
+                    'code': 'PROJECT_NOT_FOUND',
+                    'message': 'Projeto não encontrado'
                 }
-            }), 400
-        
-        results = []
-        total_questions = 0
-        
-        for doc_id in document_ids:
-            try:
-                # Buscar documento
-                document = Document.query.filter_by(
-                    id=doc_id,
-                    organization_id=user.organization_id,
-                    is_active=True
-                ).first()
-                
-                if not document:
-                    results.append({
-                        'document_id': doc_id,
-                        'status': 'error',
-                        'message': 'Documento não encontrado'
-                    })
-                    continue
-                
-                if document.processing_status != 'completed' or not document.extracted_text:
-                    results.append({
-                        'document_id': doc_id,
-                        'status': 'error',
-                        'message': 'Documento não processado ou sem texto'
-                    })
-                    continue
-                
-                # Extrair perguntas
-                extracted_questions = ai_service.extract_questions_from_text(
-                    document.extracted_text,
-                    document.document_type,
-                    document.language or 'pt-BR'
-                )
-                
-                # Salvar perguntas
-                for q_data in extracted_questions:
-                    question = Question(
-                        project_id=document.project_id,
-                        document_id=document.id,
-                        question_text=q_data['question_text'],
-                        question_number=q_data.get('question_number'),
-                        section=q_data.get('section'),
-                        category=q_data.get('category', 'general'),
-                        question_type=q_data.get('question_type', 'open'),
-                        required=q_data.get('required', False),
-                        max_words=q_data.get('max_words'),
-                        context=q_data.get('context'),
-                        keywords=q_data.get('keywords', []),
-                        confidence_score=q_data.get('confidence_score', 0.8),
-                        extracted_by='gemini',
-                        extracted_at=datetime.utcnow()
-                    )
-                    db.session.add(question)
-                
-                results.append({
-                    'document_id': doc_id,
-                    'status': 'success',
-                    'questions_count': len(extracted_questions)
-                })
-                
-                total_questions += len(extracted_questions)
-            
-            except Exception as e:
-                results.append({
-                    'document_id': doc_id,
-                    'status': 'error',
-                    'message': str(e)
-                })
+            }), 404
         
+        stats = cluster_project_questions(project.id)
         db.session.commit()
         
-        return jsonify({
-            'message': f'Processamento concluído. {total_questions} perguntas extraídas.',
-            'total_questions': total_questions,
-            'results': results
-        })
+        return jsonify(dict(stats, project_id=str(project.id), threshold=CLUSTER_THRESHOLD))
     
     except Exception as e:
         db.session.rollback()
         return jsonify({
             'error': {
-                'code': 'BULK_EXTRACTION_ERROR',
-                'message': 'Erro no processamento em lote',
+                'code': 'CLUSTERING_ERROR',
+                'message': 'Erro ao agrupar perguntas',
                 'details': str(e)
             }
         }), 500
-
@@ -0,0 +1,328 @@
+import math
+import time
+import itertools
+import logging
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+from flask import current_app, jsonify
+
+logger = logging.getLogger(__name__)
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after'])
+
+# Limites padrão por categoria: 'api' vale para qualquer endpoint autenticado,
+# 'ai' é o orçamento separado dos endpoints que chamam o LLM.
+DEFAULT_LIMITS = {
+    'api': {'user': '300/minute', 'organization': '3000/minute'},
+    'ai': {'user': '20/minute', 'organization': '100/minute'},
+}
+
+_UNITS = {
+    'second': 1, 'seconds': 1, 's': 1,
+    'minute': 60, 'minutes': 60, 'm': 60,
+    'hour': 3600, 'hours': 3600, 'h': 3600,
+    'day': 86400, 'days': 86400, 'd': 86400,
+}
+
+def parse_rate(rate: str) -> Tuple[int, int]:
+    """Converte '100/hour' ou '10/30s' em (limite, janela em segundos)"""
+    count, _, period = rate.partition('/')
+    period = period.strip().lower()
+    digits = ''.join(itertools.takewhile(str.isdigit, period))
+    unit = period[len(digits):].strip() or 's'
+
+    if unit not in _UNITS:
+        raise ValueError(f"Unidade de rate limit inválida: {rate}")
+
+    return int(count), int(digits or 1) * _UNITS[unit]
+
+class MemoryBackend:
+    """Token bucket em memória (GCRA), sem locks.
+
+    O estado de cada chave é um único float (TAT - theoretical arrival time),
+    então cada verificação é uma leitura e uma escrita no dict, ambas atômicas
+    sob o GIL. Em uma corrida entre threads o pior caso é admitir uma
+    requisição a mais, nunca bloquear.
+    """
+
+    PRUNE_EVERY = 4096
+
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        self._hits = itertools.count()
+
+    def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        now = time.monotonic()
+        interval = window / limit
+
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + interval * cost
+        allow_at = new_tat - window
+
+        if next(self._hits) % self.PRUNE_EVERY == 0:
+            self._prune(now)
+
+        if allow_at > now:
+            remaining = max(0, int((window - (tat - now)) / interval))
+            return RateLimitResult(False, limit, remaining, allow_at - now)
+
+        self._tat[key] = new_tat
+        remaining = int((window - (new_tat - now)) / interval)
+        return RateLimitResult(True, limit, remaining, 0.0)
+
+    def refund(self, key: str, limit: int, window: int, cost: int = 1):
+        """Devolve os tokens de um hit admitido (a requisição acabou negada)"""
+        tat = self._tat.get(key)
+        if tat is not None:
+            self._tat[key] = tat - window / limit * cost
+
+    def _prune(self, now: float):
+        """Descarta buckets que já estão cheios (TAT no passado)"""
+        for key, tat in list(self._tat.items()):
+            if tat < now:
+                self._tat.pop(key, None)
+
+class RedisBackend:
+    """Janela deslizante compartilhada entre processos usando sorted sets do Redis.
+
+    Cada requisição é registrada antes da contagem, dentro de um MULTI; se o
+    total ultrapassar o limite os registros são removidos e a requisição é
+    negada. Concorrência entre workers pode, no máximo, negar a mais.
+    """
+
+    def __init__(self, client, prefix: str = 'rl:'):
+        self._redis = client
+        self._prefix = prefix
+        self._seq = itertools.count()
+
+    def hit(self, key: str, limit: int, window: int, cost: int = 1) -> RateLimitResult:
+        redis_key = self._prefix + key
+        now = time.time()
+        members = {f"{now:.6f}:{id(self)}:{next(self._seq)}": now for _ in range(cost)}
+
+        pipe = self._redis.pipeline()
+        pipe.zremrangebyscore(redis_key, 0, now - window)
+        pipe.zadd(redis_key, members)
+        pipe.zcard(redis_key)
+        pipe.pexpire(redis_key, window * 1000)
+        count = pipe.execute()[2]
+
+        if count <= limit:
+            return RateLimitResult(True, limit, limit - count, 0.0)
+
+        self._redis.zrem(redis_key, *members)
+        # Quantas entradas antigas precisam expirar para caber este custo
+        to_expire = count - limit
+        oldest = self._redis.zrange(redis_key, to_expire - 1, to_expire - 1, withscores=True)
+        retry_after = (oldest[0][1] + window - now) if oldest else float(window)
+        return RateLimitResult(False, limit, 0, max(retry_after, 0.0))
+
+    def refund(self, key: str, limit: int, window: int, cost: int = 1):
+        """Devolve os tokens de um hit admitido (remove os registros mais recentes)"""
+        self._redis.zpopmax(self._prefix + key, cost)
+
+class FakeRedis:
+    """Substituto local do cliente Redis com os comandos usados pelo RedisBackend
+    (e pelo backend Redis de services.idempotency)"""
+
+    def __init__(self):
+        self._zsets: Dict[str, Dict[str, float]] = {}
+        self._strings: Dict[str, str] = {}
+        self._expires: Dict[str, float] = {}
+
+    def _expire_if_due(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._zsets.pop(key, None)
+            self._strings.pop(key, None)
+            self._expires.pop(key, None)
+
+    def _zset(self, key):
+        self._expire_if_due(key)
+        return self._zsets.setdefault(key, {})
+
+    def get(self, key):
+        self._expire_if_due(key)
+        return self._strings.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        self._expire_if_due(key)
+        if nx and key in self._strings:
+            return None
+        self._strings[key] = value
+        if px is not None:
+            self._expires[key] = time.time() + px / 1000
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += (self._strings.pop(key, None) is not None) + (self._zsets.pop(key, None) is not None)
+            self._expires.pop(key, None)
+        return removed
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def zremrangebyscore(self, key, min_score, max_score):
+        zset = self._zset(key)
+        stale = [m for m, s in zset.items() if min_score <= s <= max_score]
+        for member in stale:
+            del zset[member]
+        return len(stale)
+
+    def zadd(self, key, mapping):
+        zset = self._zset(key)
+        added = sum(1 for m in mapping if m not in zset)
+        zset.update(mapping)
+        return added
+
+    def zcard(self, key):
+        return len(self._zset(key))
+
+    def zrem(self, key, *members):
+        zset = self._zset(key)
+        return sum(1 for m in members if zset.pop(m, None) is not None)
+
+    def zpopmax(self, key, count=1):
+        zset = self._zset(key)
+        popped = sorted(zset.items(), key=lambda item: item[1], reverse=True)[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    def zrange(self, key, start, end, withscores=False):
+        items = sorted(self._zset(key).items(), key=lambda item: item[1])
+        end = len(items) if end == -1 else end + 1
+        selected = items[start:end]
+        return selected if withscores else [m for m, _ in selected]
+
+    def pexpire(self, key, milliseconds):
+        self._expires[key] = time.time() + milliseconds / 1000
+        return True
+
+class _FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._calls.append((getattr(self._client, name), args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        return [method(*args, **kwargs) for method, args, kwargs in calls]
+
+class RateLimiter:
+    """Aplica limites por usuário e por organização sobre um backend"""
+
+    def __init__(self, backend, limits: Dict[str, Dict[str, str]] = None):
+        self.backend = backend
+        self.limits = {
+            category: {scope: parse_rate(rate) for scope, rate in scopes.items()}
+            for category, scopes in (limits or DEFAULT_LIMITS).items()
+        }
+
+    def max_cost(self, category: str) -> Optional[int]:
+        """Maior custo que uma requisição pode ter na categoria (o menor limite).
+
+        Um custo acima do limite de um bucket nunca seria admitido, nem com
+        o bucket cheio; quem chama deve recusar a requisição antes.
+        """
+        scopes = self.limits.get(category)
+        if not scopes:
+            return None
+        return min(limit for limit, _ in scopes.values())
+
+    def check(self, category: str, user_id: Optional[str],
+              organization_id: Optional[str] = None, cost: int = 1) -> Optional[RateLimitResult]:
+        """Consome `cost` tokens dos buckets do usuário e da organização.
+
+        A organização tem seu próprio bucket, então lotes de um tenant esgotam
+        apenas o orçamento dele. Os tokens só ficam consumidos se todos os
+        buckets admitirem a requisição: quando um nega, os já cobrados são
+        devolvidos. Retorna o resultado mais restritivo, ou None se a
+        categoria não tiver limites configurados.
+        """
+        scopes = self.limits.get(category)
+        if not scopes:
+            return None
+
+        result = None
+        charged = []
+        for scope, subject in (('user', user_id), ('organization', organization_id)):
+            if not subject or scope not in scopes:
+                continue
+
+            limit, window = scopes[scope]
+            key = f"{category}:{scope}:{subject}"
+            current = self.backend.hit(key, limit, window, cost)
+            if not current.allowed:
+                for charged_key, charged_limit, charged_window in charged:
+                    self.backend.refund(charged_key, charged_limit, charged_window, cost)
+                return current
+            charged.append((key, limit, window))
+            if result is None or current.remaining < result.remaining:
+                result = current
+
+        return result
+
+def create_backend(storage_url: str):
+    """Cria o backend a partir de RATELIMIT_STORAGE_URL"""
+    if storage_url.startswith('fakeredis://'):
+        return RedisBackend(FakeRedis())
+
+    if storage_url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("Pacote 'redis' é necessário para RATELIMIT_STORAGE_URL com Redis")
+        return RedisBackend(redis.Redis.from_url(storage_url))
+
+    return MemoryBackend()
+
+def get_rate_limiter() -> RateLimiter:
+    """Retorna o rate limiter da aplicação atual, criando-o no primeiro uso"""
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        backend = create_backend(current_app.config.get('RATELIMIT_STORAGE_URL', 'memory://'))
+        limiter = RateLimiter(backend, current_app.config.get('RATELIMIT_LIMITS'))
+        current_app.extensions['rate_limiter'] = limiter
+    return limiter
+
+def apply_rate_limit_headers(response, result: RateLimitResult):
+    """Adiciona os headers X-RateLimit-* (e Retry-After quando negado)"""
+    response.headers['X-RateLimit-Limit'] = str(result.limit)
+    response.headers['X-RateLimit-Remaining'] = str(result.remaining)
+    if not result.allowed:
+        response.headers['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+    return response
+
+def cost_exceeded_response(cost: int, max_cost: int):
+    """Resposta 400 para um lote maior que o orçamento inteiro da janela"""
+    response = jsonify({
+        'error': {
+            'code': 'BATCH_TOO_LARGE',
+            'message': f'O lote consome {cost} unidades do limite de requisições; o máximo por requisição é {max_cost}. Divida o lote.',
+            'details': {'cost': cost, 'max_cost': max_cost}
+        }
+    })
+    response.status_code = 400
+    return response
+
+def rate_limit_exceeded_response(result: RateLimitResult):
+    """Resposta 429 padrão da API"""
+    response = jsonify({
+        'error': {
+            'code': 'RATE_LIMIT_EXCEEDED',
+            'message': 'Limite de requisições excedido. Tente novamente mais tarde.',
+            'retry_after': max(1, math.ceil(result.retry_after))
+        }
+    })
+    response.status_code = 429
+    return apply_rate_limit_headers(response, result)
@@ -13,7 +13,11 @@ class Response(db.Model):
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     question_id = db.Column(UUID(as_uuid=True), db.ForeignKey('questions.id'), nullable=False)
     version = db.Column(db.Integer, nullable=False, default=1)
-    response_text = db.Column(db.Text, nullable=False)
+    # Texto completo só na versão atual; as anteriores guardam em history_data
+    # um delta comprimido para a versão seguinte ou, periodicamente, um snapshot
+    response_text = db.Column(db.Text)
+    history_format = db.Column(db.Enum('delta', 'snapshot', name='response_history_format'))
+    history_data = db.deferred(db.Column(db.LargeBinary))
     response_type = db.Column(db.Enum('generated', 'manual', 'hybrid', name='response_type'), default='generated')
     word_count = db.Column(db.Integer)
     character_count = db.Column(db.Integer)
@@ -32,9 +36,12 @@ class Response(db.Model):
     is_current = db.Column(db.Boolean, default=True)
     is_active = db.Column(db.Boolean, nullable=False, default=True)
     
-    # Constraint para garantir apenas uma resposta atual por pergunta
+    # Uma única resposta atual por pergunta (índice parcial: as versões
+    # anteriores não contam) e números de versão únicos por pergunta
     __table_args__ = (
-        UniqueConstraint('question_id', 'is_current', name='unique_current_response'),
+        db.Index('unique_current_response', 'question_id', unique=True,
+                 postgresql_where=db.text('is_current'), sqlite_where=db.text('is_current')),
+        UniqueConstraint('question_id', 'version', name='unique_response_version'),
     )
     
     def __repr__(self):
@@ -46,6 +53,7 @@ class Response(db.Model):
             'question_id': str(self.question_id),
             'version': self.version,
             'response_text': self.response_text,
+            'history_format': self.history_format,
             'response_type': self.response_type,
             'word_count': self.word_count,
             'character_count': self.character_count,
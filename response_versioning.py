@@ -0,0 +1,287 @@
+import re
+import json
+import time
+import zlib
+import random
+import logging
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+from sqlalchemy.exc import IntegrityError, OperationalError
+from src.models.user import db
+from src.models.question import Question
+from src.models.response import Response
+
+logger = logging.getLogger(__name__)
+
+# Tentativas por gravação antes de desistir com 409 VERSION_CONFLICT
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.02
+
+# Códigos do PostgreSQL que indicam conflito transitório entre escritores:
+# serialization_failure, deadlock_detected, lock_not_available
+RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+
+# Violações de unicidade que só acontecem quando outro escritor gravou a
+# versão antes (unique_violation nestes índices); as demais são erros de dados
+UNIQUE_VIOLATION_PGCODE = '23505'
+VERSION_CONSTRAINTS = ('unique_response_version', 'unique_current_response')
+# O SQLite não informa o nome do índice, só as colunas
+SQLITE_VERSION_CONFLICTS = ('responses.question_id, responses.version', 'responses.question_id')
+
+# Histórico: cada versão anterior guarda um delta reverso (para a versão
+# seguinte) comprimido; a cada SNAPSHOT_INTERVAL versões guarda o texto
+# completo, limitando a cadeia percorrida para reconstruir uma versão
+SNAPSHOT_INTERVAL = 10
+
+# Palavras com o espaço que as segue: juntar os tokens devolve o texto exato
+_TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
+def encode_history(text: str, newer_text: str, version: int) -> Tuple[str, bytes]:
+    """Codifica o texto de uma versão anterior em relação à versão seguinte.
+
+    O delta é uma lista de operações sobre os tokens da versão seguinte:
+    [início, tamanho] copia um trecho, uma string insere texto literal.
+    Usa snapshot quando a versão cai no intervalo ou o delta não compensa.
+
+    Returns:
+        tuple: ('delta' | 'snapshot', dados comprimidos com zlib)
+    """
+    snapshot = zlib.compress(text.encode('utf-8'), 9)
+    if version % SNAPSHOT_INTERVAL == 0:
+        return 'snapshot', snapshot
+
+    newer_tokens = _TOKEN_RE.findall(newer_text)
+    tokens = _TOKEN_RE.findall(text)
+    ops = []
+    matcher = SequenceMatcher(None, newer_tokens, tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2 - i1])
+        elif j2 > j1:
+            ops.append(''.join(tokens[j1:j2]))
+
+    delta = zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+    if len(delta) >= len(snapshot):
+        return 'snapshot', snapshot
+    return 'delta', delta
+
+def decode_history(history_format: str, data: bytes, newer_text: Optional[str]) -> str:
+    """Reconstrói o texto de uma versão anterior (inverso de encode_history)"""
+    raw = zlib.decompress(data).decode('utf-8')
+    if history_format == 'snapshot':
+        return raw
+
+    newer_tokens = _TOKEN_RE.findall(newer_text)
+    parts = []
+    for op in json.loads(raw):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            start, length = op
+            parts.extend(newer_tokens[start:start + length])
+    return ''.join(parts)
+
+def _is_base(response: Response) -> bool:
+    """Versão que não depende da seguinte (atual, snapshot ou texto completo)"""
+    return response.response_text is not None or response.history_format == 'snapshot'
+
+def _text_of(response: Response, newer_text: Optional[str]) -> str:
+    if response.response_text is not None:
+        return response.response_text
+    return decode_history(response.history_format, response.history_data, newer_text)
+
+def move_to_history(response: Response, newer_text: str) -> None:
+    """Troca o texto completo de uma resposta pela forma compacta do histórico"""
+    if response.response_text is None:
+        return
+    response.history_format, response.history_data = encode_history(
+        response.response_text, newer_text, response.version
+    )
+    response.response_text = None
+
+def history_texts(question_id, min_version: int, max_version: int) -> Dict[int, str]:
+    """Reconstrói os textos das versões min_version..max_version de uma pergunta.
+
+    Carrega as versões do intervalo e as seguintes até a primeira base
+    (snapshot ou versão atual), que normalmente está a menos de
+    SNAPSHOT_INTERVAL versões, e aplica os deltas de cima para baixo.
+    """
+    def load(upper):
+        query = Response.query.options(undefer(Response.history_data)).filter(
+            Response.question_id == question_id,
+            Response.version >= min_version
+        )
+        if upper is not None:
+            query = query.filter(Response.version <= upper)
+        return query.order_by(Response.version.desc()).all()
+
+    def first_base(rows):
+        return next((i for i, r in enumerate(rows) if _is_base(r)), None)
+
+    rows = load(max_version + SNAPSHOT_INTERVAL)
+    start = first_base(rows)
+    if start is None or rows[start].version < max_version:
+        rows = load(None)
+        start = first_base(rows)
+        if start is None:
+            return {}
+
+    texts = {}
+    newer_text = None
+    for row in rows[start:]:
+        newer_text = _text_of(row, newer_text)
+        if row.version <= max_version:
+            texts[row.version] = newer_text
+    return texts
+
+def response_text_of(response: Response) -> str:
+    """Texto completo de qualquer versão (reconstruído quando está no histórico)"""
+    if response.response_text is not None:
+        return response.response_text
+    return history_texts(response.question_id, response.version, response.version).get(response.version)
+
+def update_current_text(response: Response, new_text: str) -> bool:
+    """Edita o texto da versão atual mantendo o histórico consistente.
+
+    O delta da versão anterior aponta para o texto atual, então é refeito
+    em relação ao novo texto antes da troca. Roda sob a mesma trava da
+    pergunta usada por `add_response_version`.
+
+    Returns:
+        bool: False se a resposta deixou de ser a atual (nada é alterado)
+    """
+    db.session.query(Question.id).filter(Question.id == response.question_id).with_for_update().scalar()
+    db.session.refresh(response)
+    if not response.is_current:
+        return False
+
+    previous = Response.query.options(undefer(Response.history_data)).filter(
+        Response.question_id == response.question_id,
+        Response.version < response.version
+    ).order_by(Response.version.desc()).first()
+
+    if previous is not None and previous.history_format == 'delta':
+        previous_text = decode_history(previous.history_format, previous.history_data, response.response_text)
+        previous.history_format, previous.history_data = encode_history(previous_text, new_text, previous.version)
+
+    response.response_text = new_text
+    response.calculate_word_count()
+    return True
+
+def compact_history(question_id) -> int:
+    """Converte versões anteriores gravadas com texto completo para o formato compacto.
+
+    Usado uma vez para o histórico criado antes da compressão; não confirma.
+
+    Returns:
+        int: Quantidade de versões convertidas
+    """
+    db.session.query(Question.id).filter(Question.id == question_id).with_for_update().scalar()
+    rows = Response.query.options(undefer(Response.history_data)).filter(
+        Response.question_id == question_id
+    ).order_by(Response.version.desc()).all()
+
+    converted = 0
+    newer_text = None
+    for row in rows:
+        text = _text_of(row, newer_text)
+        if not row.is_current and row.response_text is not None and newer_text is not None:
+            move_to_history(row, newer_text)
+            converted += 1
+        newer_text = text
+    return converted
+
+def add_response_version(question_id, **fields) -> Response:
+    """Cria a próxima versão da resposta de uma pergunta, já marcada como atual.
+
+    Roda na transação corrente (não confirma). A linha da pergunta é travada
+    com SELECT ... FOR UPDATE, o que serializa os escritores da mesma
+    pergunta: a próxima versão (MAX + 1) e a troca da resposta atual, que
+    passa para o histórico compacto, acontecem sob a trava. Onde não há
+    trava de linha (SQLite), os índices únicos (question_id, version) e da
+    resposta atual barram o escritor concorrente, que é repetido por
+    `run_versioned`.
+    """
+    db.session.query(Question.id).filter(Question.id == question_id).with_for_update().scalar()
+
+    next_version = db.session.query(
+        func.coalesce(func.max(Response.version), 0)
+    ).filter(Response.question_id == question_id).scalar() + 1
+
+    # A resposta atual vai para o histórico como delta para o novo texto
+    for current in Response.query.filter(
+        Response.question_id == question_id,
+        Response.is_current == True
+    ).all():
+        current.is_current = False
+        move_to_history(current, fields['response_text'])
+    db.session.flush()
+
+    response = Response(question_id=question_id, version=next_version, is_current=True, **fields)
+    db.session.add(response)
+    db.session.flush()
+    return response
+
+def _is_version_conflict(orig) -> bool:
+    """Violação de unicidade em um dos índices de versão (corrida entre escritores)"""
+    pgcode = getattr(orig, 'pgcode', None)
+    if pgcode is not None:
+        if pgcode != UNIQUE_VIOLATION_PGCODE:
+            return False
+        constraint = getattr(getattr(orig, 'diag', None), 'constraint_name', None)
+        if constraint:
+            return constraint in VERSION_CONSTRAINTS
+        return any(name in str(orig) for name in VERSION_CONSTRAINTS)
+
+    message = str(orig)
+    if not message.startswith('UNIQUE constraint failed:'):
+        return False
+    columns = message.split(':', 1)[1].strip()
+    return columns in SQLITE_VERSION_CONFLICTS
+
+def _is_retryable(error: Exception) -> bool:
+    """Conflitos entre escritores concorrentes (e não erros de dados)"""
+    if isinstance(error, IntegrityError):
+        return _is_version_conflict(getattr(error, 'orig', None))
+    if isinstance(error, OperationalError):
+        orig = getattr(error, 'orig', None)
+        return getattr(orig, 'pgcode', None) in RETRYABLE_PGCODES or 'database is locked' in str(orig)
+    return False
+
+def run_versioned(work: Callable[[], Tuple[Any, Optional[tuple]]],
+                  max_attempts: int = MAX_ATTEMPTS) -> Tuple[Any, Optional[tuple]]:
+    """Executa `work` numa transação e confirma, repetindo em conflito de versão.
+
+    `work` segue a convenção das fases de gravação: devolve (resultado, None)
+    ou (None, (erro, status)); em caso de erro a transação é desfeita. A cada
+    conflito a transação inteira é refeita (com espera aleatória crescente),
+    de modo que as releituras feitas por `work` também são repetidas.
+
+    Returns:
+        tuple: (resultado, None) ou (None, (erro, status))
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            result, error = work()
+            if error:
+                db.session.rollback()
+                return None, error
+            db.session.commit()
+            return result, None
+        except (IntegrityError, OperationalError) as e:
+            db.session.rollback()
+            if not _is_retryable(e):
+                raise
+            if attempt == max_attempts:
+                break
+            logger.info(f"Conflito de versão (tentativa {attempt}/{max_attempts}): {e.orig}")
+            time.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+
+    return None, ({
+        'error': {
+            'code': 'VERSION_CONFLICT',
+            'message': 'Muitas gravações simultâneas para esta pergunta. Tente novamente.'
+        }
+    }, 409)
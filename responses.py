@@ -1,17 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+from sqlalchemy import func
 from src.models.user import User, db
 from src.models.question import Question
 from src.models.response import Response
 from src.models.project import Project
 from src.models.knowledge_base import KnowledgeBase
 from src.services.ai_service import ai_service
+from src.services.ai_scheduler import ai_scheduler, schedule_for
+from src.services.answer_reuse import find_reusable_answers, index_question
+from src.services.response_versioning import (
+    add_response_version, run_versioned, update_current_text, history_texts, response_text_of
+)
+from src.services.idempotency import idempotent
+from src.services.knowledge_usage import knowledge_usage
+from src.middleware.auth_middleware import rate_limit, audit_log
+from src.extensions.db_routing import read_only
 
 responses_bp = Blueprint('responses', __name__)
 
 @responses_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def list_responses():
     """Listar respostas"""
     try:
@@ -74,6 +87,7 @@ def list_responses():
 
 @responses_bp.route('/<response_id>', methods=['GET'])
 @jwt_required()
+@read_only
 def get_response(response_id):
     """Obter detalhes de uma resposta"""
     try:
@@ -102,7 +116,11 @@ def get_response(response_id):
                 }
             }), 404
         
-        return jsonify(response.to_dict())
+        result = response.to_dict()
+        if result['response_text'] is None:
+            result['response_text'] = response_text_of(response)
+        
+        return jsonify(result)
     
     except Exception as e:
         return jsonify({
@@ -113,96 +131,463 @@ def get_response(response_id):
             }
         }), 500
 
-@responses_bp.route('/generate/<question_id>', methods=['POST'])
-@jwt_required()
-def generate_response(question_id):
-    """Gerar resposta para uma pergunta"""
-    try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_active:
-            return jsonify({
-                'error': {
-                    'code': 'USER_NOT_FOUND',
-                    'message': 'Usuário não encontrado ou inativo'
-                }
-            }), 404
-        
-        # Buscar pergunta
+def load_generation_context(user_id, question_id, data):
+    """Fase de carga da geração: lê usuário, pergunta e base de conhecimento.
+    
+    Devolve apenas valores simples (nenhum objeto ORM), para que a sessão
+    possa ser fechada antes da chamada à IA.
+    
+    Returns:
+        tuple: (contexto, None) ou (None, (erro, status))
+    """
+    user = User.query.get(user_id)
+    
+    if not user or not user.is_active:
+        return None, ({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }, 404)
+    
+    # Buscar pergunta
+    question = Question.query.join(Project).filter(
+        Question.id == question_id,
+        Project.organization_id == user.organization_id,
+        Question.is_active == True
+    ).first()
+    
+    if not question:
+        return None, ({
+            'error': {
+                'code': 'QUESTION_NOT_FOUND',
+                'message': 'Pergunta não encontrada'
+            }
+        }, 404)
+    
+    # Obter parâmetros
+    use_knowledge_base = data.get('use_knowledge_base', True)
+    include_sources = data.get('include_sources', True)
+    
+    # Resposta aprovada de pergunta quase idêntica: vira rascunho sem chamar a IA
+    reuse = None
+    if data.get('reuse', True):
+        matches = find_reusable_answers(
+            user.organization_id,
+            question.question_text,
+            exclude_question_id=question.id,
+            threshold=current_app.config.get('ANSWER_REUSE_THRESHOLD', 0.8),
+            limit=1
+        )
+        if matches:
+            match = matches[0]
+            reuse = {
+                'response_id': str(match['response'].id),
+                'question_id': str(match['question_id']),
+                'question_text': match['question_text'],
+                'similarity': match['similarity'],
+                'response_text': response_text_of(match['response']),
+                'source_documents': match['response'].source_documents or []
+            }
+    
+    # Buscar documentos de contexto na base de conhecimento
+    context_documents = []
+    used_kb_ids = []
+    if use_knowledge_base and not reuse:
+        # Buscar documentos relevantes baseados nas palavras-chave da pergunta
+        keywords = question.keywords or []
+        if keywords:
+            kb_items = KnowledgeBase.query.filter(
+                KnowledgeBase.organization_id == user.organization_id,
+                KnowledgeBase.is_active == True
+            ).limit(3).all()
+            
+            # Implementação simplificada de busca por relevância (limitada a 3 documentos)
+            for item in kb_items:
+                context_documents.append(f"Título: {item.title}\nConteúdo: {item.content[:500]}...")
+                if include_sources:
+                    used_kb_ids.append(item.id)
+    
+    return {
+        'user_id': user.id,
+        'organization_id': user.organization_id,
+        'question_id': question.id,
+        'question_text': question.question_text,
+        'language': question.document.language if question.document else 'pt-BR',
+        'max_words': data.get('max_words', question.max_words),
+        'tone': data.get('tone', 'professional'),
+        'ai_model': data.get('ai_model', 'gemini'),
+        'context_documents': context_documents,
+        'used_kb_ids': used_kb_ids,
+        'reuse': reuse,
+        'schedule': schedule_for(question.project, user.organization)
+    }, None
+
+def reused_ai_response(ctx):
+    """Resultado no formato do ai_service a partir da resposta aprovada reutilizada"""
+    from src.services.usage_metering import usage_meter
+    reuse = ctx['reuse']
+    usage_meter.record(ctx['organization_id'], 'reuse', 'generate_response',
+                       cache_hit=True, user_id=ctx['user_id'])
+    
+    text = reuse['response_text']
+    return {
+        'response_text': text,
+        'response_type': 'hybrid',
+        'word_count': len(text.split()),
+        'character_count': len(text),
+        'source_documents': [{
+            'type': 'reused_response',
+            'response_id': reuse['response_id'],
+            'question_id': reuse['question_id'],
+            'similarity': reuse['similarity']
+        }] + list(reuse['source_documents']),
+        'confidence_score': round(reuse['similarity'], 2),
+        'generated_by': 'reuse',
+        'generated_at': datetime.utcnow()
+    }
+
+def generation_result(ctx, response):
+    """Corpo da resposta de /generate (inclui a origem quando houve reaproveitamento)"""
+    result = response.to_dict()
+    if ctx.get('reuse'):
+        result['reused_from'] = {
+            'response_id': ctx['reuse']['response_id'],
+            'question_id': ctx['reuse']['question_id'],
+            'question_text': ctx['reuse']['question_text'],
+            'similarity': ctx['reuse']['similarity']
+        }
+    return result
+
+def call_generation_ai(ctx):
+    """Fase externa da geração: chama a IA sem nenhuma conexão de banco.
+    
+    A thread espera vaga no ai_scheduler, como a versão assíncrona.
+    """
+    if ctx.get('reuse'):
+        return reused_ai_response(ctx)
+    return ai_scheduler.run_sync(
+        lambda: ai_service.generate_response(
+            ctx['question_text'],
+            ctx['context_documents'],
+            ctx['max_words'],
+            ctx['tone'],
+            ctx['language'],
+            organization_id=ctx['organization_id'],
+            user_id=ctx['user_id']
+        ),
+        operation='generate_response',
+        **ctx['schedule']
+    )
+
+async def call_generation_ai_async(ctx):
+    """Versão assíncrona de call_generation_ai (usada pelo servidor ASGI).
+    
+    A chamada passa pelo ai_scheduler: entra na fila do provedor e espera
+    vaga pela ordem justa entre organizações e pelo prazo do projeto.
+    """
+    if ctx.get('reuse'):
+        return reused_ai_response(ctx)
+    return await ai_scheduler.run(
+        lambda: ai_service.generate_response_async(
+            ctx['question_text'],
+            ctx['context_documents'],
+            ctx['max_words'],
+            ctx['tone'],
+            ctx['language'],
+            organization_id=ctx['organization_id'],
+            user_id=ctx['user_id']
+        ),
+        operation='generate_response',
+        **ctx['schedule']
+    )
+
+def persist_generated_response(ctx, ai_response):
+    """Fase de gravação da geração, com revalidação otimista.
+    
+    A pergunta é relida: se foi removida ou editada durante a chamada à IA,
+    a resposta gerada está obsoleta e nada é gravado. A nova versão é criada
+    por `add_response_version` e a transação é repetida em caso de conflito
+    com outra geração simultânea da mesma pergunta.
+    
+    Returns:
+        tuple: (resposta, None) ou (None, (erro, status))
+    """
+    def attempt():
         question = Question.query.join(Project).filter(
-            Question.id == question_id,
-            Project.organization_id == user.organization_id,
+            Question.id == ctx['question_id'],
+            Project.organization_id == ctx['organization_id'],
             Question.is_active == True
         ).first()
         
         if not question:
-            return jsonify({
+            return None, ({
                 'error': {
                     'code': 'QUESTION_NOT_FOUND',
                     'message': 'Pergunta não encontrada'
                 }
-            }), 404
-        
-        # Obter parâmetros
-        data = request.get_json() or {}
-        ai_model = data.get('ai_model', 'gemini')
-        use_knowledge_base = data.get('use_knowledge_base', True)
-        max_words = data.get('max_words', question.max_words)
-        tone = data.get('tone', 'professional')
-        include_sources = data.get('include_sources', True)
-        
-        # Buscar documentos de contexto na base de conhecimento
-        context_documents = []
-        if use_knowledge_base:
-            # Buscar documentos relevantes baseados nas palavras-chave da pergunta
-            keywords = question.keywords or []
-            if keywords:
-                kb_items = KnowledgeBase.query.filter(
-                    KnowledgeBase.organization_id == user.organization_id,
-                    KnowledgeBase.is_active == True
-                ).all()
-                
-                # Implementação simplificada de busca por relevância
-                for item in kb_items[:3]:  # Limitar a 3 documentos
-                    context_documents.append(f"Título: {item.title}\nConteúdo: {item.content[:500]}...")
-                    if include_sources:
-                        item.increment_usage()
+            }, 404)
         
-        # Gerar resposta usando IA
-        ai_response = ai_service.generate_response(
-            question.question_text,
-            context_documents,
-            max_words,
-            tone,
-            question.document.language if question.document else 'pt-BR'
-        )
-        
-        # Desmarcar resposta atual anterior
-        current_response = question.get_current_response()
-        if current_response:
-            current_response.is_current = False
+        if question.question_text != ctx['question_text']:
+            return None, ({
+                'error': {
+                    'code': 'QUESTION_CHANGED',
+                    'message': 'A pergunta foi alterada durante a geração. Gere a resposta novamente.'
+                }
+            }, 409)
         
-        # Criar nova resposta
-        response = Response(
-            question_id=question.id,
+        # Criar nova versão (desmarca a resposta atual sob a trava da pergunta)
+        response = add_response_version(
+            question.id,
             response_text=ai_response['response_text'],
-            response_type='generated',
+            response_type=ai_response.get('response_type', 'generated'),
             word_count=ai_response['word_count'],
             character_count=ai_response['character_count'],
             source_documents=ai_response.get('source_documents', []),
             confidence_score=ai_response.get('confidence_score'),
             generated_by=ai_response.get('generated_by'),
             generated_at=ai_response.get('generated_at'),
-            created_by=user.id,
-            status='draft',
-            is_current=True
+            created_by=ctx['user_id'],
+            status='draft'
         )
         
-        db.session.add(response)
-        db.session.commit()
+        return response, None
+    
+    response, error = run_versioned(attempt)
+    # Uso dos itens da base de conhecimento: gravado em lote fora da requisição,
+    # e só depois da confirmação (uma tentativa repetida não conta duas vezes)
+    if response is not None and ctx['used_kb_ids']:
+        knowledge_usage.record(ctx['used_kb_ids'])
+    return response, error
+
+# Máximo de perguntas por requisição de geração em lote. O orçamento de IA é
+# cobrado por grupo de quase-duplicatas (uma geração cada), não por pergunta
+BATCH_GENERATE_LIMIT = 100
+
+# No servidor WSGI a requisição espera todas as gerações: o lote é menor e as
+# gerações rodam em paralelo, de modo que uma única rodada de chamadas à IA
+# caiba no timeout do worker (as rotas ASGI aceitam até BATCH_GENERATE_LIMIT)
+BATCH_GENERATE_SYNC_LIMIT = 10
+
+def _batch_generate_cost(req):
+    """Cada grupo de perguntas do lote (uma chamada à IA) consome um token do orçamento de IA"""
+    data = req.get_json(silent=True) or {}
+    question_ids = data.get('question_ids') or []
+    # Lote acima do limite é recusado na carga; não vale a consulta
+    if len(question_ids) > BATCH_GENERATE_LIMIT:
+        return len(question_ids)
+    
+    valid_ids = set()
+    for question_id in question_ids:
+        try:
+            valid_ids.add(uuid.UUID(str(question_id)))
+        except ValueError:
+            pass
+    user = User.query.get(get_jwt_identity())
+    if not valid_ids or not user:
+        return 1
+    
+    return db.session.query(func.coalesce(Question.cluster_id, Question.id)).join(Project).filter(
+        Question.id.in_(valid_ids),
+        Project.organization_id == user.organization_id,
+        Question.is_active == True
+    ).distinct().count()
+
+def load_batch_generation_context(user_id, data, limit=BATCH_GENERATE_LIMIT):
+    """Fase de carga da geração em lote: agrupa as perguntas por cluster.
+    
+    Perguntas do mesmo grupo de quase-duplicatas (Question.cluster_id)
+    compartilham uma única geração, feita para a representante do grupo
+    (ou para a primeira pergunta do grupo presente no lote).
+    
+    Returns:
+        tuple: (contexto, None) ou (None, (erro, status))
+    """
+    user = User.query.get(user_id)
+    
+    if not user or not user.is_active:
+        return None, ({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }, 404)
+    
+    question_ids = data.get('question_ids', [])
+    
+    if not question_ids:
+        return None, ({
+            'error': {
+                'code': 'NO_QUESTIONS',
+                'message': 'Lista de perguntas é obrigatória'
+            }
+        }, 400)
+    
+    if len(question_ids) > limit:
+        return None, ({
+            'error': {
+                'code': 'TOO_MANY_QUESTIONS',
+                'message': f'Máximo de {limit} perguntas por lote'
+            }
+        }, 400)
+    
+    results = [None] * len(question_ids)
+    groups = {}
+    
+    # Todas as perguntas do lote em uma única consulta (ids inválidos ficam de fora)
+    valid_ids = set()
+    for question_id in question_ids:
+        try:
+            valid_ids.add(uuid.UUID(str(question_id)))
+        except ValueError:
+            pass
+    questions = {
+        str(question.id): question
+        for question in Question.query.join(Project).filter(
+            Question.id.in_(valid_ids),
+            Project.organization_id == user.organization_id,
+            Question.is_active == True
+        ).all()
+    } if valid_ids else {}
+    
+    for index, question_id in enumerate(question_ids):
+        try:
+            question = questions.get(str(uuid.UUID(str(question_id))))
+        except ValueError:
+            question = None
         
-        return jsonify(response.to_dict()), 201
+        if not question:
+            results[index] = {
+                'question_id': question_id,
+                'status': 'error',
+                'message': 'Pergunta não encontrada'
+            }
+            continue
+        
+        members = groups.setdefault(question.cluster_id or question.id, [])
+        member = (index, question.id, question.question_text)
+        # A representante do grupo, se estiver no lote, é quem gera
+        if question.id == question.cluster_id:
+            members.insert(0, member)
+        else:
+            members.append(member)
+    
+    pending = []
+    for members in groups.values():
+        index, question_id, _ = members[0]
+        ctx, error = load_generation_context(user_id, question_id, data)
+        if error:
+            for member_index, member_id, _ in members:
+                results[member_index] = {
+                    'question_id': str(member_id),
+                    'status': 'error',
+                    'message': error[0]['error']['message']
+                }
+            continue
+        pending.append((ctx, members))
+    
+    return {
+        'user_id': user.id,
+        'organization_id': user.organization_id,
+        'results': results,
+        'pending': pending
+    }, None
+
+def persist_batch_generation(ctx, outcomes):
+    """Fase de gravação da geração em lote: replica cada geração no seu grupo.
+    
+    Cada pergunta é gravada em sua própria transação curta (ver
+    persist_generated_response). As demais perguntas do grupo recebem o
+    mesmo texto, com a pergunta que originou a geração em source_documents.
+    
+    Args:
+        ctx: Contexto de load_batch_generation_context
+        outcomes: Para cada item de ctx['pending'], o resultado da IA ou a exceção
+    
+    Returns:
+        dict: Corpo da resposta com o resultado por pergunta, na ordem da requisição
+    """
+    results = ctx['results']
+    total_responses = 0
+    ai_calls = 0
+    
+    for (generation_ctx, members), outcome in zip(ctx['pending'], outcomes):
+        if isinstance(outcome, Exception):
+            for index, question_id, _ in members:
+                results[index] = {
+                    'question_id': str(question_id),
+                    'status': 'error',
+                    'message': str(outcome)
+                }
+            continue
+        
+        if not generation_ctx.get('reuse'):
+            ai_calls += 1
+        generated_for = generation_ctx['question_id']
+        
+        for index, question_id, question_text in members:
+            if question_id == generated_for:
+                member_ctx, ai_response = generation_ctx, outcome
+            else:
+                # Base de conhecimento contabilizada só uma vez, na geração original
+                member_ctx = dict(generation_ctx, question_id=question_id, question_text=question_text,
+                                  used_kb_ids=[])
+                ai_response = dict(outcome, source_documents=[{
+                    'type': 'cluster_response',
+                    'question_id': str(generated_for)
+                }] + list(outcome.get('source_documents', [])))
+            
+            try:
+                response, error = persist_generated_response(member_ctx, ai_response)
+            except Exception as e:
+                db.session.rollback()
+                response, error = None, ({'error': {'message': str(e)}}, 500)
+            
+            if error:
+                results[index] = {
+                    'question_id': str(question_id),
+                    'status': 'error',
+                    'message': error[0]['error']['message']
+                }
+                continue
+            
+            results[index] = {
+                'question_id': str(question_id),
+                'status': 'success',
+                'response_id': str(response.id),
+                'generated_for': str(generated_for)
+            }
+            total_responses += 1
+    
+    return {
+        'message': f'Processamento concluído. {total_responses} respostas geradas com {ai_calls} chamadas à IA.',
+        'total_responses': total_responses,
+        'ai_calls': ai_calls,
+        'results': results
+    }
+
+@responses_bp.route('/generate/<question_id>', methods=['POST'])
+@jwt_required()
+@idempotent('generate_response', 'question_id')
+@rate_limit('ai')
+def generate_response(question_id):
+    """Gerar resposta para uma pergunta"""
+    try:
+        ctx, error = load_generation_context(get_jwt_identity(), question_id, request.get_json() or {})
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        # Devolver a conexão ao pool enquanto a IA responde (pode levar até 60s)
+        db.session.close()
+        
+        # Gerar resposta usando IA
+        ai_response = call_generation_ai(ctx)
+        
+        response, error = persist_generated_response(ctx, ai_response)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        return jsonify(generation_result(ctx, response)), 201
     
     except Exception as e:
         db.session.rollback()
@@ -214,6 +599,44 @@ def generate_response(question_id):
             }
         }), 500
 
+@responses_bp.route('/batch-generate', methods=['POST'])
+@jwt_required()
+@rate_limit('ai', cost=lambda req: _batch_generate_cost(req))
+def batch_generate_responses():
+    """Gerar respostas para várias perguntas, uma geração por grupo de quase-duplicatas"""
+    try:
+        ctx, error = load_batch_generation_context(get_jwt_identity(), request.get_json() or {},
+                                                   limit=BATCH_GENERATE_SYNC_LIMIT)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        # Nenhuma conexão fica presa durante as chamadas à IA
+        db.session.close()
+        
+        def generate(generation_ctx):
+            try:
+                return call_generation_ai(generation_ctx)
+            except Exception as e:
+                return e
+        
+        # Uma geração por grupo, todas em paralelo (o ai_scheduler limita o provedor)
+        outcomes = []
+        if ctx['pending']:
+            with ThreadPoolExecutor(max_workers=len(ctx['pending'])) as executor:
+                outcomes = list(executor.map(generate, [generation_ctx for generation_ctx, _ in ctx['pending']]))
+        
+        return jsonify(persist_batch_generation(ctx, outcomes))
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'error': {
+                'code': 'BATCH_GENERATION_ERROR',
+                'message': 'Erro na geração em lote',
+                'details': str(e)
+            }
+        }), 500
+
 @responses_bp.route('/<response_id>', methods=['PATCH'])
 @jwt_required()
 def update_response(response_id):
@@ -248,8 +671,15 @@ def update_response(response_id):
         
         # Atualizar campos permitidos
         if 'response_text' in data:
-            response.response_text = data['response_text']
-            response.calculate_word_count()
+            # Versões anteriores ficam no histórico compacto e não são editáveis
+            if not update_current_text(response, data['response_text']):
+                db.session.rollback()
+                return jsonify({
+                    'error': {
+                        'code': 'RESPONSE_NOT_CURRENT',
+                        'message': 'Somente a versão atual da resposta pode ser editada'
+                    }
+                }), 409
             
             # Se o texto foi editado, marcar como híbrido
             if response.response_type == 'generated':
@@ -274,6 +704,7 @@ def update_response(response_id):
 
 @responses_bp.route('/<response_id>/approve', methods=['POST'])
 @jwt_required()
+@audit_log('approve', resource_type='response')
 def approve_response(response_id):
     """Aprovar resposta"""
     try:
@@ -309,6 +740,9 @@ def approve_response(response_id):
         response.approved_by = user.id
         response.approved_at = datetime.utcnow()
         
+        # Pergunta passa a ser candidata a reaproveitamento em outros projetos
+        index_question(response.question, user.organization_id)
+        
         db.session.commit()
         
         return jsonify({
@@ -328,6 +762,7 @@ def approve_response(response_id):
 
 @responses_bp.route('/<response_id>/reject', methods=['POST'])
 @jwt_required()
+@audit_log('reject', resource_type='response')
 def reject_response(response_id):
     """Rejeitar resposta"""
     try:
@@ -380,44 +815,83 @@ def reject_response(response_id):
             }
         }), 500
 
+def _get_question_for_user(question_id):
+    """Pergunta ativa da organização do usuário autenticado.
+    
+    Returns:
+        tuple: (pergunta, None) ou (None, (erro, status))
+    """
+    user = User.query.get(get_jwt_identity())
+    
+    if not user or not user.is_active:
+        return None, ({
+            'error': {
+                'code': 'USER_NOT_FOUND',
+                'message': 'Usuário não encontrado ou inativo'
+            }
+        }, 404)
+    
+    question = Question.query.join(Project).filter(
+        Question.id == question_id,
+        Project.organization_id == user.organization_id,
+        Question.is_active == True
+    ).first()
+    
+    if not question:
+        return None, ({
+            'error': {
+                'code': 'QUESTION_NOT_FOUND',
+                'message': 'Pergunta não encontrada'
+            }
+        }, 404)
+    
+    return question, None
+
 @responses_bp.route('/question/<question_id>/versions', methods=['GET'])
 @jwt_required()
+@read_only
 def get_response_versions(question_id):
-    """Listar versões de resposta para uma pergunta"""
+    """Listar versões de resposta para uma pergunta
+    
+    O histórico é paginado (mais recentes primeiro) e traz só metadados;
+    com include_text=true os textos da página são reconstruídos a partir
+    dos deltas.
+    """
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user or not user.is_active:
-            return jsonify({
-                'error': {
-                    'code': 'USER_NOT_FOUND',
-                    'message': 'Usuário não encontrado ou inativo'
-                }
-            }), 404
+        question, error = _get_question_for_user(question_id)
+        if error:
+            return jsonify(error[0]), error[1]
         
-        # Buscar pergunta
-        question = Question.query.join(Project).filter(
-            Question.id == question_id,
-            Project.organization_id == user.organization_id,
-            Question.is_active == True
-        ).first()
-        
-        if not question:
-            return jsonify({
-                'error': {
-                    'code': 'QUESTION_NOT_FOUND',
-                    'message': 'Pergunta não encontrada'
-                }
-            }), 404
+        # Parâmetros de consulta
+        page = request.args.get('page', 1, type=int)
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        include_text = request.args.get('include_text', 'false').lower() == 'true'
         
         # Obter versões
         current_response = question.get_current_response()
-        history = question.get_response_history()
+        history = Response.query.filter(
+            Response.question_id == question.id,
+            Response.is_current == False,
+            Response.is_active == True
+        ).order_by(Response.version.desc()).paginate(page=page, per_page=limit, error_out=False)
+        
+        items = [r.to_dict() for r in history.items]
+        if include_text and items:
+            versions = [item['version'] for item in items]
+            texts = history_texts(question.id, min(versions), max(versions))
+            for item in items:
+                if item['response_text'] is None:
+                    item['response_text'] = texts.get(item['version'])
         
         result = {
             'current': current_response.to_dict() if current_response else None,
-            'history': [r.to_dict() for r in history if not r.is_current]
+            'history': items,
+            'pagination': {
+                'page': page,
+                'limit': limit,
+                'total': history.total,
+                'pages': history.pages
+            }
         }
         
         return jsonify(result)
@@ -431,3 +905,89 @@ def get_response_versions(question_id):
             }
         }), 500
 
+@responses_bp.route('/question/<question_id>/versions/<int:version>', methods=['GET'])
+@jwt_required()
+@read_only
+def get_response_version(question_id, version):
+    """Obter uma versão da resposta com o texto completo"""
+    try:
+        question, error = _get_question_for_user(question_id)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        response = Response.query.filter_by(
+            question_id=question.id,
+            version=version,
+            is_active=True
+        ).first()
+        
+        if not response:
+            return jsonify({
+                'error': {
+                    'code': 'VERSION_NOT_FOUND',
+                    'message': 'Versão da resposta não encontrada'
+                }
+            }), 404
+        
+        result = response.to_dict()
+        if result['response_text'] is None:
+            result['response_text'] = response_text_of(response)
+        
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'GET_VERSION_ERROR',
+                'message': 'Erro ao obter versão da resposta',
+                'details': str(e)
+            }
+        }), 500
+
+
+@responses_bp.route('/reuse-candidates/<question_id>', methods=['GET'])
+@jwt_required()
+@read_only
+def get_reuse_candidates(question_id):
+    """Respostas aprovadas de perguntas quase idênticas da organização"""
+    try:
+        question, error = _get_question_for_user(question_id)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        limit = min(request.args.get('limit', 3, type=int), 10)
+        threshold = request.args.get('threshold', 0.5, type=float)
+        
+        matches = find_reusable_answers(
+            question.project.organization_id,
+            question.question_text,
+            exclude_question_id=question.id,
+            threshold=threshold,
+            limit=limit
+        )
+        
+        candidates = []
+        for match in matches:
+            response_data = match['response'].to_dict()
+            if response_data['response_text'] is None:
+                response_data['response_text'] = response_text_of(match['response'])
+            candidates.append({
+                'question_id': str(match['question_id']),
+                'question_text': match['question_text'],
+                'similarity': match['similarity'],
+                'response': response_data
+            })
+        
+        return jsonify({
+            'candidates': candidates,
+            'reuse_threshold': current_app.config.get('ANSWER_REUSE_THRESHOLD', 0.8)
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'error': {
+                'code': 'REUSE_CANDIDATES_ERROR',
+                'message': 'Erro ao buscar respostas reaproveitáveis',
+                'details': str(e)
+            }
+        }), 500
@@ -1,91 +1,269 @@
 """Flask Application Factory
 This module contains the Flask application factory pattern implementation.
+
+It is the single entry point used by main.py (development server),
+wsgi.py (Gunicorn) and asgi.py. Schema creation is not part of startup:
+run ``flask --app main init-db`` once for a fresh database, or the
+Flask-Migrate ``flask db upgrade`` commands. Dependencies that are only
+needed on first use (HTTP clients, Alembic) are imported lazily so that
+workers start quickly; ``benchmarks/cold_start.py`` tracks startup time.
 """
 import os
-from flask import Flask
+from flask import Flask, send_from_directory
+from werkzeug.utils import import_string
 
-# Import extensions (these will be implemented later)
-from .extensions.db import db
-from .extensions.migrate import migrate
+from .config import config
+from .extensions.db import db, init_db
 from .extensions.jwt import jwt
 from .extensions.cors import cors
 
-# Import middleware (these will be implemented later)
-from .middleware.security_headers import setup_security_headers
+from .middleware.security_headers import register_security_middleware
 from .middleware.error_handlers import register_error_handlers
+from .middleware.request_id import register_request_id_middleware
+from .middleware.instrumentation import register_instrumentation_middleware
+from .middleware.profiling import register_profiling_middleware
+from .middleware.rate_limit import register_rate_limit_middleware
+
+# Blueprints as import strings: (module:attribute, url_prefix)
+BLUEPRINTS = (
+    ('src.routes.auth:auth_bp', '/api/auth'),
+    ('src.routes.organizations:organizations_bp', '/api/organizations'),
+    ('src.routes.users:users_bp', '/api/users'),
+    ('src.routes.projects:projects_bp', '/api/projects'),
+    ('src.routes.documents:documents_bp', '/api/documents'),
+    ('src.routes.questions:questions_bp', '/api/questions'),
+    ('src.routes.responses:responses_bp', '/api/responses'),
+    ('src.routes.audit:audit_bp', '/api/audit'),
+    ('src.routes.profiles:profiles_bp', '/api/profiles'),
+)
+
+STATIC_FOLDER = os.path.join(os.path.dirname(__file__), 'static')
 
 def create_app(config_name=None):
     """Create and configure Flask application instance.
-    
+
     Args:
         config_name (str): Configuration name ('development', 'production', 'testing')
-        
+
     Returns:
         Flask: Configured Flask application instance
     """
     # Create Flask application instance
-    app = Flask(__name__)
-    
+    app = Flask(__name__, static_folder=os.environ.get('STATIC_FOLDER', STATIC_FOLDER))
+
     # Load configuration
     config_name = config_name or os.environ.get('FLASK_ENV', 'development')
-    
-    # TODO: Load configuration from config.py
-    # app.config.from_object(f'src.config.{config_name.title()}Config')
-    
-    # Basic configuration for now
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
-    app.config['DEBUG'] = config_name == 'development'
-    
+    app.config.from_object(config.get(config_name, config['default']))
+
     # Initialize extensions
-    db.init_app(app)
-    migrate.init_app(app, db)
+    init_db(app)
     jwt.init_app(app)
     cors.init_app(app)
-    
+
     # Setup middleware
-    setup_security_headers(app)
+    register_request_id_middleware(app)
+    register_instrumentation_middleware(app)
+    register_profiling_middleware(app)
+    register_rate_limit_middleware(app)
+    register_security_middleware(app)
     register_error_handlers(app)
-    
+
+    # Background writers (threads start on first use, not at boot)
+    from .services.usage_metering import usage_meter
+    from .services.audit_service import audit_trail
+    from .services.knowledge_usage import knowledge_usage
+    from .services.login_activity import login_activity
+    usage_meter.init_app(app)
+    audit_trail.init_app(app)
+    knowledge_usage.init_app(app)
+    login_activity.init_app(app)
+
+    # Per-process cache of compiled role/permission masks
+    from .services.permissions import permission_cache
+    permission_cache.init_app(app)
+
     # Register blueprints
-    from .blueprints.auth import auth_bp
-    from .blueprints.organizations import organizations_bp
-    
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(organizations_bp, url_prefix='/api/organizations')
-    
-    # TODO: Register remaining blueprints when they are created
-    # from .blueprints.users import users_bp
-    # from .blueprints.projects import projects_bp
-    # from .blueprints.documents import documents_bp
-    # from .blueprints.questions import questions_bp
-    # from .blueprints.responses import responses_bp
-    # 
-    # app.register_blueprint(users_bp)
-    # app.register_blueprint(projects_bp)
-    # app.register_blueprint(documents_bp)
-    # app.register_blueprint(questions_bp)
-    # app.register_blueprint(responses_bp)
-    
-    # Basic health check route
+    for import_name, url_prefix in BLUEPRINTS:
+        app.register_blueprint(import_string(import_name), url_prefix=url_prefix)
+
+    register_commands(app)
+    register_base_routes(app, config_name)
+
+    return app
+
+def register_commands(app):
+    """Register CLI commands with Flask app.
+
+    Args:
+        app: Flask application instance
+    """
+    @app.cli.command('init-db')
+    def init_db():
+        """Create all tables (fresh databases only; use migrations afterwards)."""
+        from . import models  # noqa: F401 (registers every table)
+        db.create_all()
+        print('Database tables created')
+
+    @app.cli.command('compact-response-history')
+    def compact_response_history():
+        """Store old full-text response versions as compressed deltas."""
+        from sqlalchemy import func
+        from .models.response import Response
+        from .services.response_versioning import compact_history
+
+        question_ids = [row[0] for row in db.session.query(Response.question_id)
+                        .group_by(Response.question_id).having(func.count(Response.id) > 1)]
+        converted = 0
+        for question_id in question_ids:
+            converted += compact_history(question_id)
+            db.session.commit()
+        print(f'{converted} response versions compacted across {len(question_ids)} questions')
+
+    @app.cli.command('build-reuse-index')
+    def build_reuse_index():
+        """Index every question that has an approved response for answer reuse."""
+        from .models.project import Project
+        from .models.question import Question
+        from .models.response import Response
+        from .services.answer_reuse import index_question
+
+        approved = db.session.query(Response.question_id).filter(
+            Response.status == 'approved',
+            Response.is_active == True
+        )
+        rows = db.session.query(Question, Project.organization_id).join(Project).filter(
+            Question.id.in_(approved)
+        ).all()
+        for question, organization_id in rows:
+            index_question(question, organization_id)
+        db.session.commit()
+        print(f'{len(rows)} questions indexed for answer reuse')
+
+    @app.cli.command('backfill-usage')
+    def backfill_usage():
+        """Recompute storage_used_bytes and monthly ai_calls from the source rows."""
+        from datetime import datetime
+        from sqlalchemy import func, select, update
+        from .models.document import Document
+        from .models.organization import Organization
+        from .models.usage import AIUsageRecord, OrganizationUsage
+
+        # Storage is counted incrementally; organizations created before that show 0
+        active_bytes = select(func.coalesce(func.sum(Document.file_size), 0)).where(
+            Document.organization_id == Organization.id,
+            Document.is_active == True
+        ).scalar_subquery()
+        organizations = db.session.execute(
+            update(Organization).values(storage_used_bytes=active_bytes)
+        ).rowcount
+
+        # ai_calls used to count reused answers (cache hits) as AI calls
+        periods = db.session.query(OrganizationUsage.id, OrganizationUsage.organization_id,
+                                   OrganizationUsage.period).all()
+        for usage_id, organization_id, period in periods:
+            start = datetime.strptime(period, '%Y-%m')
+            end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+            calls = select(func.count(AIUsageRecord.id)).where(
+                AIUsageRecord.organization_id == organization_id,
+                AIUsageRecord.cache_hit == False,
+                AIUsageRecord.created_at >= start,
+                AIUsageRecord.created_at < end
+            ).scalar_subquery()
+            db.session.execute(
+                update(OrganizationUsage).where(OrganizationUsage.id == usage_id).values(ai_calls=calls)
+            )
+        db.session.commit()
+        print(f'{organizations} organizations: storage recomputed; {len(periods)} monthly usage rows: ai_calls recomputed')
+
+    @app.cli.command('ingest-knowledge-base')
+    def ingest_knowledge_base():
+        """Chunk every processed knowledge-base document into knowledge entries."""
+        from .models.document import Document
+        from .services.knowledge_ingestion import ingest_documents, not_superseded
+
+        # Only the latest revision of each document: a superseded revision
+        # would re-insert passages its successor already took over
+        documents = Document.query.filter(
+            Document.document_type == 'knowledge_base',
+            Document.processing_status == 'completed',
+            Document.extracted_text.isnot(None),
+            Document.is_active == True,
+            not_superseded()
+        ).order_by(Document.uploaded_at, Document.id).all()
+        results = ingest_documents(documents)
+        totals = {'created': 0, 'kept': 0, 'deactivated': 0}
+        failed = 0
+        for stats in results.values():
+            if 'error' in stats:
+                failed += 1
+                continue
+            for name in totals:
+                totals[name] += stats[name]
+        print(f"{len(documents)} documents ingested: {totals['created']} entries created, "
+              f"{totals['kept']} kept, {totals['deactivated']} deactivated, {failed} failed")
+
+    @app.cli.command('backfill-embeddings')
+    def backfill_embeddings_command():
+        """Embed every knowledge-base entry and question missing from the embedding cache."""
+        from .models.knowledge_base import KnowledgeBase
+        from .models.question import Question
+        from .services.embeddings import backfill_embeddings
+
+        def column_values(model, column, page_size=1000):
+            # Keyset pagination: the backfill commits between pages
+            last_id = None
+            while True:
+                query = db.session.query(model.id, column).filter(model.is_active == True)
+                if last_id is not None:
+                    query = query.filter(model.id > last_id)
+                page = query.order_by(model.id).limit(page_size).all()
+                if not page:
+                    return
+                for _, value in page:
+                    yield value
+                last_id = page[-1][0]
+
+        def texts():
+            yield from column_values(KnowledgeBase, KnowledgeBase.content)
+            yield from column_values(Question, Question.question_text)
+
+        stats = backfill_embeddings(texts(), model=app.config['EMBEDDING_MODEL'])
+        print(f"{stats['total']} texts read: {stats['embedded']} embedded, "
+              f"{stats['cached']} already cached or repeated")
+
+def register_base_routes(app, config_name):
+    """Register health check and single-page app routes.
+
+    Args:
+        app: Flask application instance
+        config_name (str): Configuration name reported by the health check
+    """
     @app.route('/health')
+    @app.route('/api/health')
     def health_check():
         """Basic health check endpoint."""
         return {
             'status': 'healthy',
-            'message': 'MVC RFP Application is running',
-            'version': '1.0.0'
-        }
-    
-    @app.route('/')
-    def index():
-        """Basic index route."""
-        return {
-            'message': 'Welcome to MVC RFP Application',
+            'message': 'RFP Automation API is running',
             'version': '1.0.0',
             'environment': config_name
         }
-    
-    return app
+
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        """Serve the frontend build (index.html for client-side routes)."""
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
+
+        index_path = os.path.join(static_folder_path, 'index.html')
+        if os.path.exists(index_path):
+            return send_from_directory(static_folder_path, 'index.html')
+        return "index.html not found", 404
 
 if __name__ == '__main__':
     # Development server
@@ -3,12 +3,11 @@
 Provides SQLAlchemy database instance for the application.
 """
 
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+# Database instance: the one the models are declared on
+from src.models.user import db
 
-# Database instance
-db = SQLAlchemy()
-migrate = Migrate()
+from .migrate import init_migrate
+from .db_routing import init_db_routing
 
 def init_db(app):
     """Initialize database with Flask application.
@@ -17,4 +16,5 @@ def init_db(app):
         app: Flask application instance
     """
     db.init_app(app)
-    migrate.init_app(app, db)
+    init_db_routing(app)
+    init_migrate(app, db)
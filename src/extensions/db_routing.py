@@ -0,0 +1,94 @@
+"""Read-replica routing for the database session.
+
+Replicas are configured as ``SQLALCHEMY_BINDS`` entries named
+``replica_<n>`` (see ``src.config.replica_binds``). Views decorated with
+:func:`read_only` send their SELECT statements to a replica; everything
+else, including any flush or DML issued inside a read-only view, goes to
+the primary.
+
+Read-your-writes: when a request writes to the primary, the response sets
+a cookie that keeps that client's read-only requests on the primary for
+``DB_REPLICA_STICKY_SECONDS``, long enough for replication to catch up.
+Without replicas configured the routing is a no-op.
+"""
+
+import time
+import random
+from functools import wraps
+
+from flask import g, request, current_app, has_app_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_COOKIE = 'rfp_read_primary_until'
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that routes reads of read-only views to replicas."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                g._db_wrote = True
+            elif g.get('_db_read_replica'):
+                replicas = _replica_engines(self._db)
+                if replicas:
+                    return random.choice(replicas)
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_engines(db):
+    """Replica engines of the current app, looked up once per app."""
+    state = current_app.extensions.setdefault('db_routing', {})
+    if 'replicas' not in state:
+        engines = db.engines
+        state['replicas'] = [
+            engines[key] for key in sorted(k for k in engines if k and k.startswith(REPLICA_BIND_PREFIX))
+        ]
+    return state['replicas']
+
+
+def _sticky_to_primary():
+    """Whether this client wrote recently enough that replicas may still be behind."""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_only(f):
+    """Serve the view's SELECT statements from a read replica when one is configured.
+
+    Args:
+        f: View function that only reads from the database
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not _sticky_to_primary():
+            g._db_read_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def init_db_routing(app):
+    """Set the read-your-writes cookie after requests that wrote to the primary.
+
+    Args:
+        app: Flask application instance
+    """
+    if not any(key and key.startswith(REPLICA_BIND_PREFIX) for key in app.config.get('SQLALCHEMY_BINDS', {})):
+        return
+
+    @app.after_request
+    def mark_recent_write(response):
+        if g.get('_db_wrote'):
+            sticky_seconds = app.config.get('DB_REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
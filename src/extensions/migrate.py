@@ -1,18 +1,28 @@
 """Migration extension module.
 
-Provides Flask-Migrate instance for database migrations.
+Provides Flask-Migrate for database migrations. Flask-Migrate pulls in
+Alembic, which is only needed by the ``flask db`` commands, so the
+extension is imported and registered only when the application is
+loaded by the Flask CLI.
 """
 
-from flask_migrate import Migrate
+import click
+from flask.cli import ScriptInfo
 
-# Migration instance
-migrate = Migrate()
+def running_under_flask_cli():
+    """Return True when the application is being loaded by the ``flask`` command."""
+    ctx = click.get_current_context(silent=True)
+    return ctx is not None and ctx.find_object(ScriptInfo) is not None
 
 def init_migrate(app, db):
     """Initialize migration extension with Flask application and database.
-    
+
     Args:
         app: Flask application instance
         db: SQLAlchemy database instance
     """
-    migrate.init_app(app, db)
+    if not running_under_flask_cli():
+        return
+
+    from flask_migrate import Migrate
+    Migrate(app, db)
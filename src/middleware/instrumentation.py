@@ -0,0 +1,426 @@
+"""Performance instrumentation middleware.
+
+Records per-route latency histograms, SQL statement count and time per
+request (through SQLAlchemy engine events) and time spent in external AI
+calls. Metrics are exposed in Prometheus text format and slow requests are
+logged with their request ID and most expensive queries.
+
+The registry is per process. With several Gunicorn workers, METRICS_DIR
+names a directory shared by the workers: each one writes a snapshot of
+its registry there and /metrics renders the sum of all of them, including
+workers that have already exited. /metrics answers only to the addresses
+in METRICS_ALLOWED_IPS or to a bearer METRICS_TOKEN.
+"""
+
+import os
+import hmac
+import json
+import time
+import heapq
+import bisect
+import logging
+import threading
+from flask import request, g, has_request_context, current_app, jsonify
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+TOP_QUERIES = 5
+
+class Histogram:
+    """Cumulative Prometheus-style histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """Process-local metric store rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        """Add an observation to the histogram identified by name and labels.
+
+        Args:
+            name (str): Metric name
+            labels (tuple): Tuple of (label, value) pairs
+            value (float): Observed value
+            buckets (tuple): Upper bounds used when the series is created
+        """
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        """Copy of every series as plain values (JSON-serializable).
+
+        Returns:
+            dict: counters and histograms, see merge_snapshots
+        """
+        with self._lock:
+            return {
+                'counters': [[name, [list(label) for label in labels], value]
+                             for (name, labels), value in self._counters.items()],
+                'histograms': [[name, [list(label) for label in labels], list(h.buckets), list(h.counts), h.sum, h.count]
+                               for (name, labels), h in self._histograms.items()]
+            }
+
+    def render(self, snapshot=None):
+        """Render every series in Prometheus exposition format.
+
+        Args:
+            snapshot (dict): Series to render (default: this process's registry)
+
+        Returns:
+            str: Metrics text
+        """
+        snapshot = snapshot or self.snapshot()
+        counters = [((name, _labels(labels)), value) for name, labels, value in snapshot['counters']]
+        histograms = [((name, _labels(labels)), counts, total, count, tuple(buckets))
+                      for name, labels, buckets, counts, total, count in snapshot['histograms']]
+
+        lines = []
+        described = set()
+
+        def header(name):
+            if name in described or name not in self._help:
+                return
+            kind, help_text = self._help[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            described.add(name)
+
+        for (name, labels), value in sorted(counters, key=lambda c: _sort_key(c[0])):
+            header(name)
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+        for (name, labels), counts, total, count, buckets in sorted(histograms, key=lambda h: _sort_key(h[0])):
+            header(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+def _labels(pairs):
+    return tuple((label, value) for label, value in pairs)
+
+def _sort_key(key):
+    name, labels = key
+    return name, tuple((label, str(value)) for label, value in labels)
+
+def merge_snapshots(snapshots):
+    """Sum registry snapshots: counters add up, histogram buckets add up per series.
+
+    Args:
+        snapshots: Iterable of MetricsRegistry.snapshot() dicts
+
+    Returns:
+        dict: Snapshot with the summed series
+    """
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', ()):
+            key = (name, json.dumps(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, counts, total, count in snapshot.get('histograms', ()):
+            key = (name, json.dumps(labels))
+            merged = histograms.get(key)
+            if merged is None or merged[0] != buckets:
+                histograms[key] = [list(buckets), list(counts), total, count]
+                continue
+            merged[1] = [a + b for a, b in zip(merged[1], counts)]
+            merged[2] += total
+            merged[3] += count
+    return {
+        'counters': [[name, json.loads(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, json.loads(labels)] + merged for (name, labels), merged in histograms.items()]
+    }
+
+class SharedMetricsDirectory:
+    """Registry snapshots of every worker process in a shared directory.
+
+    Each process rewrites <pid>.json every `interval` seconds (and when it
+    serves a scrape or exits). collect() folds the files of processes that
+    no longer exist into archived.json, so counters of recycled workers are
+    not lost, and returns every snapshot to be merged.
+    """
+
+    ARCHIVE = 'archived.json'
+
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def ensure_started(self, registry):
+        """Start this process's writer thread (once per process, after fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, args=(registry,), name='metrics-writer', daemon=True).start()
+
+    def _run(self, registry):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.write(registry)
+            except Exception as e:
+                logger.error(f"Could not write metrics snapshot: {e}")
+
+    def write(self, registry):
+        """Write this process's snapshot (atomically)."""
+        self._write_json(os.path.join(self.path, f'{os.getpid()}.json'), registry.snapshot())
+
+    def collect(self):
+        """Snapshots of every live process plus the archive of exited ones.
+
+        Returns:
+            list: Snapshots to merge
+        """
+        live, dead = [], []
+        for filename in os.listdir(self.path):
+            pid = filename[:-len('.json')]
+            if not filename.endswith('.json') or not pid.isdigit():
+                continue
+            snapshot = self._read_json(os.path.join(self.path, filename))
+            if snapshot is None:
+                continue
+            (live if _process_alive(int(pid)) else dead).append((filename, snapshot))
+
+        archive_path = os.path.join(self.path, self.ARCHIVE)
+        if dead:
+            import fcntl
+            with open(os.path.join(self.path, '.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                # Another scrape may have archived them already
+                dead = [(f, s) for f, s in dead if os.path.exists(os.path.join(self.path, f))]
+                archive = self._read_json(archive_path) or {}
+                self._write_json(archive_path, merge_snapshots([archive] + [s for _, s in dead]))
+                for filename, _ in dead:
+                    os.remove(os.path.join(self.path, filename))
+
+        archive = self._read_json(archive_path)
+        return [snapshot for _, snapshot in live] + ([archive] if archive else [])
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(temporary, path)
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+metrics = MetricsRegistry()
+metrics.describe('http_requests_total', 'counter', 'HTTP requests by route and status')
+metrics.describe('http_request_duration_seconds', 'histogram', 'Request latency by route')
+metrics.describe('http_request_sql_statements', 'histogram', 'SQL statements executed per request')
+metrics.describe('http_request_sql_duration_seconds', 'histogram', 'Time spent in SQL per request')
+metrics.describe('ai_call_duration_seconds', 'histogram', 'External AI call latency by model')
+
+def record_ai_call(seconds, model='unknown'):
+    """Record time spent waiting on an external AI provider.
+
+    Safe to call outside a request; the time is then only added to the
+    global histogram.
+
+    Args:
+        seconds (float): Call duration
+        model (str): Model label
+    """
+    metrics.observe('ai_call_duration_seconds', (('model', model),), seconds)
+    if has_request_context():
+        g._ai_time = g.get('_ai_time', 0.0) + seconds
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentation_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None or not has_request_context():
+        return
+
+    stats = g.get('_sql_stats')
+    started = getattr(context, '_instrumentation_started', None)
+    if stats is None or started is None:
+        return
+
+    elapsed = time.perf_counter() - started
+    stats['count'] += 1
+    stats['time'] += elapsed
+
+    top = stats['top']
+    entry = (elapsed, stats['count'], statement)
+    if len(top) < TOP_QUERIES:
+        heapq.heappush(top, entry)
+    elif elapsed > top[0][0]:
+        heapq.heapreplace(top, entry)
+
+_sql_listeners_installed = False
+
+def install_sql_listeners():
+    """Attach the timing listeners to every SQLAlchemy engine (once per process)."""
+    global _sql_listeners_installed
+    if _sql_listeners_installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _sql_listeners_installed = True
+
+def start_request_timer():
+    """Reset per-request counters."""
+    g._request_started = time.perf_counter()
+    g._sql_stats = {'count': 0, 'time': 0.0, 'top': []}
+    g._ai_time = 0.0
+
+def finish_request_timer(response):
+    """Record metrics for the finished request and log it when slow.
+
+    Args:
+        response: Flask response object
+
+    Returns:
+        Flask response object with a Server-Timing header
+    """
+    started = g.get('_request_started')
+    if started is None:
+        return response
+
+    store = current_app.extensions.get('metrics_store')
+    if store is not None:
+        store.ensure_started(metrics)
+
+    duration = time.perf_counter() - started
+    stats = g.get('_sql_stats')
+    ai_time = g.get('_ai_time', 0.0)
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    labels = (('method', request.method), ('route', route))
+
+    metrics.inc('http_requests_total', labels + (('status', response.status_code),))
+    metrics.observe('http_request_duration_seconds', labels, duration)
+    metrics.observe('http_request_sql_statements', labels, stats['count'], COUNT_BUCKETS)
+    metrics.observe('http_request_sql_duration_seconds', labels, stats['time'])
+
+    response.headers['Server-Timing'] = (
+        f"app;dur={duration * 1000:.1f}, db;dur={stats['time'] * 1000:.1f}, ai;dur={ai_time * 1000:.1f}"
+    )
+
+    threshold = current_app.config.get('SLOW_REQUEST_THRESHOLD_MS', 1000)
+    if duration * 1000 >= threshold:
+        top_queries = [
+            {'ms': round(elapsed * 1000, 2), 'statement': statement[:500]}
+            for elapsed, _, statement in sorted(stats['top'], reverse=True)
+        ]
+        logger.warning(
+            'Slow request %s %s %s: %.0f ms (sql: %d statements, %.0f ms; ai: %.0f ms) top queries: %s',
+            g.get('request_id'), request.method, route, duration * 1000,
+            stats['count'], stats['time'] * 1000, ai_time * 1000, top_queries
+        )
+
+    return response
+
+def metrics_allowed():
+    """Whether the caller may read /metrics: bearer METRICS_TOKEN or an allowed address."""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if token and authorization.startswith('Bearer ') and hmac.compare_digest(authorization[7:], token):
+        return True
+    allowed_ips = current_app.config.get('METRICS_ALLOWED_IPS') or ()
+    return request.remote_addr in allowed_ips
+
+def metrics_endpoint():
+    """Prometheus scrape endpoint (summed across workers when METRICS_DIR is set)."""
+    if not metrics_allowed():
+        return jsonify({
+            'error': {
+                'code': 'FORBIDDEN',
+                'message': 'Metrics are restricted to the monitoring network or token'
+            }
+        }), 403
+
+    store = current_app.extensions.get('metrics_store')
+    if store is None:
+        text = metrics.render()
+    else:
+        store.write(metrics)
+        text = metrics.render(merge_snapshots(store.collect()))
+
+    return current_app.response_class(
+        text, mimetype='text/plain', headers={'Content-Type': 'text/plain; version=0.0.4'}
+    )
+
+def register_instrumentation_middleware(app):
+    """Register instrumentation middleware and the /metrics endpoint with Flask app.
+
+    Args:
+        app: Flask application instance
+    """
+    install_sql_listeners()
+    if app.config.get('METRICS_DIR'):
+        app.extensions['metrics_store'] = SharedMetricsDirectory(
+            app.config['METRICS_DIR'], app.config.get('METRICS_WRITE_INTERVAL', 5.0)
+        )
+    app.before_request(start_request_timer)
+    app.after_request(finish_request_timer)
+    app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics_endpoint)
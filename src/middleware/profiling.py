@@ -0,0 +1,236 @@
+"""On-demand request profiling middleware.
+
+An admin can profile a single request by sending ``X-Profile: cprofile``
+(or ``sample``), or the equivalent ``__profile`` query parameter. The
+result is stored under PROFILING_DIR/<organization id>, keyed by the
+request ID: a pstats dump for cProfile, or flamegraph-ready collapsed
+stacks for the sampling profiler, so admins only see profiles of their
+own organization. A per-process rate limit and a single active profile
+keep the overhead bounded so the hook can stay enabled in production.
+"""
+
+import os
+import re
+import sys
+import time
+import cProfile
+import logging
+import threading
+from collections import Counter
+from flask import request, g, current_app
+
+from src.services.rate_limiter import MemoryBackend, parse_rate
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = {'1': 'cprofile', 'cprofile': 'cprofile', 'sample': 'sample'}
+PROFILE_EXTENSIONS = {'cprofile': '.pstats', 'sample': '.collapsed'}
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f-]{36}$')
+ORGANIZATION_ID_PATTERN = PROFILE_ID_PATTERN
+
+_active = threading.Lock()
+_budget = MemoryBackend()
+
+class SamplingProfiler:
+    """Periodically samples one thread's stack from a helper thread."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+def _requested_mode():
+    flag = request.headers.get('X-Profile') or request.args.get('__profile')
+    return PROFILE_MODES.get((flag or '').strip().lower())
+
+def _is_admin():
+    # Imported lazily: the auth middleware pulls in the models
+    from src.middleware.auth_middleware import check_roles
+    try:
+        return check_roles(*current_app.config.get('PROFILING_ROLES', ('admin',))) is None
+    except Exception:
+        return False
+
+def _organization_id():
+    """Organization of the JWT's user (older tokens carry no organization claim)."""
+    from flask_jwt_extended import get_jwt, get_jwt_identity
+    from src.models.user import User
+    organization_id = get_jwt().get('organization_id')
+    if not organization_id:
+        user = User.query.get(get_jwt_identity())
+        organization_id = str(user.organization_id) if user and user.organization_id else None
+    return organization_id
+
+def start_profiling():
+    """Start a profiler for this request when asked for and allowed."""
+    mode = _requested_mode()
+    if not mode or not current_app.config.get('PROFILING_ENABLED', True):
+        return
+
+    if not _is_admin():
+        return
+
+    try:
+        organization_id = _organization_id()
+    except Exception:
+        organization_id = None
+    if not organization_id:
+        return
+
+    limit, window = parse_rate(current_app.config.get('PROFILING_RATE', '6/minute'))
+    if not _budget.hit('profiling', limit, window).allowed:
+        g.profile_skipped = 'rate_limited'
+        return
+
+    # Only one profile at a time per process (cProfile is process-wide on 3.12+)
+    if not _active.acquire(blocking=False):
+        g.profile_skipped = 'busy'
+        return
+
+    try:
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = SamplingProfiler(
+                threading.get_ident(),
+                current_app.config.get('PROFILING_SAMPLE_INTERVAL', 0.005)
+            )
+            profiler.start()
+    except Exception as e:
+        _active.release()
+        logger.error(f'Could not start {mode} profiler: {e}')
+        return
+
+    g.profiler = (mode, profiler, time.perf_counter(), organization_id)
+
+def finish_profiling(response):
+    """Stop the request's profiler and store its output.
+
+    Args:
+        response: Flask response object
+
+    Returns:
+        Flask response object with X-Profile-Id set when a profile was stored
+    """
+    if 'profiler' not in g:
+        skipped = g.get('profile_skipped')
+        if skipped:
+            response.headers['X-Profile-Skipped'] = skipped
+        return response
+
+    mode, profiler, started, organization_id = g.pop('profiler')
+    try:
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+
+        profile_id = g.get('request_id')
+        path = profile_path(organization_id, profile_id, mode)
+        if mode == 'cprofile':
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        _prune_profiles(organization_id)
+
+        response.headers['X-Profile-Id'] = profile_id
+        logger.info(
+            'Stored %s profile %s for %s %s (%.0f ms)',
+            mode, profile_id, request.method, request.path, (time.perf_counter() - started) * 1000
+        )
+    except Exception as e:
+        logger.error(f'Could not store {mode} profile: {e}')
+    finally:
+        _active.release()
+
+    return response
+
+def profiles_dir(organization_id):
+    """Directory holding one organization's profiles."""
+    if not ORGANIZATION_ID_PATTERN.match(str(organization_id or '')):
+        raise ValueError('Invalid organization id')
+    path = os.path.join(current_app.config.get('PROFILING_DIR', 'profiles'), str(organization_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def profile_path(organization_id, profile_id, mode):
+    """Return the storage path of a profile.
+
+    Args:
+        organization_id (str): Organization of the profiled request
+        profile_id (str): Request ID the profile was recorded for
+        mode (str): 'cprofile' or 'sample'
+
+    Returns:
+        str: File path
+    """
+    if not PROFILE_ID_PATTERN.match(profile_id or ''):
+        raise ValueError('Invalid profile id')
+    return os.path.join(profiles_dir(organization_id), profile_id + PROFILE_EXTENSIONS[mode])
+
+def list_profiles(organization_id):
+    """List an organization's stored profiles, newest first.
+
+    Returns:
+        list: Dicts with id, format, size and created_at (epoch seconds)
+    """
+    directory = profiles_dir(organization_id)
+    formats = {ext: mode for mode, ext in PROFILE_EXTENSIONS.items()}
+    result = []
+    for name in os.listdir(directory):
+        profile_id, ext = os.path.splitext(name)
+        if ext in formats:
+            stat = os.stat(os.path.join(directory, name))
+            result.append({
+                'id': profile_id,
+                'format': formats[ext],
+                'size': stat.st_size,
+                'created_at': stat.st_mtime
+            })
+    return sorted(result, key=lambda p: p['created_at'], reverse=True)
+
+def _prune_profiles(organization_id):
+    keep = current_app.config.get('PROFILING_MAX_FILES', 50)
+    for stale in list_profiles(organization_id)[keep:]:
+        try:
+            os.remove(profile_path(organization_id, stale['id'], stale['format']))
+        except OSError:
+            pass
+
+def register_profiling_middleware(app):
+    """Register on-demand profiling middleware with Flask app.
+
+    Must be registered after the request ID middleware.
+
+    Args:
+        app: Flask application instance
+    """
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
@@ -0,0 +1,65 @@
+"""Rate limiting middleware.
+
+Applies the per-user and per-organization 'api' budget to every
+authenticated request.
+"""
+
+import logging
+from flask import request, g
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+
+from src.services.rate_limiter import (
+    get_rate_limiter, apply_rate_limit_headers, rate_limit_exceeded_response
+)
+
+logger = logging.getLogger(__name__)
+
+def check_api_rate_limit():
+    """Consume one token from the caller's 'api' buckets.
+
+    Returns:
+        A 429 response when the budget is exhausted, otherwise None
+    """
+    if 'Authorization' not in request.headers:
+        return None
+
+    try:
+        verify_jwt_in_request(optional=True)
+        claims = get_jwt()
+    except Exception:
+        # Invalid tokens are rejected by the view's own JWT check
+        return None
+
+    user_id = claims.get('sub')
+    if not user_id:
+        return None
+
+    try:
+        result = get_rate_limiter().check('api', user_id, claims.get('organization_id'))
+    except Exception as e:
+        logger.error(f"Rate limiter unavailable: {e}")
+        return None
+
+    if result is None:
+        return None
+    if not result.allowed:
+        return rate_limit_exceeded_response(result)
+
+    g.rate_limit = result
+    return None
+
+def register_rate_limit_middleware(app):
+    """Register rate limiting middleware with Flask app.
+
+    Args:
+        app: Flask application instance
+    """
+    app.before_request(check_api_rate_limit)
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        """Expose the remaining budget to clients."""
+        result = g.get('rate_limit')
+        if result is not None:
+            apply_rate_limit_headers(response, result)
+        return response
@@ -0,0 +1,74 @@
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import UniqueConstraint
+import uuid
+from datetime import datetime
+from src.models.user import db
+
+class AIUsageRecord(db.Model):
+    __tablename__ = 'ai_usage_records'
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = db.Column(UUID(as_uuid=True), db.ForeignKey('organizations.id'), nullable=False, index=True)
+    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'))
+    operation = db.Column(db.String(50), nullable=False)
+    model = db.Column(db.String(50), nullable=False)
+    prompt_tokens = db.Column(db.Integer, nullable=False, default=0)
+    output_tokens = db.Column(db.Integer, nullable=False, default=0)
+    latency_ms = db.Column(db.Integer, nullable=False, default=0)
+    cache_hit = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<AIUsageRecord {self.organization_id}:{self.operation}>'
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'organization_id': str(self.organization_id),
+            'user_id': str(self.user_id) if self.user_id else None,
+            'operation': self.operation,
+            'model': self.model,
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'latency_ms': self.latency_ms,
+            'cache_hit': self.cache_hit,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class OrganizationUsage(db.Model):
+    """Agregado mensal de uso de IA por organização (alimenta get_usage_stats)"""
+    __tablename__ = 'organization_usage'
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    organization_id = db.Column(UUID(as_uuid=True), db.ForeignKey('organizations.id'), nullable=False)
+    period = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    ai_calls = db.Column(db.Integer, nullable=False, default=0)
+    cache_hits = db.Column(db.Integer, nullable=False, default=0)
+    prompt_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    output_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    total_latency_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('organization_id', 'period', name='unique_usage_period_per_organization'),
+    )
+
+    def __repr__(self):
+        return f'<OrganizationUsage {self.organization_id}:{self.period}>'
+
+    @staticmethod
+    def period_for(moment=None):
+        """Retorna a chave de período (YYYY-MM) de uma data"""
+        return (moment or datetime.utcnow()).strftime('%Y-%m')
+
+    def to_dict(self):
+        return {
+            'organization_id': str(self.organization_id),
+            'period': self.period,
+            'ai_calls': self.ai_calls,
+            'cache_hits': self.cache_hits,
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'total_latency_ms': self.total_latency_ms,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
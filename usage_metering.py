@@ -0,0 +1,103 @@
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.organization import Organization
+from src.models.usage import AIUsageRecord, OrganizationUsage
+from src.services.write_behind import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+_ROLLUP_FIELDS = ('ai_calls', 'cache_hits', 'prompt_tokens', 'output_tokens', 'total_latency_ms')
+
+class UsageMeter(BufferedWriter):
+    """Medição de uso de IA por organização.
+
+    Cada chamada gera um registro em `ai_usage_records`; os registros são
+    inseridos em lote pela thread de fundo, que no mesmo flush incrementa o
+    agregado mensal em `organization_usage`.
+    """
+
+    def __init__(self):
+        super().__init__('usage_meter', flush_interval=5.0, max_batch=500)
+
+    def record(self, organization_id, model: str, operation: str,
+               prompt_tokens: int = 0, output_tokens: int = 0, latency_ms: int = 0,
+               cache_hit: bool = False, user_id=None):
+        """Registra uma chamada de IA (não bloqueia a requisição)"""
+        self.put({
+            'organization_id': organization_id,
+            'user_id': user_id,
+            'operation': operation,
+            'model': model,
+            'prompt_tokens': prompt_tokens or 0,
+            'output_tokens': output_tokens or 0,
+            'latency_ms': latency_ms or 0,
+            'cache_hit': cache_hit,
+            'created_at': datetime.utcnow()
+        })
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        try:
+            db.session.execute(insert(AIUsageRecord), records)
+
+            for (organization_id, period), totals in self._rollup(records).items():
+                self._apply_rollup(organization_id, period, totals)
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar {len(records)} registros de uso de IA: {e}")
+            # Registros de cobrança não são descartados: voltam para a fila e entram no próximo flush
+            for record in records:
+                self._queue.put(record)
+
+    @staticmethod
+    def _rollup(records: List[Dict[str, Any]]) -> Dict[tuple, Dict[str, int]]:
+        rollup = defaultdict(lambda: dict.fromkeys(_ROLLUP_FIELDS, 0))
+        for r in records:
+            totals = rollup[(r['organization_id'], OrganizationUsage.period_for(r['created_at']))]
+            # Respostas reaproveitadas (cache_hit) não chamam a IA e não contam em ai_calls
+            totals['ai_calls'] += 0 if r['cache_hit'] else 1
+            totals['cache_hits'] += 1 if r['cache_hit'] else 0
+            totals['prompt_tokens'] += r['prompt_tokens']
+            totals['output_tokens'] += r['output_tokens']
+            totals['total_latency_ms'] += r['latency_ms']
+        return rollup
+
+    def _apply_rollup(self, organization_id, period: str, totals: Dict[str, int]):
+        """Incrementa o agregado do período de forma atômica (cria a linha se preciso)"""
+        increment = update(OrganizationUsage).where(
+            OrganizationUsage.organization_id == organization_id,
+            OrganizationUsage.period == period
+        ).values({
+            field: getattr(OrganizationUsage, field) + amount
+            for field, amount in totals.items()
+        })
+
+        if db.session.execute(increment).rowcount:
+            return
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(OrganizationUsage(organization_id=organization_id, period=period, **totals))
+        except IntegrityError:
+            # Outro worker criou a linha do período entre o UPDATE e o INSERT
+            db.session.execute(increment)
+
+def adjust_storage_usage(organization_id, delta_bytes: int):
+    """Ajusta o armazenamento usado pela organização na transação atual"""
+    if not delta_bytes:
+        return
+
+    db.session.execute(
+        update(Organization)
+        .where(Organization.id == organization_id)
+        .values(storage_used_bytes=Organization.storage_used_bytes + delta_bytes)
+    )
+
+# Instância global do serviço
+usage_meter = UsageMeter()
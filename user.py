@@ -3,8 +3,9 @@ from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy import text, UniqueConstraint
 import uuid
 from datetime import datetime
+from src.extensions.db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -67,9 +68,6 @@ class User(db.Model):
         return [ur.role for ur in self.user_roles if ur.is_active]
     
     def has_permission(self, permission):
-        """Verifica se o usuário tem uma permissão específica"""
-        roles = self.get_roles()
-        for role in roles:
-            if permission in role.permissions:
-                return True
-        return False
+        """Verifica se o usuário tem uma permissão específica (máscaras em cache, ver services.permissions)"""
+        from src.services.permissions import user_has_permission
+        return user_has_permission(self.id, permission)
@@ -2,11 +2,13 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import User, db
 from src.models.role import Role, UserRole
+from src.extensions.db_routing import read_only
 
 users_bp = Blueprint('users', __name__)
 
 @users_bp.route('', methods=['GET'])
 @jwt_required()
+@read_only
 def list_users():
     """Listar usuários da organização"""
     try:
@@ -89,6 +91,7 @@ def list_users():
 
 @users_bp.route('/me', methods=['GET'])
 @jwt_required()
+@read_only
 def get_current_user():
     """Obter perfil do usuário atual"""
     try:
@@ -0,0 +1,85 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from typing import Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class BufferedWriter:
+    """Buffer em memória com uma thread que grava os itens em lote.
+
+    `put` apenas enfileira o item (não toca no banco); a thread de fundo
+    drena a fila a cada `flush_interval` segundos, ou antes disso quando
+    `max_batch` itens se acumulam, e chama `write_batch` dentro de um
+    app context. Subclasses implementam `write_batch`.
+    """
+
+    def __init__(self, name: str, flush_interval: float = 5.0, max_batch: int = 500):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._app = None
+        self._queue = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def init_app(self, app):
+        """Associa o writer à aplicação e garante o flush no encerramento"""
+        self._app = app
+        self.flush_interval = app.config.get(f'{self.name.upper()}_FLUSH_INTERVAL', self.flush_interval)
+        self.max_batch = app.config.get(f'{self.name.upper()}_MAX_BATCH', self.max_batch)
+        app.extensions[self.name] = self
+        atexit.register(self.flush)
+
+    def put(self, item: Any):
+        """Enfileira um item para gravação; nunca bloqueia"""
+        self._queue.put(item)
+        self._ensure_thread()
+        if self._queue.qsize() >= self.max_batch:
+            self._wake.set()
+
+    def _ensure_thread(self):
+        # Threads não sobrevivem ao fork dos workers: recria no processo atual
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name=f'{self.name}-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erro no flush de {self.name}: {e}")
+
+    def _drain(self) -> List[Any]:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def flush(self):
+        """Grava tudo o que estiver pendente (também chamado no shutdown)"""
+        with self._flush_lock:
+            batch = self._drain()
+            if not batch:
+                return
+            if self._app is None:
+                logger.warning(f"{self.name}: {len(batch)} itens descartados (writer sem aplicação)")
+                return
+
+            with self._app.app_context():
+                for start in range(0, len(batch), self.max_batch):
+                    self.write_batch(batch[start:start + self.max_batch])
+
+    def write_batch(self, batch: List[Any]):
+        raise NotImplementedError
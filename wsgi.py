@@ -0,0 +1,3 @@
+"""Ponto de entrada WSGI para produção: gunicorn -c gunicorn.conf.py wsgi:app"""
+
+from main import app